@@ -0,0 +1,555 @@
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import bots.botslib as botslib
+import bots.botsinit as botsinit
+import bots.botsglobal as botsglobal
+import bots.inmessage as inmessage
+import bots.grammar as grammar
+import bots.message as message
+import bots.node as node
+import bots.outmessage as outmessage
+if sys.version_info[0] > 2:
+    basestring = unicode = str
+
+''' benchmarks; not unit tests.
+    usage: python benchmarks.py <benchmark> [parameters]
+    uses configuration in directory 'config' (as the unit tests); needed grammars should be in usersys.
+    benchmarks:
+    -   lexparse [number of messages]:  peak memory and time of parsing a large edifact file; streaming (lexer->parser) and buffered (all lex_records in memory).
+    -   parsefields [number of lines]:      time of parsing an edifact message with many lines; fields parsed using parse plan and using grammar field-definitions.
+    -   grammarstartup [number of grammars]: time of reading many (partner specific) grammars, as at start of engine run; without and with grammar cache.
+    -   outwrite [number of segments]:   peak memory and time of writing a large outgoing edifact message; incremental (segments written as produced) and buffered (whole message as one string).
+    -   fieldcheck [number of records]:  time of checking/formatting the fields of a large incoming and outgoing message (csv with date, time and numeric fields); fast checks and time.strptime/Decimal per field.
+    -   mapping [number of lines]:       time of get/getloop as in a mapping of an edifact ORDERS with many lines; compiled mpaths with child-index and mpaths walked as before.
+    -   putwide [number of lines]:       time of put/putloop as in a mapping writing an edifact ORDERS with many lines; via child-index and scanning all children as before.
+    -   jsonread [number of messages]:   peak memory and time of reading a large json list of orders; incremental, streaming (messages passed one by one) and whole file (json.loads).
+    -   jsonwrite [number of messages]:  peak memory and time of writing many json orders; nodes written directly and via python object with json.dump.
+    -   persist [number of botskeys]:    time of duplicate detection via persist (lookup, add) as in a mapping, for files of 100 messages; uses the database.
+                                         pickle protocol 0 and a query per call as before, binary pickle with a query per call, and binary pickle with persist cache.
+'''
+
+def peak_memory():
+    ''' peak memory (resident set size) of this process in Kb (unix only).'''
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def timeit(function,*args,**kwargs):
+    ''' returns (seconds,result) of calling function.'''
+    start = time.time()
+    result = function(*args,**kwargs)
+    return time.time() - start,result
+
+def run_in_subprocess(*args):
+    ''' run this script with args in a new python process; returns the output (eg for measuring peak memory of one variant).'''
+    return subprocess.check_output([sys.executable,os.path.abspath(__file__)] + list(args)).decode('utf-8').strip()
+
+def write_edifact_orders(filename,nr_messages,nr_lines):
+    ''' write an edifact interchange (ORDERS D96A EAN008) with nr_messages messages of nr_lines lines each.'''
+    with open(filename,'wb') as outfile:
+        outfile.write(b"UNB+UNOA:2+SENDER:14+RECEIVER:14+140101:1200+REF0001'\r\n")
+        for message in range(1,nr_messages+1):
+            segments = ["UNH+%s+ORDERS:D:96A:UN:EAN008'"%message,
+                        "BGM+220+ORDER%s+9'"%message,
+                        "DTM+137:20140101:102'",
+                        "NAD+BY+8712345000013::9'",
+                        "NAD+SU+8712345000020::9'",
+                        ]
+            for line in range(1,nr_lines+1):
+                segments.append("LIN+%s++87123450%05d:SRV'"%(line,line))
+                segments.append("QTY+21:%s'"%line)
+            segments.append("UNS+S'")
+            segments.append("UNT+%s+%s'"%(len(segments)+1,message))
+            outfile.write('\r\n'.join(segments).encode('ascii') + b'\r\n')
+        outfile.write(("UNZ+%s+REF0001'\r\n"%nr_messages).encode('ascii'))
+
+def no_preprocess_lex(lex,ta_info):
+    ''' preprocess_lex that does nothing; forces buffering of all lex_records before parsing.'''
+    pass
+
+def lexparse_child(mode,filename):
+    ''' parse one edifact file; print seconds and peak memory.'''
+    ta_info = {'editype':'edifact','messagetype':'edifact','filename':filename}
+    if mode == 'buffered':
+        ta_info['preprocess_lex'] = no_preprocess_lex
+    seconds,edifile = timeit(inmessage.parse_edi_file,**ta_info)
+    edifile.checkforerrorlist()
+    print('%.2f %s'%(seconds,peak_memory()))
+
+def lexparse(nr_messages='1000'):
+    filename = os.path.join(tempfile.mkdtemp(),'benchmark_lexparse.edi')
+    write_edifact_orders(filename,int(nr_messages),100)
+    print('edifact file: %s Kb'%(os.path.getsize(filename)//1024))
+    for mode in ['streaming','buffered']:
+        seconds,peak = run_in_subprocess('lexparse_child',mode,filename).split()
+        print('%-10s: %s seconds, peak memory %s Kb'%(mode,seconds,peak))
+    os.remove(filename)
+
+def parsefields_child(mode,filename):
+    ''' parse one edifact file; print seconds.'''
+    if mode == 'definition':
+        inmessage.var._parsefields = inmessage.var.__dict__['_parsefields_from_definition']
+    seconds,edifile = timeit(inmessage.parse_edi_file,editype='edifact',messagetype='edifact',filename=filename)
+    edifile.checkforerrorlist()
+    print('%.2f'%(seconds))
+
+def parsefields(nr_lines='10000'):
+    filename = os.path.join(tempfile.mkdtemp(),'benchmark_parsefields.edi')
+    write_edifact_orders(filename,1,int(nr_lines))
+    print('edifact file: %s Kb'%(os.path.getsize(filename)//1024))
+    for mode in ['plan','definition']:
+        seconds = run_in_subprocess('parsefields_child',mode,filename)
+        print('%-10s: %s seconds'%(mode,seconds))
+    os.remove(filename)
+
+def write_edifact_grammar(filename,nr_records,nr_fields):
+    ''' write an edifact grammar with nr_records optional records, each with nr_fields fields and a composite.'''
+    with open(filename,'wb') as outfile:
+        outfile.write(b'from bots.botsconfig import *\n')
+        outfile.write(b"syntax = {'envelope':''}\n")
+        records = ['R%03d'%record for record in range(nr_records)]
+        level = ',\n        '.join(["{ID:'%s',MIN:0,MAX:99}"%record for record in records])
+        outfile.write(("structure = [\n{ID:'UNH',MIN:1,MAX:1,LEVEL:[\n        %s,\n        {ID:'UNT',MIN:1,MAX:1},\n        ]},\n]\n"%level).encode('ascii'))
+        outfile.write(b"recorddefs = {\n'UNH':[['BOTSID','M',3,'A'],['0062','M',14,'AN']],\n'UNT':[['BOTSID','M',3,'A'],['0074','M',6,'N'],['0062','M',14,'AN']],\n")
+        for record in records:
+            fields = ["['%s.F%02d','C',(1,35),'AN']"%(record,field) for field in range(nr_fields)]
+            fields.append("['%s.C01','C',[['%s.C01.1','M',3,'AN'],['%s.C01.2','C',(1,10),'N']]]"%(record,record,record))
+            outfile.write(("'%s':[['BOTSID','M',3,'A'],%s],\n"%(record,','.join(fields))).encode('ascii'))
+        outfile.write(b'}\n')
+
+def grammarstartup_child(mode,nr_grammars):
+    ''' read grammars; print seconds.'''
+    botsglobal.ini.set('settings','grammarcache',unicode(mode != 'nocache'))
+    seconds,result = timeit(lambda: [grammar.grammarread('edifact','benchmark_%03d'%nr_grammar,typeofgrammarfile='grammars') for nr_grammar in range(int(nr_grammars))])
+    print('%.2f'%(seconds))
+
+def grammarstartup(nr_grammars='200'):
+    directory = os.path.join(botsglobal.ini.get('directories','usersysabs'),'grammars','edifact')
+    filenames = [os.path.join(directory,'benchmark_%03d.py'%nr_grammar) for nr_grammar in range(int(nr_grammars))]
+    for filename in filenames:
+        write_edifact_grammar(filename,60,8)
+    try:
+        run_in_subprocess('grammarstartup_child','nocache',nr_grammars)    #first import: python compiles the grammar files
+        for mode in ['nocache','cache (write)','cache (read)']:
+            seconds = run_in_subprocess('grammarstartup_child',mode,nr_grammars)
+            print('%-14s: %s seconds'%(mode,seconds))
+    finally:
+        cachedirectory = os.path.join(botsglobal.ini.get('directories','botssys'),'grammarcache','edifact')
+        for filename in filenames:
+            modulepath = '.'.join((botsglobal.usersysimportpath,'grammars','edifact',os.path.basename(filename)[:-3]))
+            for name in [filename,filename + 'c',os.path.join(cachedirectory,modulepath + '.pickle')]:
+                if os.path.exists(name):
+                    os.remove(name)
+
+def write_edifact_outgrammar(filename):
+    ''' write an edifact grammar for outgoing message: UNH, LIN with QTY, UNT.'''
+    with open(filename,'wb') as outfile:
+        outfile.write(b'''from bots.botsconfig import *
+syntax = {'envelope':''}
+structure = [
+{ID:'UNH',MIN:1,MAX:1,LEVEL:[
+        {ID:'LIN',MIN:0,MAX:999999,LEVEL:[
+            {ID:'QTY',MIN:0,MAX:9},
+            ]},
+        {ID:'UNT',MIN:1,MAX:1},
+        ]},
+]
+recorddefs = {
+'UNH':[['BOTSID','M',3,'A'],['0062','M',14,'AN'],['S009','M',[['S009.0065','M',6,'AN'],['S009.0052','M',3,'AN'],['S009.0054','M',3,'AN'],['S009.0051','M',2,'AN']]]],
+'LIN':[['BOTSID','M',3,'A'],['1082','M',6,'AN'],['1229','C',3,'AN'],['C212','C',[['C212.7140','C',35,'AN'],['C212.7143','C',3,'AN']]]],
+'QTY':[['BOTSID','M',3,'A'],['C186','M',[['C186.6063','M',3,'AN'],['C186.6060','M',15,'N']]]],
+'UNT':[['BOTSID','M',3,'A'],['0074','M',6,'N'],['0062','M',14,'AN']],
+}
+''')
+
+def write_buffered(self,node_instance):
+    ''' Outmessage._write as whole message: all lex_records, one string, one write.'''
+    self.tree2records(node_instance)
+    self._outstream.write(self.record2string(self.lex_records))
+
+def outwrite_child(mode,nr_segments,filename):
+    ''' write one edifact message; print seconds and peak memory.'''
+    if mode == 'buffered':
+        outmessage.Outmessage._write = write_buffered
+    out = outmessage.outmessage_init(editype='edifact',messagetype='benchmark_outwrite',filename=filename,charset='iso-8859-1')
+    out.root = node.Node(record={'BOTSID':'UNH','0062':'1','S009.0065':'INVOIC','S009.0052':'D','S009.0054':'96A','S009.0051':'UN'})
+    for line in range(1,int(nr_segments)//2 + 1):
+        lin = node.Node(record={'BOTSID':'LIN','1082':unicode(line),'C212.7140':'87123450%05d?+'%line,'C212.7143':'SRV'})
+        lin.append(node.Node(record={'BOTSID':'QTY','C186.6063':'47','C186.6060':unicode(line)}))
+        out.root.append(lin)
+    out.root.append(node.Node(record={'BOTSID':'UNT','0074':unicode(int(nr_segments) + 2),'0062':'1'}))
+    seconds,result = timeit(out.writeall)
+    print('%.2f %s'%(seconds,peak_memory()))
+
+def outwrite(nr_segments='50000'):
+    grammarfilename = os.path.join(botsglobal.ini.get('directories','usersysabs'),'grammars','edifact','benchmark_outwrite.py')
+    write_edifact_outgrammar(grammarfilename)
+    filename = os.path.join(tempfile.mkdtemp(),'benchmark_outwrite.edi')
+    try:
+        for mode in ['incremental','buffered']:
+            seconds,peak = run_in_subprocess('outwrite_child',mode,nr_segments,filename).split()
+            print('%-12s: %s seconds, peak memory %s Kb, file %s Kb'%(mode,seconds,peak,os.path.getsize(filename)//1024))
+    finally:
+        for name in [grammarfilename,grammarfilename + 'c',filename]:
+            if os.path.exists(name):
+                os.remove(name)
+
+def write_csv_fieldgrammar(filename):
+    ''' write a csv grammar with record with fields of all formats.'''
+    with open(filename,'wb') as outfile:
+        outfile.write(b'''from bots.botsconfig import *
+syntax = {}
+structure = [
+{ID:'HEA',MIN:1,MAX:1,LEVEL:[
+        {ID:'LIN',MIN:0,MAX:999999},
+        ]},
+]
+recorddefs = {
+'HEA':[['BOTSID','M',3,'A'],['REFERENCE','M',35,'AN']],
+'LIN':[['BOTSID','M',3,'A'],['LINENR','M',6,'N'],['DATE','C',8,'DT'],['TIME','C',4,'TM'],['QUANTITY','C',15.2,'N'],['PRICE','C',15,'R'],['AMOUNT','C',10.2,'I'],
+       ['DESCRIPTION','C',35,'AN'],['ARTICLE','C',35,'AN'],['UNIT','C',3,'AN']],
+}
+''')
+
+def checkdate_strptime(value):
+    ''' message.checkdate as before: always time.strptime.'''
+    if len(value) == 6:
+        time.strptime(value,'%y%m%d')
+    elif len(value) == 8:
+        time.strptime(value,'%Y%m%d')
+    else:
+        raise ValueError('To be catched')
+
+def checktime_strptime(value):
+    ''' message.checktime as before: always time.strptime.'''
+    if len(value) == 4:
+        time.strptime(value,'%H%M')
+    elif len(value) == 6:
+        time.strptime(value,'%H%M%S')
+    else:
+        raise ValueError('To be catched')
+
+def fieldcheck_child(mode,direction,nr_records):
+    ''' check/format fields of all records of one message; print seconds.'''
+    if mode == 'strptime':
+        message.checkdate = checkdate_strptime
+        message.checktime = checktime_strptime
+        outmessage.quantize_decimals = lambda decimals: outmessage.decimal.Decimal('10e-%d'%decimals)
+    defmessage = grammar.grammarread('csv','benchmark_fieldcheck',typeofgrammarfile='grammars')
+    classtocall = inmessage.csv if direction == 'in' else outmessage.csv
+    edi = classtocall({'lengthnumericbare':False,'decimaal':'.','triad':''})
+    edi.defmessage = defmessage
+    root = node.Node(record={'BOTSID':'HEA','BOTSIDnr':'1','REFERENCE':'ORDER1'})
+    for line in range(int(nr_records)):
+        root.append(node.Node(record={'BOTSID':'LIN','BOTSIDnr':'1','LINENR':unicode(line),'DATE':'2014%02d%02d'%(line%12+1,line%28+1),
+                                      'TIME':'%02d%02d'%(line%24,line%60),'QUANTITY':'%d.%02d'%(line,line%100),'PRICE':'%d.5'%line,'AMOUNT':unicode(line),
+                                      'DESCRIPTION':'description of article %d'%line,'ARTICLE':'87123450%05d'%line,'UNIT':'PCE'}))
+    seconds,result = timeit(edi._canonicaltree,root,defmessage.structure[0])
+    edi.checkforerrorlist()
+    print('%.2f'%(seconds))
+
+def fieldcheck(nr_records='30000'):
+    filename = os.path.join(botsglobal.ini.get('directories','usersysabs'),'grammars','csv','benchmark_fieldcheck.py')
+    write_csv_fieldgrammar(filename)
+    try:
+        for direction in ['in','out']:
+            for mode in ['fast','strptime']:
+                seconds = run_in_subprocess('fieldcheck_child',mode,direction,nr_records)
+                print('%-3s %-8s: %s seconds'%(direction,mode,seconds))
+    finally:
+        for name in [filename,filename + 'c']:
+            if os.path.exists(name):
+                os.remove(name)
+
+def get_walk(self,*mpaths):
+    ''' Node.get as before: sanity check, BOTSIDnr and logging for each call; walk all children.'''
+    if node.Node.checklevel:
+        node.Node._get_sanity_check(mpaths)
+    for part in mpaths:
+        part.setdefault('BOTSIDnr', '1')
+    terug = _getcore_walk(self,mpaths)
+    botsglobal.logmap.debug('"%(terug)s" for get%(mpaths)s',{'terug':terug,'mpaths':unicode(mpaths)})
+    return terug
+
+def _getcore_walk(self,mpaths):
+    if len(mpaths) != 1:
+        for key,value in mpaths[0].items():
+            if key not in self.record or value != self.record[key]:
+                return None
+        for childnode in self.children:
+            terug = _getcore_walk(childnode,mpaths[1:])
+            if terug is not None:
+                return terug
+        return None
+    terug = 1
+    for key,value in mpaths[0].items():
+        if key not in self.record:
+            return None
+        elif value is None:
+            terug = self.record[key][:]
+        elif value != self.record[key]:
+            return None
+    return terug
+
+def getloop_walk(self,*mpaths):
+    ''' Node.getloop as before.'''
+    if node.Node.checklevel:
+        self._mpath_sanity_check(mpaths)
+    for part in mpaths:
+        part.setdefault('BOTSIDnr', '1')
+    for terug in _getloopcore_walk(self,mpaths):
+        botsglobal.logmap.debug('getloop %(mpaths)s returns "%(record)s".',{'mpaths':mpaths,'record':terug.record})
+        yield terug
+
+def _getloopcore_walk(self,mpaths):
+    for key,value in mpaths[0].items():
+        if key not in self.record or value != self.record[key]:
+            return
+    if len(mpaths) == 1:
+        yield self
+    else:
+        for childnode in self.children:
+            for terug in _getloopcore_walk(childnode,mpaths[1:]):
+                yield terug
+
+def orders_tree(nr_lines):
+    ''' tree of an edifact ORDERS message with nr_lines lines (as made by inmessage).'''
+    root = node.Node(record={'BOTSID':'UNH','0062':'1','S009.0065':'ORDERS','S009.0052':'D','S009.0054':'96A','S009.0051':'UN','S009.0057':'EAN008'})
+    root.append(node.Node(record={'BOTSID':'BGM','C002.1001':'220','1004':'PO12345','1225':'9'}))
+    for qualifier in ['137','2','64']:
+        root.append(node.Node(record={'BOTSID':'DTM','C507.2005':qualifier,'C507.2380':'20140601','C507.2379':'102'}))
+    for qualifier in ['BY','SU','DP','IV']:
+        nad = node.Node(record={'BOTSID':'NAD','3035':qualifier,'C082.3039':'87123450000%s'%len(root.children),'C082.3055':'9'})
+        nad.append(node.Node(record={'BOTSID':'CTA','3139':'OC','C056.3412':'contact'}))
+        root.append(nad)
+    for line in range(1,int(nr_lines) + 1):
+        lin = node.Node(record={'BOTSID':'LIN','1082':unicode(line),'C212.7140':'87123450%05d'%line,'C212.7143':'EN'})
+        for qualifier in ['SA','BP']:
+            lin.append(node.Node(record={'BOTSID':'PIA','4347':'5','C212#1.7140':'%s%d'%(qualifier,line),'C212#1.7143':qualifier}))
+        for qualifier in ['F','C']:
+            lin.append(node.Node(record={'BOTSID':'IMD','7077':qualifier,'C273.7008#1':'description %d'%line}))
+        for qualifier in ['21','192']:
+            lin.append(node.Node(record={'BOTSID':'QTY','C186.6063':qualifier,'C186.6060':unicode(line%50+1)}))
+        lin.append(node.Node(record={'BOTSID':'PRI','C509.5125':'AAA','C509.5118':'%d.50'%line}))
+        lin.append(node.Node(record={'BOTSID':'MOA','C516.5025':'203','C516.5004':'%d.00'%line}))
+        root.append(lin)
+    root.append(node.Node(record={'BOTSID':'UNS','0081':'S'}))
+    root.append(node.Node(record={'BOTSID':'CNT','C270.6069':'2','C270.6066':unicode(nr_lines)}))
+    root.append(node.Node(record={'BOTSID':'UNT','0074':unicode(len(root.children) + 1),'0062':'1'}))
+    return root
+
+def orders_mapping(root):
+    ''' get/getloop as in a typical mapping script of an ORDERS.'''
+    result = []
+    for i in range(10):
+        result.append(root.get({'BOTSID':'UNH'},{'BOTSID':'BGM','1004':None}))
+        result.append(root.get({'BOTSID':'UNH'},{'BOTSID':'DTM','C507.2005':'2','C507.2380':None}))
+        result.append(root.get({'BOTSID':'UNH'},{'BOTSID':'NAD','3035':'DP','C082.3039':None}))
+        result.append(root.get({'BOTSID':'UNH'},{'BOTSID':'CNT','C270.6069':'2','C270.6066':None}))
+    for lin in root.getloop({'BOTSID':'UNH'},{'BOTSID':'LIN'}):
+        result.append(lin.get({'BOTSID':'LIN','1082':None}))
+        result.append(lin.get({'BOTSID':'LIN','C212.7140':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'PIA','C212#1.7143':'SA','C212#1.7140':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'PIA','C212#1.7143':'BP','C212#1.7140':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'IMD','7077':'F','C273.7008#1':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6063':'21','C186.6060':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6063':'192','C186.6060':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'PRI','C509.5125':'AAA','C509.5118':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'MOA','C516.5025':'203','C516.5004':None}))
+        result.append(lin.get({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6063':'59','C186.6060':None}))
+        for pia in lin.getloop({'BOTSID':'LIN'},{'BOTSID':'PIA'}):
+            result.append(pia.get({'BOTSID':'PIA','C212#1.7140':None}))
+        result.append(root.get({'BOTSID':'UNH'},{'BOTSID':'NAD','3035':'BY','C082.3039':None}))
+    return result
+
+def mapping_child(mode,nr_lines):
+    ''' do the get/getloop of mapping three times; print seconds.'''
+    if mode == 'walk':
+        node.Node.get = get_walk
+        node.Node.getloop = getloop_walk
+    root = orders_tree(nr_lines)
+    seconds,result = timeit(lambda: [orders_mapping(root) for i in range(3)])
+    print('%.2f %s'%(seconds,len(result[-1])))
+
+def mapping(nr_lines='5000'):
+    for mode in ['compiled','walk']:
+        seconds,nr_results = run_in_subprocess('mapping_child',mode,nr_lines).split()
+        print('%-8s: %s seconds (%s results per mapping)'%(mode,seconds,nr_results))
+
+def _findoccurence_scan(self,mpath):
+    ''' Node._findoccurence as before: check all children.'''
+    for childnode in self.children:
+        if childnode.record['BOTSID'] == mpath['BOTSID'] and childnode._sameoccurence(mpath):
+            return childnode
+    return None
+
+def orders_putmapping(nr_lines):
+    ''' put/putloop as in a typical mapping script writing an ORDERS; returns root node.'''
+    out = node.Node(record={'BOTSID':'UNH'})
+    out.put({'BOTSID':'UNH','0062':'1','S009.0065':'ORDERS','S009.0052':'D','S009.0054':'96A','S009.0051':'UN'})
+    out.put({'BOTSID':'UNH'},{'BOTSID':'BGM','C002.1001':'220','1004':'PO12345'})
+    for line in range(1,int(nr_lines) + 1):
+        if line % 2:    #lines via put with identifying line number
+            out.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':line,'C212.7140':'87123450%05d'%line,'C212.7143':'EN'})
+            out.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':line},{'BOTSID':'QTY','C186.6063':'21','C186.6060':line%50+1})
+            out.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':line},{'BOTSID':'PRI','C509.5125':'AAA','C509.5118':'%d.50'%line})
+        else:           #lines via putloop
+            lou = out.putloop({'BOTSID':'UNH'},{'BOTSID':'LIN'})
+            lou.put({'BOTSID':'LIN','1082':line,'C212.7140':'87123450%05d'%line})
+            lou.put({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6063':'21','C186.6060':line%50+1})
+    out.put({'BOTSID':'UNH'},{'BOTSID':'CNT','C270.6069':'2','C270.6066':nr_lines})
+    out.put({'BOTSID':'UNH'},{'BOTSID':'UNT','0074':len(out.children) + 1})
+    return out
+
+def putwide_child(mode,nr_lines):
+    ''' do the put/putloop of mapping; print seconds.'''
+    if mode == 'scan':
+        node.Node._findoccurence = _findoccurence_scan
+    seconds,result = timeit(orders_putmapping,nr_lines)
+    print('%.2f %s'%(seconds,len(result.children)))
+
+def putwide(nr_lines='5000'):
+    for mode in ['index','scan']:
+        seconds,nr_children = run_in_subprocess('putwide_child',mode,nr_lines).split()
+        print('%-8s: %s seconds (%s segments under UNH)'%(mode,seconds,nr_children))
+
+def write_json_grammar(filename):
+    ''' write a json grammar for orders: ROOT with LINES.'''
+    with open(filename,'wb') as outfile:
+        outfile.write(b'''from bots.botsconfig import *
+syntax = {}
+structure = [
+{ID:'ROOT',MIN:1,MAX:9999999,LEVEL:[
+        {ID:'LINES',MIN:0,MAX:9999},
+        ]},
+]
+recorddefs = {
+'ROOT':[['BOTSID','M',10,'A'],['id','M',20,'AN'],['date','C',8,'AN'],['buyer','C',35,'AN'],['supplier','C',35,'AN']],
+'LINES':[['BOTSID','M',10,'A'],['nr','M',6,'AN'],['article','C',35,'AN'],['description','C',70,'AN'],['qty','C',15,'AN']],
+}
+''')
+
+def write_json_orders(filename,nr_messages,nr_lines):
+    ''' write a json file: list of nr_messages orders of nr_lines lines each.'''
+    import json
+    with open(filename,'wb') as outfile:
+        outfile.write(b'[')
+        for message in range(1,nr_messages + 1):
+            order = {'id':'PO%d'%message,'date':'20140601','buyer':'8712345000013','supplier':'8712345000020',
+                     'LINES':[{'nr':unicode(line),'article':'87123450%05d'%line,'description':'description of article %d'%line,'qty':unicode(line%50+1)} for line in range(1,nr_lines + 1)]}
+            if message > 1:
+                outfile.write(b',')
+            outfile.write(json.dumps(order).encode('ascii'))
+        outfile.write(b']')
+
+def json_initfromfile_whole(self):
+    ''' inmessage.json.initfromfile as before: whole file read with json.loads, converted to nodes.'''
+    self.messagegrammarread(typeofgrammarfile='grammars')
+    self._initfromjsonobject(self._readjson(),self._getrootid())
+
+def jsonread_child(mode,filename):
+    ''' read one json file and split in messages; print seconds and peak memory.'''
+    ta_info = {'editype':'json','messagetype':'benchmark_json','filename':filename,'streaming':mode == 'streaming'}
+    if mode == 'whole':
+        inmessage.json.initfromfile = json_initfromfile_whole
+    def read():
+        edifile = inmessage.parse_edi_file(**ta_info)
+        edifile.checkforerrorlist()
+        return sum(1 for message in edifile.nextmessage())
+    seconds,nr_messages = timeit(read)
+    print('%.2f %s'%(seconds,peak_memory()))
+
+def jsonread(nr_messages='20000'):
+    grammarfilename = os.path.join(botsglobal.ini.get('directories','usersysabs'),'grammars','json','benchmark_json.py')
+    write_json_grammar(grammarfilename)
+    filename = os.path.join(tempfile.mkdtemp(),'benchmark_jsonread.json')
+    write_json_orders(filename,int(nr_messages),10)
+    print('json file: %s Kb'%(os.path.getsize(filename)//1024))
+    try:
+        for mode in ['incremental','streaming','whole']:
+            seconds,peak = run_in_subprocess('jsonread_child',mode,filename).split()
+            print('%-12s: %s seconds, peak memory %s Kb'%(mode,seconds,peak))
+    finally:
+        for name in [grammarfilename,grammarfilename + 'c',filename]:
+            if os.path.exists(name):
+                os.remove(name)
+
+def json_write_object(self,node_instance):
+    ''' outmessage.json._write as before: python object made of message (_node2json), written with json.dump.'''
+    import json
+    if self.nrmessagewritten:
+        self._outstream.write(',')
+    if self.ta_info['named_root_object']:
+        jsonobject = {node_instance.record['BOTSID']:self._node2json(node_instance)}
+    else:
+        jsonobject = self._node2json(node_instance)
+    json.dump(jsonobject, self._outstream, skipkeys=False, ensure_ascii=False, check_circular=False, indent=2 if self.ta_info['indented'] else None)
+
+def jsonwrite_child(mode,nr_messages,filename):
+    ''' write json file with orders; print seconds and peak memory.'''
+    if mode == 'object':
+        outmessage.json._write = json_write_object
+    out = outmessage.outmessage_init(editype='json',messagetype='benchmark_json',filename=filename,charset='utf-8')
+    out.root = node.Node()
+    for message in range(1,int(nr_messages) + 1):
+        order = node.Node(record={'BOTSID':'ROOT','id':'PO%d'%message,'date':'20140601','buyer':'8712345000013','supplier':'8712345000020'})
+        for line in range(1,11):
+            order.append(node.Node(record={'BOTSID':'LINES','nr':unicode(line),'article':'87123450%05d'%line,'description':'description of article %d'%line,'qty':unicode(line%50+1)}))
+        out.root.append(order)
+    seconds,result = timeit(out.writeall)
+    print('%.2f %s'%(seconds,peak_memory()))
+
+def jsonwrite(nr_messages='20000'):
+    grammarfilename = os.path.join(botsglobal.ini.get('directories','usersysabs'),'grammars','json','benchmark_json.py')
+    write_json_grammar(grammarfilename)
+    filename = os.path.join(tempfile.mkdtemp(),'benchmark_jsonwrite.json')
+    try:
+        for mode in ['direct','object']:
+            seconds,peak = run_in_subprocess('jsonwrite_child',mode,nr_messages,filename).split()
+            print('%-8s: %s seconds, peak memory %s Kb, file %s Kb'%(mode,seconds,peak,os.path.getsize(filename)//1024))
+    finally:
+        for name in [grammarfilename,grammarfilename + 'c',filename]:
+            if os.path.exists(name):
+                os.remove(name)
+
+def persist_dumps_protocol0(value):
+    ''' transform._persist_dumps as before: pickle protocol 0, turned into unicode via iso-8859-1.'''
+    import pickle
+    return pickle.dumps(value,0).decode('iso-8859-1')
+
+def persist_child(mode,nr_botskeys):
+    ''' per message: lookup of botskey, add if not there (duplicate detection); each botskey is done twice. print seconds.'''
+    import bots.transform as transform
+    botsinit.connect()
+    if mode == 'before':
+        transform._persist_dumps = persist_dumps_protocol0
+    botsglobal.ini.set('settings','persistcachesize','100000' if mode == 'cache' else '0')
+    botslib.changeq('''DELETE FROM persist WHERE domein=%(domein)s''',{'domein':'benchmark'})
+    def duplicate_detection():
+        for start in range(0,2*int(nr_botskeys),100):   #file with 100 messages
+            transform.persistcache.start()
+            for message in range(start,start+100):
+                botskey = 'ORDER%s'%(message % int(nr_botskeys))
+                if transform.persist_lookup('benchmark',botskey) is None:
+                    transform.persist_add('benchmark',botskey,{'order':botskey,'date':'20140601','lines':list(range(10))})
+            transform.persistcache.end()
+    try:
+        seconds,result = timeit(duplicate_detection)
+    finally:
+        botslib.changeq('''DELETE FROM persist WHERE domein=%(domein)s''',{'domein':'benchmark'})
+        botsglobal.db.close()
+    print('%.2f'%(seconds))
+
+def persist(nr_botskeys='5000'):
+    for mode in ['before','query','cache']:
+        print('%-8s: %s seconds'%(mode,run_in_subprocess('persist_child',mode,nr_botskeys)))
+
+
+if __name__ == '__main__':
+    botsinit.generalinit('config')
+    botsglobal.logger = botsinit.initenginelogging('engine')
+    globals()[sys.argv[1]](*sys.argv[2:])
@@ -35,6 +35,8 @@ QUERIES = 7
 SUBTRANSLATION = 8
 BOTSIDNR = 9
 FIXED_RECORD_LENGTH = 10         #length of fixed record
+PARSEPLAN = 11                  #plan for parsing the lexed fields of a record (var editypes); made in grammar
+LEVELINDEX = 12                 #index of records in a level of structure (only in first record of level); made in grammar
 
 #***grammar.recorddefs: dict keys for fields of record eg: record[FIELDS][ID] == 'C124.0034'
 #ID = 0 (is already defined)
@@ -48,10 +50,11 @@ MINLENGTH = 6
 BFORMAT = 7     #internal bots format; formats in grammar are converted to bformat
 MAXREPEAT = 8
 
-#***lex_record in self.lex_records: is a dict
+#***lex_record in self.lex_records: is a list of fields; each field is a (small) list, indexed by:
+#incoming: [VALUE,SFIELD,LIN,POS] (fixed: [VALUE,SFIELD,LIN,POS,FIXEDLINE]); outgoing: [VALUE,SFIELD,FORMATFROMGRAMMAR]
 VALUE = 0
 SFIELD = 1  #1: is subfield, 0: field or first element composite
 LIN = 2
 POS = 3
 FIXEDLINE = 4           #for fixed records; tmp storage of fixed record
-FORMATFROMGRAMMAR = 5   #to store FORMAT field has in grammar
+FORMATFROMGRAMMAR = 2   #to store FORMAT field has in grammar (outgoing only; LIN and POS are not used for outgoing)
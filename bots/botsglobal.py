@@ -9,5 +9,6 @@ usersysimportpath = None
 currentrun = None       #store current run for global use. needed to get the idta's of run, route, routepart
 routeid = ''            #current route. This is used to set routeid for Processes.
 confirmrules = []       #confirmrules are read into memory at start of run
+translations = None     #translations are read into memory at first lookup (botslib.TranslationResolver)
 not_import = set()      #register modules that are not importable
 is_first_run_of_day = False  #20190123 added.
\ No newline at end of file
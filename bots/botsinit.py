@@ -178,13 +178,39 @@ def connect():
     else:
         raise botslib.PanicError('Unknown database engine "%(engine)s".',{'engine':botsglobal.settings.DATABASES['default']['ENGINE']})
 
+class WorkerRun(object):
+    ''' in a worker process: stands for the run (botsglobal.currentrun) of the engine process.'''
+    engine_db = None
+
+    def __init__(self,minta4query):
+        self.minta4query = minta4query
+
+    def get_minta4query(self):
+        return self.minta4query
+
+def initworker(configdir,processlist,routeid,minta4query):
+    ''' initialise a worker process of the engine (eg for translating, out-communication): configuration, logging, own database connection.
+        on unix the worker is a fork of the engine process and has configuration and logging already.
+    '''
+    if botsglobal.ini is None:
+        generalinit(configdir)
+        botsglobal.logger = initenginelogging('engine',rollover=False)
+    else:
+        WorkerRun.engine_db = botsglobal.db     #keep reference: database connection of engine process is not used, but should not be closed by worker.
+        from . import communication
+        communication.forgetconnections()       #ftp/sftp sessions in pool are used by engine process
+    connect()
+    botslib._Transaction.processlist = processlist     #db-ta's made by worker are made by the process that started the worker
+    botslib.setrouteid(routeid)
+    botsglobal.currentrun = WorkerRun(minta4query)
+
 #*******************************************************************
 #*** init logging **************************************************
 #*******************************************************************
 logging.addLevelName(25, 'STARTINFO')
 convertini2logger = {'DEBUG':logging.DEBUG,'INFO':logging.INFO,'WARNING':logging.WARNING,'ERROR':logging.ERROR,'CRITICAL':logging.CRITICAL,'STARTINFO':25}
 
-def initenginelogging(logname):
+def initenginelogging(logname,rollover=True):
     #initialise file logging: create main logger 'bots'
     logger = logging.getLogger(logname)
     logger.setLevel(convertini2logger[botsglobal.ini.get('settings','log_file_level','INFO')])
@@ -192,7 +218,8 @@ def initenginelogging(logname):
         handler = logging.handlers.TimedRotatingFileHandler(botslib.join(botsglobal.ini.get('directories','logging'),logname+'.log'),when='midnight',backupCount=botsglobal.ini.getint('settings','log_file_number',10))
     else:
         handler = logging.handlers.RotatingFileHandler(botslib.join(botsglobal.ini.get('directories','logging'),logname+'.log'),backupCount=botsglobal.ini.getint('settings','log_file_number',10))
-        handler.doRollover()   #each run a new log file is used; old one is rotated
+        if rollover:
+            handler.doRollover()   #each run a new log file is used; old one is rotated
     fileformat = logging.Formatter('%(asctime)s %(levelname)-8s %(name)s : %(message)s','%Y%m%d %H:%M:%S')
     handler.setFormatter(fileformat)
     logger.addHandler(handler)
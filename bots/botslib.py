@@ -1,5 +1,6 @@
 import sys
 import os
+import errno
 import posixpath
 import datetime as python_datetime
 import codecs
@@ -44,11 +45,18 @@ class _Transaction(object):
                 'alt','divtext','merge','nrmessages','testindicator','reference','frommail','tomail','charset','retransmit','contenttype','errortext',
                 'confirmasked','confirmed','confirmtype','confirmidta','envelope','botskey','cc','rsrv1','rsrv2','rsrv3','rsrv5','filesize','numberofresends'))
     processlist = [0]  #stack for bots-processes. last one is the current process; starts with 1 element in list: root
+    unitofwork = None  #if unit of work is active: dict with buffered updates of db-ta {idta:{field:value}}; see unitofwork_start()
 
     def update(self,**ta_info):
         ''' Updates db-ta with named-parameters/dict.
             Use a filter to update only valid fields in db-ta
+            In a unit of work the update is buffered.
         '''
+        if _Transaction.unitofwork is not None:
+            updatedict = dict((key,value) for key,value in ta_info.items() if key in self.filterlist)
+            if updatedict:
+                _Transaction.unitofwork.setdefault(self.idta,{}).update(updatedict)
+            return
         setstring = ','.join(key+'=%('+key+')s' for key in ta_info if key in self.filterlist)
         if not setstring:   #nothing to update
             return
@@ -100,6 +108,8 @@ class _Transaction(object):
             parameters for new transaction are in ta_info (new transaction is updated with these values).
         '''
         script = _Transaction.processlist[-1]
+        if _Transaction.unitofwork and self.idta in _Transaction.unitofwork:     #new ta is copied from db: write buffered updates of this ta first
+            unitofwork_flush(self.idta)
         newidta = insertta('''INSERT INTO ta (script,  status,parent,frompartner,topartner,fromchannel,tochannel,editype,messagetype,alt,merge,testindicator,reference,frommail,tomail,charset,contenttype,filename,idroute,nrmessages,botskey,envelope,rsrv3,cc)
                                 SELECT %(script)s,%(newstatus)s,idta,frompartner,topartner,fromchannel,tochannel,editype,messagetype,alt,merge,testindicator,reference,frommail,tomail,charset,contenttype,filename,idroute,nrmessages,botskey,envelope,rsrv3,cc
                                 FROM ta
@@ -146,6 +156,54 @@ class NewProcess(NewTransaction):
 #**********************************************************/**
 #*************************Database***********************/**
 #**********************************************************/**
+def unitofwork_start():
+    ''' start unit of work for db-ta (eg for translating one incoming file), if set in bots.ini (settings, unitofwork).
+        In a unit of work:
+        -   updates of db-ta are buffered, and written in batches (executemany).
+        -   inserts of db-ta are not committed directly.
+        -   all is committed in unitofwork_end().
+        Buffered updates are written before each query and before copying a ta; changeq() commits the unit of work so far (a failing query does a rollback).
+        If bots crashes during the unit of work, the changes not committed yet are lost; for an incoming file the file is not set to DONE, so it is translated again.
+    '''
+    if botsglobal.ini.getboolean('settings','unitofwork',False):
+        _Transaction.unitofwork = {}
+
+def unitofwork_end():
+    ''' end unit of work: write buffered updates of db-ta and commit.'''
+    if _Transaction.unitofwork is None:
+        return
+    try:
+        unitofwork_flush()
+        botsglobal.db.commit()
+    except:
+        botsglobal.db.rollback()
+        raise
+    finally:
+        _Transaction.unitofwork = None
+
+def unitofwork_flush(idta=None):
+    ''' write buffered updates of db-ta (for all ta's or for one ta) to database; no commit.
+        updates for the same fields are written with one executemany.
+    '''
+    if idta is None:
+        updates = _Transaction.unitofwork.items()
+        _Transaction.unitofwork = {}
+    else:
+        updates = [(idta,_Transaction.unitofwork.pop(idta))]
+    batches = {}
+    for idta,updatedict in updates:
+        updatedict['selfid'] = idta
+        batches.setdefault(tuple(sorted(updatedict)),[]).append(updatedict)
+    cursor = botsglobal.db.cursor()
+    try:
+        for keys,parameters in batches.items():
+            cursor.executemany('''UPDATE ta
+                                  SET '''+','.join(key+'=%('+key+')s' for key in keys if key != 'selfid')+ '''
+                                  WHERE idta=%(selfid)s''',
+                                  parameters)
+    finally:
+        cursor.close()
+
 def addinfocore(change,where,wherestring):
     ''' core function for add/changes information in db-ta's.
     '''
@@ -202,6 +260,8 @@ def changestatustinfo(change,where):
 
 def query(querystring,*args):
     ''' general query. yields rows from query '''
+    if _Transaction.unitofwork:
+        unitofwork_flush()
     cursor = botsglobal.db.cursor()
     cursor.execute(querystring,*args)
     results =  cursor.fetchall()
@@ -211,6 +271,9 @@ def query(querystring,*args):
 
 def changeq(querystring,*args):
     '''general inset/update. no return'''
+    if _Transaction.unitofwork is not None:     #commit unit of work so far; the rollback for a failing query should not undo it.
+        unitofwork_flush()
+        botsglobal.db.commit()
     cursor = botsglobal.db.cursor()
     try:
         cursor.execute(querystring,*args)
@@ -222,6 +285,20 @@ def changeq(querystring,*args):
     cursor.close()
     return terug
 
+def changemanyq(querystring,seq_of_parameters):
+    ''' as changeq, but the statement is executed for each dict of parameters (executemany); all is committed at once.'''
+    if _Transaction.unitofwork is not None:     #commit unit of work so far; the rollback for a failing query should not undo it.
+        unitofwork_flush()
+        botsglobal.db.commit()
+    cursor = botsglobal.db.cursor()
+    try:
+        cursor.executemany(querystring,seq_of_parameters)
+    except:
+        botsglobal.db.rollback()
+        raise
+    botsglobal.db.commit()
+    cursor.close()
+
 def insertta(querystring,*args):
     ''' insert ta
         from insert get back the idta; this is different with postgrSQL.
@@ -232,7 +309,8 @@ def insertta(querystring,*args):
     if not newidta:   #if botsglobal.settings.DATABASE_ENGINE ==
         cursor.execute('''SELECT lastval() as idta''')
         newidta = cursor.fetchone()['idta']
-    botsglobal.db.commit()
+    if _Transaction.unitofwork is None:         #in unit of work: commit in unitofwork_end()
+        botsglobal.db.commit()
     cursor.close()
     return newidta
 
@@ -257,32 +335,117 @@ def unique(domein,updatewith=None):
         - if updatewith is not None: return current number, update database with updatewith
         - if updatewith is None: return current number plus 1; update database with  current number plus 1
             if domain not used before, initialize with 1.
+            if a block size is set for domain in bots.ini (uniqueblocks): a block of numbers is reserved in database, numbers are given from memory.
     '''
     if botsglobal.ini.getboolean('acceptance','runacceptancetest',False):
         return unique_runcounter(domein)
+    if os.getpid() != _uniqueblocks_pid[0]:  #blocks are per process (worker processes are forked with blocks of parent)
+        _uniqueblocks.clear()
+        _uniqueblocks_pid[0] = os.getpid()
+    if updatewith is None:
+        blocksize = uniqueblocksize(domein)
+        if blocksize > 1:
+            block = _uniqueblocks.get(domein)
+            if block is None or block[0] > block[1]:
+                block = _uniqueblocks[domein] = list(_uniqueindb(domein,None,blocksize))
+            nummer = block[0]
+            block[0] += 1
+            return nummer
     else:
-        cursor = botsglobal.db.cursor()
-        try:
-            cursor.execute('''SELECT nummer FROM uniek WHERE domein=%(domein)s''',{'domein':domein})
-            nummer = cursor.fetchone()['nummer']
-            if updatewith is None:
-                nummer += 1
-                updatewith = nummer
-                if updatewith > MAXINT:
-                    updatewith = 0
-            cursor.execute('''UPDATE uniek SET nummer=%(nummer)s WHERE domein=%(domein)s''',{'domein':domein,'nummer':updatewith})
-        except TypeError: #if domein does not exist, cursor.fetchone returns None, so TypeError
-            cursor.execute('''INSERT INTO uniek (domein,nummer) VALUES (%(domein)s,1)''',{'domein': domein})
-            nummer = 1
+        _uniqueblocks.pop(domein,None)
+    return _uniqueindb(domein,updatewith)[0]
+
+_uniqueblocks = {}                  #domain: [next number, last number] of block reserved in database
+_uniqueblocks_pid = [os.getpid()]   #process the blocks are reserved for
+_uniqueblocksettings = {}           #parsed setting uniqueblocks in bots.ini
+
+def uniqueblocksize(domein):
+    ''' block size for domain as set in bots.ini (uniqueblocks); 0 if not set.
+        setting is comma separated list of domain:blocksize; domain ending with '*' is for all domains starting with it.
+    '''
+    setting = botsglobal.ini.get('settings','uniqueblocks',None) or ''
+    if setting not in _uniqueblocksettings:
+        domains = {}
+        prefixes = []
+        for item in setting.split(','):
+            if not item.strip():
+                continue
+            try:
+                domain,blocksize = item.rsplit(':',1)
+                blocksize = int(blocksize)
+            except ValueError:
+                raise BotsError('Invalid entry "%(item)s" for uniqueblocks in bots.ini; should be domain:blocksize.',{'item':item})
+            domain = domain.strip()
+            if domain.endswith('*'):
+                prefixes.append((domain[:-1],blocksize))
+            else:
+                domains[domain] = blocksize
+        _uniqueblocksettings.clear()
+        _uniqueblocksettings[setting] = (domains,prefixes)
+    domains,prefixes = _uniqueblocksettings[setting]
+    if domein in domains:
+        return domains[domein]
+    for prefix,blocksize in prefixes:
+        if domein.startswith(prefix):
+            return blocksize
+    return 0
+
+def _uniqueindb(domein,updatewith=None,blocksize=1):
+    ''' get/update counter for domain in database; returns (first,last) number given out.
+        if updatewith is None: blocksize numbers are reserved. The counter is increased in one UPDATE and read back in the same transaction:
+        the row is locked until commit, so processes running at the same time (eg translate_workers) never get the same numbers.
+        (a process waits for the lock; with SQLite it fails with "database is locked" if waiting takes too long).
+        after MAXINT the counter starts again with 1.
+    '''
+    if _Transaction.unitofwork is not None:     #commit unit of work so far (as in changeq); the rollback for a failing query should not undo it.
+        unitofwork_flush()
         botsglobal.db.commit()
-        cursor.close()
-        return nummer
+    cursor = botsglobal.db.cursor()
+    try:
+        if updatewith is None:
+            last = _increaseuniek(cursor,domein,blocksize)
+            if last is None:    #domein does not exist
+                try:
+                    cursor.execute('''INSERT INTO uniek (domein,nummer) VALUES (%(domein)s,%(nummer)s)''',{'domein': domein,'nummer':blocksize})
+                    last = blocksize
+                except:         #inserted by another process at the same time
+                    botsglobal.db.rollback()
+                    last = _increaseuniek(cursor,domein,blocksize)
+            nummer = last - blocksize + 1
+        else:
+            try:
+                cursor.execute('''SELECT nummer FROM uniek WHERE domein=%(domein)s''',{'domein':domein})
+                nummer = last = cursor.fetchone()['nummer']
+                cursor.execute('''UPDATE uniek SET nummer=%(nummer)s WHERE domein=%(domein)s''',{'domein':domein,'nummer':updatewith})
+            except TypeError: #if domein does not exist, cursor.fetchone returns None, so TypeError
+                cursor.execute('''INSERT INTO uniek (domein,nummer) VALUES (%(domein)s,1)''',{'domein': domein})
+                nummer = last = 1
+    except:
+        botsglobal.db.rollback()    #release lock
+        raise
+    botsglobal.db.commit()
+    cursor.close()
+    return nummer,last
+
+def _increaseuniek(cursor,domein,blocksize):
+    ''' increase counter in database by blocksize (in one UPDATE, also the start again after MAXINT); returns the new value, None if domein does not exist.'''
+    cursor.execute('''UPDATE uniek
+                      SET nummer=CASE WHEN nummer>%(maxnummer)s THEN %(blocksize)s ELSE nummer+%(blocksize)s END
+                      WHERE domein=%(domein)s''',
+                      {'domein':domein,'blocksize':blocksize,'maxnummer':MAXINT-blocksize})
+    if not cursor.rowcount:
+        return None
+    cursor.execute('''SELECT nummer FROM uniek WHERE domein=%(domein)s''',{'domein':domein})
+    return cursor.fetchone()['nummer']
 
 def checkunique(domein, receivednumber):
     ''' to check if received number is sequential: value is compare with new generated number.
         if domain not used before, initialize it . '1' is the first value expected.
     '''
-    newnumber = unique(domein)
+    if botsglobal.ini.getboolean('acceptance','runacceptancetest',False):
+        newnumber = unique_runcounter(domein)
+    else:
+        newnumber = _uniqueindb(domein)[0]     #always from database, not from a block: counter is reset if not OK
     if newnumber  == receivednumber:
         return True
     else:
@@ -425,6 +588,13 @@ def botsimport(*args):
     else:
         botsglobal.logger.debug('Imported "%(modulefile)s".',{'modulefile':modulefile})
         return module,modulefile
+
+def botsimport_clear():
+    ''' remove imported usersys modules, so botsimport imports these again (eg when files in usersys have changed).'''
+    prefix = botsglobal.usersysimportpath + '.'
+    for modulepath in [modulepath for modulepath in sys.modules if modulepath.startswith(prefix)]:
+        del sys.modules[modulepath]
+    botsglobal.not_import.clear()
 #**********************************************************/**
 #*************************File handling os.path etc***********************/**
 #**********************************************************/**
@@ -437,7 +607,12 @@ def join(*paths):
 
 def dirshouldbethere(path):
     if path and not os.path.exists(path):
-        os.makedirs(path)
+        try:
+            os.makedirs(path)
+        except OSError as msg:     #directory might be made at the same time by another process/thread (eg translate_workers, ftptransfers)
+            if msg.errno != errno.EEXIST or not os.path.isdir(path):
+                raise
+            return False
         return True
     return False
 
@@ -707,6 +882,62 @@ def countoutfiles(idchannel,rootidta):
 
 def lookup_translation(frommessagetype,fromeditype,alt,frompartner,topartner):
     ''' lookup the translation: frommessagetype,fromeditype,alt,frompartner,topartner -> mappingscript, tomessagetype, toeditype
+        uses in-memory translations (read once per run); same results as lookup_translation_query.
+    '''
+    if botsglobal.translations is None:
+        botsglobal.translations = TranslationResolver()
+    return botsglobal.translations.lookup(frommessagetype,fromeditype,alt,frompartner,topartner)
+
+class TranslationResolver(object):
+    ''' translate and partnergroup tables are small and do not change during a run: read these into memory. Reason: performance.
+        Selection and order of translations are as in lookup_translation_query:
+        -   specific alt before alt ''
+        -   specific frompartner (or partnergroup) before NULL; then on frompartner
+        -   specific topartner (or partnergroup) before NULL; then on topartner
+        results are memoized per (fromeditype,frommessagetype,alt,frompartner,topartner).
+    '''
+    def __init__(self):
+        self.translations = {}      #(fromeditype,frommessagetype) -> list of active translations
+        for row in query('''SELECT fromeditype,frommessagetype,alt,frompartner_id,topartner_id,tscript,toeditype,tomessagetype
+                            FROM translate
+                            WHERE active=%(booll)s ''',
+                            {'booll':True}):
+            self.translations.setdefault((row['fromeditype'],row['frommessagetype']),[]).append(dict(row))
+        self.partnergroups = {}     #partner -> set of partnergroups of partner
+        for row in query('''SELECT from_partner_id,to_partner_id
+                            FROM partnergroup'''):
+            self.partnergroups.setdefault(row['from_partner_id'],set()).add(row['to_partner_id'])
+        self.memo = {}
+
+    def lookup(self,frommessagetype,fromeditype,alt,frompartner,topartner):
+        key = (fromeditype,frommessagetype,alt,frompartner,topartner)
+        if key not in self.memo:
+            self.memo[key] = self._lookup(frommessagetype,fromeditype,alt,frompartner,topartner)
+        return self.memo[key]
+
+    def _lookup(self,frommessagetype,fromeditype,alt,frompartner,topartner):
+        frompartners = self.partnergroups.get(frompartner,set()) | set([frompartner])
+        topartners = self.partnergroups.get(topartner,set()) | set([topartner])
+        found = None
+        for translation in self.translations.get((fromeditype,frommessagetype),()):
+            if translation['alt'] != '' and translation['alt'] != alt:
+                continue
+            if translation['frompartner_id'] is not None and translation['frompartner_id'] not in frompartners:
+                continue
+            if translation['topartner_id'] is not None and translation['topartner_id'] not in topartners:
+                continue
+            sortkey = (translation['alt'] == '',
+                       translation['frompartner_id'] is None, translation['frompartner_id'] or '',
+                       translation['topartner_id'] is None, translation['topartner_id'] or '')
+            if found is None or sortkey < found[0]:
+                found = (sortkey,translation)
+        if found is None:   #no translation found in translate table
+            return None,None,None
+        return found[1]['tscript'],found[1]['toeditype'],found[1]['tomessagetype']
+
+def lookup_translation_query(frommessagetype,fromeditype,alt,frompartner,topartner):
+    ''' lookup the translation: frommessagetype,fromeditype,alt,frompartner,topartner -> mappingscript, tomessagetype, toeditype
+        via query on database.
     '''
     for row2 in query('''SELECT tscript,tomessagetype,toeditype
                             FROM translate
@@ -734,6 +965,25 @@ def lookup_translation(frommessagetype,fromeditype,alt,frompartner,topartner):
     else:       #no translation found in translate table
         return None,None,None
 
+def mark_ccode_changed():
+    ''' ccode table is changed (via GUI, plugin): codes cached in bots-engine (transform.ccodecache) are not valid anymore.
+        Marked by writing a new value to file botssys/ccodechanged; bots-engine checks this file for each incoming file.
+        an error in writing the marker is logged (change of ccode itself is OK).
+    '''
+    try:
+        with open(join(botsglobal.ini.get('directories','botssys'),'ccodechanged'),'w') as markerfile:
+            markerfile.write(python_datetime.datetime.now().isoformat())
+    except Exception as msg:
+        botsglobal.logger.error('Error in marking change of user codes for cache in bots-engine: %(msg)s',{'msg':msg})
+
+def read_ccode_changed():
+    ''' returns value of marker written by mark_ccode_changed; None if not marked.'''
+    try:
+        with open(join(botsglobal.ini.get('directories','botssys'),'ccodechanged'),'r') as markerfile:
+            return markerfile.read()
+    except IOError:
+        return None
+
 def botsinfo():
     return [
             ('served at port',botsglobal.ini.getint('webserver','port',8080)),
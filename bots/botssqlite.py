@@ -30,3 +30,6 @@ class BotsCursor(sqlite3.Cursor):
         else:
             sqlite3.Cursor.execute(self,reformatparamstyle.sub(''':\g<name>''',string),parameters)
 
+    def executemany(self,string,seq_of_parameters):
+        sqlite3.Cursor.executemany(self,reformatparamstyle.sub(''':\g<name>''',string),seq_of_parameters)
+
@@ -8,6 +8,9 @@ import glob
 import shutil
 import fnmatch
 import zipfile
+import threading
+import collections
+import multiprocessing.pool
 import json as simplejson
 import email
 import email.utils
@@ -1125,25 +1128,221 @@ class mimefile(file):
     def precommunicate(self):
         self.file2mime()
 
-class ftp(_comsession):
+#connection pool for ftp and sftp: idle sessions that can be reused by channels for the same server and user.
+#the pool is kept during an engine run (or in a worker process); closed by closeconnections().
+_connections = {}
+_connections_lock = threading.Lock()
+
+def forgetconnections():
+    ''' empty the ftp/sftp connection pool without closing the sessions.
+        used in a worker process that is forked from the engine: the sessions in the pool are the sessions of the engine.
+    '''
+    global _connections_lock
+    _connections.clear()
+    _connections_lock = threading.Lock()    #lock might have been held by a thread of the engine when forked
+
+def closeconnections():
+    ''' close the idle sessions in the ftp/sftp connection pool.'''
+    with _connections_lock:
+        connections = [connection for idle in _connections.values() for connection in idle]
+        _connections.clear()
+    for sessionclass,session,homedir,dirpath in connections:
+        try:
+            sessionclass.closesession(session)
+        except:
+            pass
+
+
+class _transfersession(_comsession):
+    ''' Abstract class for file transfer sessions (ftp, sftp). Use only subclasses.
+        -   if set in bots.ini (ftpkeepconnections) sessions are put in a connection pool after use, and reused.
+        -   if set in bots.ini (ftptransfers) files are transferred in parallel, each transfer with its own session.
+        Subclasses implement opensession, closesession, sessionalive, gethomedir and changedir.
+        if connect or set_cwd is overridden in a communication script, sessions are not pooled and files are transferred one after another.
+    '''
+    homedir = None      #directory on server after login; is set in connect()
+
+    def connect(self):
+        if self.overridden('set_cwd'):      #communication script sets directory: own session, not pooled
+            self.session = self.opensession()
+            self.set_cwd()
+        else:
+            self.session,self.homedir,self.dirpath = self.getsession()
+
+    def overridden(self,name):
+        ''' method is overridden in a communication script (subclass of channel class).'''
+        for cls in type(self).__mro__:
+            if name in cls.__dict__:
+                return cls.__module__ != __name__
+        return False
+
+    def disconnect(self):
+        self.releasesession(self.session,self.homedir,self.dirpath)
+
+    def sessionkey(self):
+        ''' sessions with the same key can be reused.'''
+        return (self.__class__,self.scriptname,self.channeldict['host'],self.channeldict['port'],self.channeldict['username'],self.channeldict['secret'],
+                self.channeldict['ftpaccount'],self.channeldict['ftpactive'],self.channeldict['keyfile'],self.channeldict['certfile'],self.channeldict['parameters'])
+
+    def getsession(self):
+        ''' get a session (from the connection pool or a new one) in the directory of the channel.
+            returns: session,homedir,dirpath
+        '''
+        key = self.sessionkey()
+        while True:
+            with _connections_lock:
+                idle = _connections.get(key)
+                connection = idle.pop() if idle else None
+            if connection is None:
+                session = self.opensession()
+                homedir = currentdir = self.gethomedir(session)
+                break
+            sessionclass,session,homedir,currentdir = connection
+            if self.sessionalive(session):
+                break
+            try:
+                self.closesession(session)
+            except:
+                pass
+        dirpath = posixpath.normpath(posixpath.join(homedir,self.channeldict['path'])) if self.channeldict['path'] else homedir
+        if dirpath != currentdir:
+            self.changedir(session,dirpath)
+        return session,homedir,dirpath
+
+    def releasesession(self,session,homedir,dirpath):
+        ''' put session in connection pool (if set in bots.ini), else close the session.'''
+        if homedir is not None and botsglobal.ini.getboolean('settings','ftpkeepconnections',False):
+            with _connections_lock:
+                _connections.setdefault(self.sessionkey(),[]).append((self.__class__,session,homedir,dirpath))
+        else:
+            self.closesession(session)
+
+    def _outtasks(self,filename_mask,mode):
+        ''' files to send; each as ((row,ta_from,ta_to,tofilename),(fromfilename,tofilename,mode)).'''
+        for row in botslib.query('''SELECT idta,filename,numberofresends
+                                    FROM ta
+                                    WHERE idta>%(rootidta)s
+                                      AND status=%(status)s
+                                      AND statust=%(statust)s
+                                      AND tochannel=%(tochannel)s
+                                      ORDER BY idta
+                                        ''',
+                                    {'tochannel':self.channeldict['idchannel'],'rootidta':self.rootidta,
+                                    'status':FILEOUT,'statust':OK}):
+            ta_from = botslib.OldTransaction(row['idta'])
+            ta_to = ta_from.copyta(status=EXTERNOUT)
+            try:
+                tofilename = self.filename_formatter(filename_mask,ta_from)
+            except:
+                txt = botslib.txtexc()
+                ta_to.update(statust=ERROR,errortext=txt,numberofresends=row['numberofresends']+1)
+                ta_from.update(statust=DONE)
+                continue
+            yield (row,ta_from,ta_to,tofilename),(row['filename'],tofilename,mode)
+
+    def transfer(self,function,tasks):
+        ''' for each (context,args) in tasks: function(session,*args), eg upload or download of one file.
+            generator, gives back (context,result,errortext) in order of tasks; errortext is None if function was OK.
+            tasks are made in this thread, so database actions can be done when making a task.
+            if set in bots.ini (ftptransfers) the transfers are done in parallel, each with its own session.
+            not if connect or set_cwd is overridden in a communication script: extra sessions would not be made that way.
+        '''
+        nr_transfers = botsglobal.ini.getint('settings','ftptransfers',1)
+        if nr_transfers <= 1 or self.overridden('connect') or self.overridden('set_cwd'):
+            for context,args in tasks:
+                try:
+                    result = function(self.session,*args)
+                except:
+                    yield context,None,botslib.txtexc()
+                else:
+                    yield context,result,None
+            return
+        idle = []       #sessions of the transfers; reused for next transfers
+        threadpool = multiprocessing.pool.ThreadPool(nr_transfers)
+        pending = collections.deque()
+        try:
+            for context,args in tasks:
+                pending.append((context,threadpool.apply_async(self._transfer,(function,args,idle))))
+                if len(pending) >= nr_transfers:
+                    yield self._transferresult(*pending.popleft())
+            while pending:
+                yield self._transferresult(*pending.popleft())
+        finally:
+            threadpool.close()
+            threadpool.join()
+            for connection in idle:
+                self.releasesession(*connection)
+
+    def _transfer(self,function,args,idle):
+        ''' in thread of transfer: function(session,*args)'''
+        try:
+            connection = idle.pop()
+        except IndexError:
+            connection = self.getsession()
+        try:
+            result = function(connection[0],*args)
+        except:
+            try:
+                self.closesession(connection[0])    #state of session is not known
+            except:
+                pass
+            raise
+        idle.append(connection)
+        return result
+
+    @staticmethod
+    def _transferresult(context,asyncresult):
+        try:
+            return context,asyncresult.get(),None
+        except:
+            return context,None,botslib.txtexc()
+
+
+class ftp(_transfersession):
     def connect(self):
         botslib.settimeout(botsglobal.ini.getint('settings','ftptimeout',10))
-        self.session = ftplib.FTP()
-        self.session.set_debuglevel(botsglobal.ini.getint('settings','ftpdebug',0))   #set debug level (0=no, 1=medium, 2=full debug)
-        self.session.set_pasv(not self.channeldict['ftpactive']) #active or passive ftp
-        self.session.connect(host=self.channeldict['host'],port=int(self.channeldict['port']))
-        self.session.login(user=self.channeldict['username'],passwd=self.channeldict['secret'],acct=self.channeldict['ftpaccount'])
-        self.set_cwd()
+        super(ftp,self).connect()
+
+    def opensession(self):
+        session = ftplib.FTP()
+        session.set_debuglevel(botsglobal.ini.getint('settings','ftpdebug',0))   #set debug level (0=no, 1=medium, 2=full debug)
+        session.set_pasv(not self.channeldict['ftpactive']) #active or passive ftp
+        session.connect(host=self.channeldict['host'],port=int(self.channeldict['port']))
+        session.login(user=self.channeldict['username'],passwd=self.channeldict['secret'],acct=self.channeldict['ftpaccount'])
+        return session
+
+    @staticmethod
+    def closesession(session):
+        try:
+            session.quit()
+        except:
+            session.close()
+
+    @staticmethod
+    def sessionalive(session):
+        try:
+            session.voidcmd('NOOP')
+        except:
+            return False
+        return True
+
+    @staticmethod
+    def gethomedir(session):
+        return session.pwd()
+
+    @staticmethod
+    def changedir(session,dirpath):
+        try:
+            session.cwd(dirpath)           #set right path on ftp-server
+        except:
+            session.mkd(dirpath)           #set right path on ftp-server; no nested directories
+            session.cwd(dirpath)           #set right path on ftp-server
 
     def set_cwd(self):
         self.dirpath = self.session.pwd()
         if self.channeldict['path']:
             self.dirpath = posixpath.normpath(posixpath.join(self.dirpath,self.channeldict['path']))
-            try:
-                self.session.cwd(self.dirpath)           #set right path on ftp-server
-            except:
-                self.session.mkd(self.dirpath)           #set right path on ftp-server; no nested directories
-                self.session.cwd(self.dirpath)           #set right path on ftp-server
+            self.changedir(self.session,self.dirpath)
 
     @botslib.log_session
     def incommunicate(self):
@@ -1151,10 +1350,6 @@ class ftp(_comsession):
             each to be imported file is transaction.
             each imported file is transaction.
         '''
-        def writeline_callback(line):
-            ''' inline function to write to file for non-binary ftp
-            '''
-            tofile.write(line + '\n')
         startdatetime = datetime.datetime.now()
         files = []
         try:            #some ftp servers give errors when directory is empty; catch these errors here
@@ -1164,57 +1359,60 @@ class ftp(_comsession):
                 raise
 
         lijst = fnmatch.filter(files,self.channeldict['filename'])
-        remove_ta = False
-        for fromfilename in lijst:  #fetch messages from ftp-server.
-            try:
-                ta_from = botslib.NewTransaction(filename='ftp:/'+posixpath.join(self.dirpath,fromfilename),
-                                                    status=EXTERNIN,
-                                                    fromchannel=self.channeldict['idchannel'],
-                                                    idroute=self.idroute)
-                ta_to =   ta_from.copyta(status=FILEIN)
-                remove_ta = True
-                tofilename = unicode(ta_to.idta)
+        def tasks():
+            for fromfilename in lijst:  #fetch messages from ftp-server.
                 try:
-                    if self.channeldict['ftpbinary']:
-                        tofile = botslib.opendata_bin(tofilename, 'wb')
-                        self.session.retrbinary('RETR ' + fromfilename, tofile.write)
-                    else:
-                        tofile = botslib.opendata(tofilename, 'wb',charset='latin-1')   #python3 gives back a 'string'.
-                        self.session.retrlines('RETR ' + fromfilename, writeline_callback)
-                except ftplib.error_perm as msg:
-                    if unicode(msg)[:3] in ['550',]:     #we are trying to download a directory...
-                        raise botslib.BotsError('To be catched')
-                    else:
-                        raise
-                tofile.close()
-                filesize = os.path.getsize(botslib.abspathdata(tofilename))
-                if not filesize:
-                    raise botslib.BotsError('To be catched; directory (or empty file)')
-            except botslib.BotsError:   #directory or empty file; handle exception but generate no error.
-                if remove_ta:
-                    try:
-                        ta_from.delete()
-                        ta_to.delete()
-                    except:
-                        pass
-            except:
-                txt = botslib.txtexc()
-                botslib.ErrorProcess(functionname='ftp-incommunicate',errortext=txt,channeldict=self.channeldict)
-                if remove_ta:
-                    try:
-                        ta_from.delete()
-                        ta_to.delete()
-                    except:
-                        pass
+                    ta_from = botslib.NewTransaction(filename='ftp:/'+posixpath.join(self.dirpath,fromfilename),
+                                                        status=EXTERNIN,
+                                                        fromchannel=self.channeldict['idchannel'],
+                                                        idroute=self.idroute)
+                    ta_to =   ta_from.copyta(status=FILEIN)
+                except:
+                    txt = botslib.txtexc()
+                    botslib.ErrorProcess(functionname='ftp-incommunicate',errortext=txt,channeldict=self.channeldict)
+                else:
+                    yield (fromfilename,ta_from,ta_to),(fromfilename,unicode(ta_to.idta))
+                if (datetime.datetime.now()-startdatetime).seconds >= self.maxsecondsperchannel:
+                    break
+        for (fromfilename,ta_from,ta_to),filesize,txt in self.transfer(self.download,tasks()):
+            if txt is not None or not filesize:     #error; or directory or empty file: handle but generate no error.
+                if txt is not None:
+                    botslib.ErrorProcess(functionname='ftp-incommunicate',errortext=txt,channeldict=self.channeldict)
+                try:
+                    ta_from.delete()
+                    ta_to.delete()
+                except:
+                    pass
             else:
-                ta_to.update(filename=tofilename,statust=OK,filesize=filesize)
+                ta_to.update(filename=unicode(ta_to.idta),statust=OK,filesize=filesize)
                 ta_from.update(statust=DONE)
                 if self.channeldict['remove']:
                     self.session.delete(fromfilename)
-            finally:
-                remove_ta = False
-                if (datetime.datetime.now()-startdatetime).seconds >= self.maxsecondsperchannel:
-                    break
+
+    def download(self,session,fromfilename,tofilename):
+        ''' receive one file; returns filesize (0 for directory or empty file).'''
+        def writeline_callback(line):
+            ''' inline function to write to file for non-binary ftp
+            '''
+            tofile.write(line + '\n')
+        try:
+            if self.channeldict['ftpbinary']:
+                tofile = botslib.opendata_bin(tofilename, 'wb')
+                try:
+                    session.retrbinary('RETR ' + fromfilename, tofile.write)
+                finally:
+                    tofile.close()
+            else:
+                tofile = botslib.opendata(tofilename, 'wb',charset='latin-1')   #python3 gives back a 'string'.
+                try:
+                    session.retrlines('RETR ' + fromfilename, writeline_callback)
+                finally:
+                    tofile.close()
+        except ftplib.error_perm as msg:
+            if unicode(msg)[:3] in ['550',]:     #we are trying to download a directory...
+                return 0
+            raise
+        return os.path.getsize(botslib.abspathdata(tofilename))
 
     @botslib.log_session
     def outcommunicate(self):
@@ -1230,45 +1428,33 @@ class ftp(_comsession):
             mode = 'STOR '
         else:
             mode = 'APPE '
-        for row in botslib.query('''SELECT idta,filename,numberofresends
-                                    FROM ta
-                                    WHERE idta>%(rootidta)s
-                                      AND status=%(status)s
-                                      AND statust=%(statust)s
-                                      AND tochannel=%(tochannel)s
-                                      ORDER BY idta
-                                        ''',
-                                    {'tochannel':self.channeldict['idchannel'],'rootidta':self.rootidta,
-                                    'status':FILEOUT,'statust':OK}):
-            try:
-                ta_from = botslib.OldTransaction(row['idta'])
-                ta_to = ta_from.copyta(status=EXTERNOUT)
-                tofilename = self.filename_formatter(filename_mask,ta_from)
-                fromfile = botslib.opendata_bin(row['filename'], 'rb')
-                if self.channeldict['ftpbinary']:
-                    self.session.storbinary(mode + tofilename, fromfile)
-                else:
-                    self.session.storlines(mode + tofilename, fromfile)
-                fromfile.close()
-                #Rename filename after writing file.
-                #Function: safe file writing: do not want another process to read the file while it is being written.
-                if self.channeldict['mdnchannel']:
-                    tofilename_old = tofilename
-                    tofilename = botslib.rreplace(tofilename_old,self.channeldict['mdnchannel'])
-                    self.session.rename(tofilename_old,tofilename)
-            except:
-                txt = botslib.txtexc()
+        for (row,ta_from,ta_to,tofilename),sendfilename,txt in self.transfer(self.upload,self._outtasks(filename_mask,mode)):
+            if txt is not None:
                 ta_to.update(statust=ERROR,errortext=txt,filename='ftp:/'+posixpath.join(self.dirpath,tofilename),numberofresends=row['numberofresends']+1)
             else:
-                ta_to.update(statust=DONE,filename='ftp:/'+posixpath.join(self.dirpath,tofilename),numberofresends=row['numberofresends']+1)
-            finally:
-                ta_from.update(statust=DONE)
+                ta_to.update(statust=DONE,filename='ftp:/'+posixpath.join(self.dirpath,sendfilename),numberofresends=row['numberofresends']+1)
+            ta_from.update(statust=DONE)
 
-    def disconnect(self):
+    def upload(self,session,fromfilename,tofilename,mode):
+        ''' send one file; returns the filename on the server.'''
+        fromfile = botslib.opendata_bin(fromfilename, 'rb')
         try:
-            self.session.quit()
-        except:
-            self.session.close()
+            if self.channeldict['ftpbinary']:
+                session.storbinary(mode + tofilename, fromfile)
+            else:
+                session.storlines(mode + tofilename, fromfile)
+        finally:
+            fromfile.close()
+        #Rename filename after writing file.
+        #Function: safe file writing: do not want another process to read the file while it is being written.
+        if self.channeldict['mdnchannel']:
+            tofilename_old = tofilename
+            tofilename = botslib.rreplace(tofilename_old,self.channeldict['mdnchannel'])
+            session.rename(tofilename_old,tofilename)
+        return tofilename
+
+    def disconnect(self):
+        super(ftp,self).disconnect()
         botslib.settimeout(botsglobal.ini.getint('settings','globaltimeout',10))
 
 class ftps(ftp):
@@ -1276,18 +1462,17 @@ class ftps(ftp):
         standard port to connect to is as in normal FTP (port 21)
         ftps is supported by python >= 2.7
     '''
-    def connect(self):
+    def opensession(self):
         if not hasattr(ftplib,'FTP_TLS'):
             raise botslib.CommunicationError('ftps is not supported by your python version, use >=2.7')
-        botslib.settimeout(botsglobal.ini.getint('settings','ftptimeout',10))
-        self.session = ftplib.FTP_TLS(keyfile=self.channeldict['keyfile'],certfile=self.channeldict['certfile'])
-        self.session.set_debuglevel(botsglobal.ini.getint('settings','ftpdebug',0))   #set debug level (0=no, 1=medium, 2=full debug)
-        self.session.set_pasv(not self.channeldict['ftpactive']) #active or passive ftp
-        self.session.connect(host=self.channeldict['host'],port=int(self.channeldict['port']))
-        self.session.auth()
-        self.session.login(user=self.channeldict['username'],passwd=self.channeldict['secret'],acct=self.channeldict['ftpaccount'])
-        self.session.prot_p()
-        self.set_cwd()
+        session = ftplib.FTP_TLS(keyfile=self.channeldict['keyfile'],certfile=self.channeldict['certfile'])
+        session.set_debuglevel(botsglobal.ini.getint('settings','ftpdebug',0))   #set debug level (0=no, 1=medium, 2=full debug)
+        session.set_pasv(not self.channeldict['ftpactive']) #active or passive ftp
+        session.connect(host=self.channeldict['host'],port=int(self.channeldict['port']))
+        session.auth()
+        session.login(user=self.channeldict['username'],passwd=self.channeldict['secret'],acct=self.channeldict['ftpaccount'])
+        session.prot_p()
+        return session
 
 
 #sub classing of ftplib for ftpis
@@ -1344,29 +1529,28 @@ class ftpis(ftp):
         ~ ssl.PROTOCOL_SSLv23 = 2
         ~ ssl.PROTOCOL_TLSv1  = 3
     '''
-    def connect(self):
+    def opensession(self):
         if not hasattr(ftplib,'FTP_TLS'):
             raise botslib.CommunicationError('ftpis is not supported by your python version, use >=2.7')
-        botslib.settimeout(botsglobal.ini.getint('settings','ftptimeout',10))
-        self.session = Ftp_tls_implicit(keyfile=self.channeldict['keyfile'],certfile=self.channeldict['certfile'])
+        session = Ftp_tls_implicit(keyfile=self.channeldict['keyfile'],certfile=self.channeldict['certfile'])
         if self.channeldict['parameters']:
-            self.session.ssl_version = int(self.channeldict['parameters'])
-        self.session.set_debuglevel(botsglobal.ini.getint('settings','ftpdebug',0))   #set debug level (0=no, 1=medium, 2=full debug)
-        self.session.set_pasv(not self.channeldict['ftpactive']) #active or passive ftp
-        self.session.connect(host=self.channeldict['host'],port=int(self.channeldict['port']))
-        #~ self.session.auth()
-        self.session.login(user=self.channeldict['username'],passwd=self.channeldict['secret'],acct=self.channeldict['ftpaccount'])
-        self.session.prot_p()
-        self.set_cwd()
+            session.ssl_version = int(self.channeldict['parameters'])
+        session.set_debuglevel(botsglobal.ini.getint('settings','ftpdebug',0))   #set debug level (0=no, 1=medium, 2=full debug)
+        session.set_pasv(not self.channeldict['ftpactive']) #active or passive ftp
+        session.connect(host=self.channeldict['host'],port=int(self.channeldict['port']))
+        #~ session.auth()
+        session.login(user=self.channeldict['username'],passwd=self.channeldict['secret'],acct=self.channeldict['ftpaccount'])
+        session.prot_p()
+        return session
 
 
-class sftp(_comsession):
+class sftp(_transfersession):
     ''' SFTP: SSH File Transfer Protocol (SFTP is not FTP run over SSH, SFTP is not Simple File Transfer Protocol)
         standard port to connect to is port 22.
         requires paramiko.
         based on class ftp and ftps above with code from demo_sftp.py which is included with paramiko
     '''
-    def connect(self):
+    def opensession(self):
         try:
             import paramiko
         except:
@@ -1413,29 +1597,49 @@ class sftp(_comsession):
             pkey = None
 
         #connect and use paramiko Transport to negotiate SSH2 across the connection
-        self.transport = paramiko.Transport((hostname,port))
-        self.transport.connect(username=self.channeldict['username'],password=secret,hostkey=hostkey,pkey=pkey)
-        self.session = paramiko.SFTPClient.from_transport(self.transport)
-        channel = self.session.get_channel()
+        transport = paramiko.Transport((hostname,port))
+        transport.connect(username=self.channeldict['username'],password=secret,hostkey=hostkey,pkey=pkey)
+        session = paramiko.SFTPClient.from_transport(transport)
+        channel = session.get_channel()
         channel.settimeout(botsglobal.ini.getint('settings','ftptimeout',10))
-        self.set_cwd()
+        return session
 
+    def connect(self):
+        super(sftp,self).connect()
+        self.transport = self.session.get_channel().get_transport()
+
+    @staticmethod
+    def closesession(session):
+        transport = session.get_channel().get_transport()
+        session.close()
+        transport.close()
+
+    @staticmethod
+    def sessionalive(session):
+        try:
+            session.stat('.')
+        except:
+            return False
+        return True
+
+    @staticmethod
+    def gethomedir(session):
+        session.chdir('.')     #getcwd does not work without this chdir first!
+        return session.getcwd()
+
+    @staticmethod
+    def changedir(session,dirpath):
+        try:
+            session.chdir(dirpath)
+        except:
+            session.mkdir(dirpath)
+            session.chdir(dirpath)
 
     def set_cwd(self):
-        self.session.chdir('.')     #getcwd does not work without this chdir first!
-        self.dirpath = self.session.getcwd()
+        self.dirpath = self.gethomedir(self.session)
         if self.channeldict['path']:
             self.dirpath = posixpath.normpath(posixpath.join(self.dirpath,self.channeldict['path']))
-            try:
-                self.session.chdir(self.dirpath)
-            except:
-                self.session.mkdir(self.dirpath)
-                self.session.chdir(self.dirpath)
-
-    def disconnect(self):
-        self.session.close()
-        self.transport.close()
-
+            self.changedir(self.session,self.dirpath)
 
     @botslib.log_session
     def incommunicate(self):
@@ -1446,41 +1650,45 @@ class sftp(_comsession):
         startdatetime = datetime.datetime.now()
         files = self.session.listdir('.')
         lijst = fnmatch.filter(files,self.channeldict['filename'])
-        remove_ta = False
-        for fromfilename in lijst:  #fetch messages from sftp-server.
-            try:
-                ta_from = botslib.NewTransaction(filename='sftp:/'+posixpath.join(self.dirpath,fromfilename),
-                                                    status=EXTERNIN,
-                                                    fromchannel=self.channeldict['idchannel'],
-                                                    idroute=self.idroute)
-                ta_to =   ta_from.copyta(status=FILEIN)
-                remove_ta = True
-                tofilename = unicode(ta_to.idta)
-                fromfile = self.session.open(fromfilename, 'r')    # SSH treats all files as binary. paramiko doc says: b-flag is ignored
-                content = fromfile.read()
-                filesize = len(content)
-                tofile = botslib.opendata_bin(tofilename, 'wb')
-                tofile.write(content)
-                tofile.close()
-                fromfile.close()
-            except:
-                txt = botslib.txtexc()
+        def tasks():
+            for fromfilename in lijst:  #fetch messages from sftp-server.
+                try:
+                    ta_from = botslib.NewTransaction(filename='sftp:/'+posixpath.join(self.dirpath,fromfilename),
+                                                        status=EXTERNIN,
+                                                        fromchannel=self.channeldict['idchannel'],
+                                                        idroute=self.idroute)
+                    ta_to =   ta_from.copyta(status=FILEIN)
+                except:
+                    txt = botslib.txtexc()
+                    botslib.ErrorProcess(functionname='sftp-incommunicate',errortext=txt,channeldict=self.channeldict)
+                else:
+                    yield (fromfilename,ta_from,ta_to),(fromfilename,unicode(ta_to.idta))
+                if (datetime.datetime.now()-startdatetime).seconds >= self.maxsecondsperchannel:
+                    break
+        for (fromfilename,ta_from,ta_to),filesize,txt in self.transfer(self.download,tasks()):
+            if txt is not None:
                 botslib.ErrorProcess(functionname='sftp-incommunicate',errortext=txt,channeldict=self.channeldict)
-                if remove_ta:
-                    try:
-                        ta_from.delete()
-                        ta_to.delete()
-                    except:
-                        pass
+                try:
+                    ta_from.delete()
+                    ta_to.delete()
+                except:
+                    pass
             else:
-                ta_to.update(filename=tofilename,statust=OK,filesize=filesize)
+                ta_to.update(filename=unicode(ta_to.idta),statust=OK,filesize=filesize)
                 ta_from.update(statust=DONE)
                 if self.channeldict['remove']:
                     self.session.remove(fromfilename)
-            finally:
-                remove_ta = False
-                if (datetime.datetime.now()-startdatetime).seconds >= self.maxsecondsperchannel:
-                    break
+
+    @staticmethod
+    def download(session,fromfilename,tofilename):
+        ''' receive one file; returns filesize.'''
+        fromfile = session.open(fromfilename, 'r')    # SSH treats all files as binary. paramiko doc says: b-flag is ignored
+        content = fromfile.read()
+        tofile = botslib.opendata_bin(tofilename, 'wb')
+        tofile.write(content)
+        tofile.close()
+        fromfile.close()
+        return len(content)
 
     @botslib.log_session
     def outcommunicate(self):
@@ -1495,38 +1703,27 @@ class sftp(_comsession):
             mode = 'w'
         else:
             mode = 'a'
-        for row in botslib.query('''SELECT idta,filename,numberofresends
-                                    FROM ta
-                                    WHERE idta>%(rootidta)s
-                                      AND status=%(status)s
-                                      AND statust=%(statust)s
-                                      AND tochannel=%(tochannel)s
-                                      ORDER BY idta
-                                    ''',
-                                    {'tochannel':self.channeldict['idchannel'],'rootidta':self.rootidta,
-                                    'status':FILEOUT,'statust':OK}):
-            try:
-                ta_from = botslib.OldTransaction(row[str('idta')])
-                ta_to = ta_from.copyta(status=EXTERNOUT)
-                tofilename = self.filename_formatter(filename_mask,ta_from)
-                fromfile = botslib.opendata_bin(row[str('filename')], 'rb')
-                tofile = self.session.open(tofilename, mode)    # SSH treats all files as binary. paramiko doc says: b-flag is ignored
-                tofile.write(fromfile.read())
-                tofile.close()
-                fromfile.close()
-                #Rename filename after writing file.
-                #Function: safe file writing: do not want another process to read the file while it is being written.
-                if self.channeldict['mdnchannel']:
-                    tofilename_old = tofilename
-                    tofilename = botslib.rreplace(tofilename_old,self.channeldict['mdnchannel'])
-                    self.session.rename(tofilename_old,tofilename)
-            except:
-                txt = botslib.txtexc()
+        for (row,ta_from,ta_to,tofilename),sendfilename,txt in self.transfer(self.upload,self._outtasks(filename_mask,mode)):
+            if txt is not None:
                 ta_to.update(statust=ERROR,errortext=txt,filename='sftp:/'+posixpath.join(self.dirpath,tofilename),numberofresends=row['numberofresends']+1)
             else:
-                ta_to.update(statust=DONE,filename='sftp:/'+posixpath.join(self.dirpath,tofilename),numberofresends=row['numberofresends']+1)
-            finally:
-                ta_from.update(statust=DONE)
+                ta_to.update(statust=DONE,filename='sftp:/'+posixpath.join(self.dirpath,sendfilename),numberofresends=row['numberofresends']+1)
+            ta_from.update(statust=DONE)
+
+    def upload(self,session,fromfilename,tofilename,mode):
+        ''' send one file; returns the filename on the server.'''
+        fromfile = botslib.opendata_bin(fromfilename, 'rb')
+        tofile = session.open(tofilename, mode)    # SSH treats all files as binary. paramiko doc says: b-flag is ignored
+        tofile.write(fromfile.read())
+        tofile.close()
+        fromfile.close()
+        #Rename filename after writing file.
+        #Function: safe file writing: do not want another process to read the file while it is being written.
+        if self.channeldict['mdnchannel']:
+            tofilename_old = tofilename
+            tofilename = botslib.rreplace(tofilename_old,self.channeldict['mdnchannel'])
+            session.rename(tofilename_old,tofilename)
+        return tofilename
 
 
 class xmlrpc(_comsession):
@@ -12,6 +12,8 @@ from . import botslib
 from . import botsinit
 from . import botsglobal
 from . import router
+from . import communication
+from . import grammar
 from . import cleanup
 ''' Start bots-engine.'''
 
@@ -188,6 +190,7 @@ def start():
             botslib.tryrunscript(userscript,scriptname,'post' + command,routestorun=use_routestorun)
             #*********finished running routes for this command****************************
         #*********finished all commands****************************************
+        communication.closeconnections()      #close ftp/sftp sessions kept for reuse
         botslib.tryrunscript(userscript,scriptname,'post',commandstorun=commandstorun,routestorun=routestorun)
         try:    #in acceptance tests: run a user script. no good reporting of errors/results in post-test script. Reason: this is after automaticmaintence.
             botslib.tryrunscript(acceptance_userscript,acceptance_scriptname,'posttest',routestorun=use_routestorun)
@@ -195,6 +198,7 @@ def start():
             print(unicode(msg))
 
         cleanup.cleanup(do_cleanup_parameter,userscript,scriptname)
+        botsglobal.logger.debug('Grammar registry: %(size)s grammars, %(hits)s hits, %(misses)s misses, %(evictions)s evictions.',grammar.registry.counters())
     except Exception as msg:
         botsglobal.logger.exception('Severe error in bots system:\n%(msg)s',{'msg':unicode(msg)})    #of course this 'should' not happen.
         sys.exit(1)
@@ -1,12 +1,93 @@
 from __future__ import print_function
 import sys
+import os
+import copy
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    from collections import OrderedDict
+except:
+    from .bots_ordereddict import OrderedDict   #python2.6
 #bots-modules
 from . import botslib
+from . import botsglobal
 from .botsconfig import *
 ERROR_IN_GRAMMAR = 'BOTS_error_1$%3@7#!%+_)_+[{]}'  #used in this module to indicate part of grammar is already read and/or has errors
                                                     #no record should be called like this ;-))
+directory_fingerprints = {}     #fingerprints of grammar directories, for grammar cache. Determined once per run (as python imports are).
+
+def directory_fingerprint(directory):
+    ''' fingerprint of the python files in a directory: (filename, size, mtime) of each file.
+        grammar parts are often imported from other grammar files in same directory, so all files are used.
+    '''
+    if directory not in directory_fingerprints:
+        fingerprint = []
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.py'):
+                filestat = os.stat(os.path.join(directory,filename))
+                fingerprint.append((filename,filestat.st_size,filestat.st_mtime))
+        directory_fingerprints[directory] = fingerprint
+    return directory_fingerprints[directory]
+
+class GrammarRegistry(object):
+    ''' registry of grammars (Grammar objects) read in this process; key is (editype,grammarname,typeofgrammarfile).
+        Size is limited (bots.ini, settings, grammarregistrysize): least recently used grammar is evicted.
+        Counts hits, misses and evictions.
+    '''
+    def __init__(self):
+        self.grammars = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self,key):
+        ''' return grammar or None if not in registry.'''
+        try:
+            grammar = self.grammars.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.grammars[key] = grammar    #insert again: is now most recently used
+        self.hits += 1
+        return grammar
+
+    def add(self,key,grammar):
+        self.grammars[key] = grammar
+        maxsize = botsglobal.ini.getint('settings','grammarregistrysize',100)
+        while len(self.grammars) > maxsize:
+            self.grammars.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        self.grammars.clear()
+
+    def counters(self):
+        return {'size':len(self.grammars),'hits':self.hits,'misses':self.misses,'evictions':self.evictions}
+
+registry = GrammarRegistry()
+
+def usersys_changed():
+    ''' invalidation hook: call this when files in usersys have changed (eg after reading a plugin).
+        Grammars in registry are not valid anymore, and usersys modules (grammars, mappings, etc) have to be imported again.
+    '''
+    registry.invalidate()
+    directory_fingerprints.clear()
+    botslib.botsimport_clear()
 
 def grammarread(editype,grammarname,typeofgrammarfile):
+    ''' reads/imports a grammar; use grammar registry.
+        Returns a copy of the grammar in registry, so the syntax of the returned grammar can be changed (eg partner syntax in outmessage).
+    '''
+    key = (editype,grammarname,typeofgrammarfile)
+    grammar = registry.get(key)
+    if grammar is None:
+        grammar = _grammarread(editype,grammarname,typeofgrammarfile)
+        registry.add(key,grammar)
+    return grammar.copy()
+
+def _grammarread(editype,grammarname,typeofgrammarfile):
     ''' reads/imports a grammar (dispatch function for class Grammar and subclasses).
         typeofgrammarfile indicates some differences in reading/syntax handling:
         - envelope: read whole grammar, get right syntax
@@ -95,6 +176,12 @@ class Grammar(object):
             raise botslib.GrammarError('Grammar "%(grammar)s": syntax is not a dict{}.',
                                         {'grammar':self.grammarname})
 
+    def copy(self):
+        ''' shallow copy of grammar with its own syntax; grammar parts (structure, recorddefs) are shared.'''
+        grammarcopy = copy.copy(self)
+        grammarcopy.syntax = self.syntax.copy()
+        return grammarcopy
+
     def _init_restofgrammar(self):
         self.nextmessage = getattr(self.module, 'nextmessage',None)
         self.nextmessage2 = getattr(self.module, 'nextmessage2',None)
@@ -109,7 +196,10 @@ class Grammar(object):
                 raise botslib.GrammarError('Grammar "%(grammar)s": nextmessageblock and nextmessage not both allowed.',
                                             {'grammar':self.grammarname})
 
+        self.grammarcachefile = None
         if self.syntax['has_structure']:    #most grammars have a structure; but eg templatehtml not (only syntax)
+            #if grammar cache is used: use recorddefs and structure as checked and changed in a previous run.
+            self._readgrammarcache()
             #read recorddefs.
             #recorddefs are checked and changed, so need to indicate if recordsdef has already been checked and changed.
             #done by setting entry 'BOTS_1$@#%_error' in recorddefs; if this entry is True: read, errors; False: read OK.
@@ -138,6 +228,59 @@ class Grammar(object):
             #as structure can be re-used/imported from other grammars, do this always when reading grammar.
             self._linkrecorddefs2structure(self.structure)
         self.class_specific_tests()
+        self._writegrammarcache()
+
+    def _readgrammarcache(self):
+        ''' grammar cache (bots.ini, settings, grammarcache): the checked and changed recorddefs and structure are saved (pickled) in botssys/grammarcache.
+            This saves the checking of grammar in each run.
+            Cache is used if bots version, python version and grammar files (in directory of grammar module) are the same.
+            The cached recorddefs and structure are put in place of the recorddefs and structure of the module (not a new object):
+            grammar parts shared via imports (eg recorddefs of a directory) stay shared; a part already read in this run is not taken from cache.
+            If cache is not used: self.grammarcachefile is set, and cache is written after grammar is read OK.
+        '''
+        if not botsglobal.ini.getboolean('settings','grammarcache',False):
+            return
+        recorddefs = getattr(self.module,'recorddefs',None)
+        structure = getattr(self.module,'structure',None)
+        if not isinstance(recorddefs,dict) or not isinstance(structure,list) or not structure or not isinstance(structure[0],dict):
+            return          #let the normal checks give the errors
+        if ERROR_IN_GRAMMAR in recorddefs and ERROR_IN_GRAMMAR in structure[0]:
+            return          #already read in this run
+        self.grammarcachekey = (botsglobal.version,tuple(sys.version_info[:2]),directory_fingerprint(os.path.dirname(os.path.abspath(self.module.__file__))))
+        self.grammarcachefile = botslib.join(botsglobal.ini.get('directories','botssys'),'grammarcache',self.__class__.__name__,self.module.__name__ + '.pickle')
+        try:
+            with open(self.grammarcachefile,'rb') as cachefile:
+                grammarcachekey,cachedrecorddefs,cachedstructure = pickle.loads(cachefile.read())     #loads(read()) is much faster than load() for cPickle
+        except Exception:   #no cache file (yet), or cache file can not be read: do not use cache
+            return
+        if grammarcachekey != self.grammarcachekey:
+            return
+        if ERROR_IN_GRAMMAR not in recorddefs:
+            recorddefs.clear()
+            recorddefs.update(cachedrecorddefs)
+        if ERROR_IN_GRAMMAR not in structure[0]:
+            structure[:] = cachedstructure      #if recorddefs were already read: structure is linked to these in _linkrecorddefs2structure
+        self.grammarcachefile = None        #read from cache; no need to write cache
+
+    def _writegrammarcache(self):
+        ''' write the checked and changed recorddefs and structure to grammar cache (if needed).
+            Pickled together, so pointers from structure to recorddefs are kept.
+            Errors are not fatal: grammar is read OK, but is not cached.
+        '''
+        if not self.grammarcachefile:
+            return
+        tmpfilename = '%s.%s'%(self.grammarcachefile,os.getpid())     #write to tmp file, then rename: other processes do not read incomplete cache file
+        try:
+            botslib.dirshouldbethere(os.path.dirname(self.grammarcachefile))
+            with open(tmpfilename,'wb') as cachefile:
+                cachefile.write(pickle.dumps((self.grammarcachekey,self.recorddefs,self.structure),pickle.HIGHEST_PROTOCOL))
+            if os.path.exists(self.grammarcachefile):   #windows does not rename to existing file
+                os.remove(self.grammarcachefile)
+            os.rename(tmpfilename,self.grammarcachefile)
+        except Exception as msg:
+            botsglobal.logger.debug('Grammar "%(grammar)s" not written to grammar cache: %(txt)s.',{'grammar':self.grammarname,'txt':msg})
+            if os.path.exists(tmpfilename):
+                os.remove(tmpfilename)
 
     def _dorecorddefs(self):
         ''' 1. check the recorddefinitions for validity.
@@ -291,16 +434,28 @@ class Grammar(object):
 
     def _linkrecorddefs2structure(self,structure):
         ''' recursive
-            for each record in structure: add the pointer to the right recorddefinition.
+            for each record in structure: add the pointer to the right recorddefinition, and the plan to parse the record.
         '''
         for i in structure:
             try:
-                i[FIELDS] = self.recorddefs[i[ID]]      #lookup the recordID in recorddefs (a dict); set pointer in structure to recorddefs/fields
+                fields = self.recorddefs[i[ID]]      #lookup the recordID in recorddefs (a dict)
             except KeyError:
                 raise botslib.GrammarError('Grammar "%(grammar)s": record "%(record)s" is in structure but not in recorddefs.',{'grammar':self.grammarname,'record':i[ID]})
+            if i.get(FIELDS) is not fields:     #only make parse plan if not linked yet, or linked to other recorddefs
+                i[FIELDS] = fields              #set pointer in structure to recorddefs/fields
+                i[PARSEPLAN] = self._parseplan(i[ID],fields)
             if LEVEL in i:
                 self._linkrecorddefs2structure(i[LEVEL])
 
+    def _parseplan(self,recordid,fields):
+        ''' make plan for parsing lexed fields of record (used by inmessage.var._parsefields).
+            plan is tuple: (strip values?, tuple with for each field: (fieldID, is repeating?, tuple of subfield-IDs or None if not a composite))
+        '''
+        return (True,tuple((field[ID],
+                            field[MAXREPEAT] != 1,
+                            None if field[ISFIELD] else tuple(sfield[ID] for sfield in field[SUBFIELDS]))
+                           for field in fields))
+
     def _dostructure(self):
         ''' 1. check the structure for validity.
             2. adapt in structure: Add keys: mpath, count
@@ -327,6 +482,7 @@ class Grammar(object):
             self._checkbackcollision(self.structure)
             self._checknestedcollision(self.structure)
         self._checkbotscollision(self.structure)
+        self._indexstructure(self.structure)
 
     def _checkstructure(self,structure,mpath):
         ''' Recursive
@@ -371,6 +527,23 @@ class Grammar(object):
             if LEVEL in i:
                 self._checkstructure(i[LEVEL],i[MPATH])
 
+    def _indexstructure(self,structure):
+        ''' Recursive
+            For each level in structure: add index to first record of level (key LEVELINDEX). Used in inmessage to find records in a level without scanning.
+            Index is tuple:
+            -   dict: for each recordID the positions of this record in the level (record can occur more than once in level, see BOTSIDNR)
+            -   list: for each position in level the position of first mandatory record from this position on (len(structure) if none)
+        '''
+        positions = {}
+        nextmandatory = [len(structure)] * (len(structure) + 1)
+        for index in range(len(structure)-1,-1,-1):
+            nextmandatory[index] = index if structure[index][MIN] else nextmandatory[index+1]
+        for index,i in enumerate(structure):
+            positions.setdefault(i[ID],[]).append(index)
+            if LEVEL in i:
+                self._indexstructure(i[LEVEL])
+        structure[0][LEVELINDEX] = (positions,nextmandatory)
+
     def _checkbackcollision(self,structure,collision=None):
         ''' Recursive.
             Check if grammar has back-collision problem. A message with collision problems is ambiguous.
@@ -516,6 +689,7 @@ class csv(Grammar):
         'escape':'',
         'field_sep':':',
         'forcequote': 1,            #(if quote_char is set) 0:no force: only quote if necessary:1:always force: 2:quote if alfanumeric
+        'lexer':'fast',             #lexer for incoming files: 'fast' or 'char' (lexes char by char; slower, but same results)
         'merge':True,
         'noBOTSID':False,           #allow csv records without record ID.
         'pass_all':True,            #(csv only) if only one recordtype and no nextmessageblock: would pass record for record to mapping. this fixes that.
@@ -684,6 +858,8 @@ class xml(Grammar):
                                             #Example: 'processing_instructions': [('xml-stylesheet' ,'href="mystylesheet.xsl" type="text/xml"'),('type-of-ppi' ,'attr1="value1" attr2="value2"')]
                                             #leads to this output in xml-file:  <?xml-stylesheet href="mystylesheet.xsl" type="text/xml"?><?type-of-ppi attr1="value1" attr2="value2"?>
         'standalone':None,      #as used in xml prolog; values: 'yes' , 'no' or None (not used)
+        'streaming':False,      #incoming xml with nextmessage: each message is passed to mapping as soon as it is read; memory use stays flat for large files.
+                                #errors later in the file still make the whole file fail (results of earlier messages are discarded). Not with preprocess_nodes.
         'triad':'',
         'version':'1.0',        #as used in xml prolog
         #settings needed as defaults, but not useful for this editype
@@ -784,6 +960,7 @@ class edifact(Grammar):
         'escape':'?',
         'field_sep':'+',
         'forceUNA' : False,
+        'lexer':'fast',             #lexer for incoming files: 'fast' or 'char' (lexes char by char; slower, but same results)
         'merge':True,
         'record_sep':"'",
         'reserve':'*',
@@ -834,6 +1011,7 @@ class x12(Grammar):
         'escape':'',
         'field_sep':'*',
         'functionalgroup'    :  'XX',
+        'lexer':'fast',             #lexer for incoming files: 'fast' or 'char' (lexes char by char; slower, but same results)
         'merge':True,
         'record_sep':'~',
         'replacechar':'',       #if separator found in content, replace by this character; if replacechar is None: raise error
@@ -882,6 +1060,10 @@ class x12(Grammar):
         'B':'A',
         'ID':'A',
         }
+    def _parseplan(self,recordid,fields):
+        ''' ISA is an exception: values are not stripped.'''
+        strip,plan = super(x12,self)._parseplan(recordid,fields)
+        return (recordid != 'ISA',plan)
     def _manipulatefieldformat(self,field,recordid):
         super(x12,self)._manipulatefieldformat(field,recordid)
         if field[BFORMAT] == 'I':
@@ -898,6 +1080,8 @@ class json(Grammar):
         'named_root_object': True,  #outgoing: when True: as default in bots 3.2. Output: True: {'ROOT':{...}} false: {...}
         'force_list':True,         #outgoing. when True: max 1: object, max > 1
         'json_write_numericals':False,         #outgoing. when False: write nums as strings 
+        'streaming':False,      #incoming json that is a list of messages: each message is passed to mapping as soon as it is read; memory use stays flat for large files.
+                                #errors later in the file still make the whole file fail (results of earlier messages are discarded). Not with nextmessage or preprocess_nodes.
         'contenttype':'application/json',
         'decimaal':'.',
         'envelope':'',
@@ -929,6 +1113,7 @@ class jsonnocheck(json):
         'checkcharsetout':'strict', #strict, ignore or botsreplace (replace with char as set in bots.ini).
         'checkunknownentities': False,
         'named_root_object': True,  #outgoing: when True: as default in bots 3.2. Output: True: {'ROOT':{...}} false: {...}
+        'streaming':False,      #incoming json that is a list of messages: each message is passed to mapping as soon as it is read (see json).
         'contenttype':'application/json',
         'decimaal':'.',
         'defaultBOTSIDroot':'ROOT',     #only for jsonnocheck
@@ -964,6 +1149,7 @@ class tradacoms(Grammar):
         'envelope':'tradacoms',
         'escape':'?',
         'field_sep':'+',
+        'lexer':'fast',             #lexer for incoming files: 'fast' or 'char' (lexes char by char; slower, but same results)
         'merge':False,
         'record_sep':"'",
         'record_tag_sep':'=',    #Tradacoms/GTDI
@@ -1,7 +1,8 @@
 from __future__ import print_function
 import sys
-import time
+import re
 import codecs
+import itertools
 try:
     from xml.etree import cElementTree as ET
 except ImportError:
@@ -77,22 +78,25 @@ class Inmessage(message.Message):
         #**from here: charset errors, lex errors
         self._readcontent_edifile()     #open file. variants: read with charset, read as binary & handled in sniff, only opened and read in _lex.
         self._sniff()           #some hard-coded examination of edi file; ta_info can be overruled by syntax-parameters in edi-file
-        #start lexing
-        self._lex()
-        #lex preprocessing via user exit indicated in syntax
+        #lexer is a generator: lex_records are parsed as they are lexed, lex_records of whole edi file are not in memory.
+        #lex preprocessing via user exit indicated in syntax: needs all lex_records, so these are read first.
         preprocess_lex = self.ta_info.get('preprocess_lex',False)
         if callable(preprocess_lex):
+            self.lex_records = list(self._lex())
             preprocess_lex(lex=self.lex_records,ta_info=self.ta_info)
-        if hasattr(self,'rawinput'):
-            del self.rawinput
+            self.iternext_lex_record = iter(self.lex_records)
+        else:
+            self.iternext_lex_record = self._keepfirst_lex_record(self._lex())
         self.set_syntax_used()
-        #**from here: breaking parser errors
+        #**from here: breaking parser errors (lex errors are raised during parsing)
         self.root = node.Node()  #make root Node None.
-        self.iternext_lex_record = iter(self.lex_records)
         leftover = self._parse(structure_level=self.defmessage.structure,inode=self.root)
         if leftover:
             raise botslib.InMessageError('[A50] line %(line)s pos %(pos)s: Found non-valid data at end of edi file; probably a problem with separators or message structure.',
                                             {'line':leftover[0][LIN], 'pos':leftover[0][POS]})  #probably not reached with edifact/x12 because of mailbag processing.
+        del self.iternext_lex_record
+        if hasattr(self,'rawinput'):
+            del self.rawinput
         del self.lex_records
         #self.root is now root of a tree (of nodes).
 
@@ -108,6 +112,20 @@ class Inmessage(message.Message):
                 self.ta_info.update(childnode.queries)
                 break
 
+    def _keepfirst_lex_record(self,lex_records):
+        ''' passes lex_records from lexer to parser (generator).
+            first lex_records (up to and including interchange header UNB/ISA; max 5) are kept in self.lex_records;
+            used to retrieve eg partner-IDs (try_to_retrieve_info) if parsing goes wrong. Eg edifact starts with UNA before UNB.
+        '''
+        lex_records = iter(lex_records)
+        for lex_record in lex_records:
+            self.lex_records.append(lex_record)
+            yield lex_record
+            if lex_record[0][VALUE] in ('UNB','ISA') or len(self.lex_records) >= 5:
+                break
+        for lex_record in lex_records:
+            yield lex_record
+
     def set_syntax_used(self):
         ''' write syntax dict in self/inmessage-object
         '''
@@ -136,27 +154,18 @@ class Inmessage(message.Message):
             lenght = len(value)
             if field_definition[BFORMAT] == 'D':
                 try:
-                    if lenght == 6:
-                        time.strptime(value,'%y%m%d')
-                    elif lenght == 8:
-                        time.strptime(value,'%Y%m%d')
-                    else:
-                        raise ValueError('To be catched')
+                    message.checkdate(value)
                 except ValueError:
                     self.add2errorlist('[F07]%(linpos)s: Record "%(record)s" date field "%(field)s" not a valid date: "%(content)s".\n'%
                                         {'linpos':node_instance.linpos(),'record':self.mpathformat(structure_record[MPATH]),'field':field_definition[ID],'content':value})
             else:   #field_definition[BFORMAT] == 'T':
                 try:
-                    if lenght == 4:
-                        time.strptime(value,'%H%M')
-                    elif lenght == 6:
-                        time.strptime(value,'%H%M%S')
-                    elif lenght == 7 or lenght == 8:
-                        time.strptime(value[0:6],'%H%M%S')
+                    if lenght == 7 or lenght == 8:
+                        message.checktime(value[0:6])
                         if not value[6:].isdigit():
                             raise ValueError('To be catched')
                     else:
-                        raise ValueError('To be catched')
+                        message.checktime(value)
                 except ValueError:
                     self.add2errorlist('[F08]%(linpos)s: Record "%(record)s" time field "%(field)s" not a valid time: "%(content)s".\n'%
                                         {'linpos':node_instance.linpos(),'record':self.mpathformat(structure_record[MPATH]),'field':field_definition[ID],'content':value})
@@ -248,7 +257,15 @@ class Inmessage(message.Message):
                     except TypeError:       #when no UNZ (edifact)
                         raise botslib.InMessageError(self.messagetypetxt + '[S51]: Missing mandatory record "%(record)s".',
                                                                             {'record':self.mpathformat(structure_level[structure_index][MPATH])})
-                structure_index += 1
+                #use index of structure_level: skip to next position of current_lex_record in level, but not past the next mandatory record (that gives error)
+                positions,nextmandatory = structure_level[0][LEVELINDEX]
+                skip_to = nextmandatory[structure_index+1]
+                if current_lex_record is not None:
+                    for position in positions.get(current_lex_record[ID][VALUE],()):
+                        if position > structure_index:
+                            skip_to = min(position,skip_to)
+                            break
+                structure_index = skip_to
                 if structure_index == structure_end:  #current_lex_record is not in this level. Go level up
                     #if on 'first level': give specific error
                     if current_lex_record is not None and structure_level == self.defmessage.structure:
@@ -465,7 +482,7 @@ class fixed(Inmessage):
         self.filehandler = botslib.opendata(filename=self.ta_info['filename'],mode='rb',charset=self.ta_info['charset'],errors=self.ta_info['checkcharsetin'])
 
     def _lex(self):
-        ''' edi file->self.lex_records.'''
+        ''' edi file->lex_records (generator).'''
         try:
             #there is a problem with the way python reads line by line: file/line offset is not correctly reported.
             #so the error is catched here to give correct/reasonable result.
@@ -474,14 +491,14 @@ class fixed(Inmessage):
                 for linenr,line in enumerate(self.filehandler, start=1):
                     if not line.isspace():
                         line = line.rstrip('\r\n')
-                        self.lex_records.append([{VALUE:botsid,LIN:linenr,POS:0,FIXEDLINE:line},])    #append record to recordlist
+                        yield [[botsid,0,linenr,0,line],]    #lex field: [VALUE,SFIELD,LIN,POS,FIXEDLINE]
             else:
                 startrecordid = self.ta_info['startrecordID']
                 endrecordid = self.ta_info['endrecordID']
                 for linenr,line in enumerate(self.filehandler, start=1):
                     if not line.isspace():
                         line = line.rstrip('\r\n')
-                        self.lex_records.append([{VALUE:line[startrecordid:endrecordid].strip(),LIN:linenr,POS:0,FIXEDLINE:line},])    #append record to recordlist
+                        yield [[line[startrecordid:endrecordid].strip(),0,linenr,0,line],]
         except UnicodeError as msg:
             rep_linenr = locals().get('linenr',0) + 1
             content = botslib.get_relevant_text_for_UnicodeError(msg)
@@ -525,27 +542,18 @@ class fixed(Inmessage):
             lenght = len(value)
             if field_definition[BFORMAT] == 'D':
                 try:
-                    if lenght == 6:
-                        time.strptime(value,'%y%m%d')
-                    elif lenght == 8:
-                        time.strptime(value,'%Y%m%d')
-                    else:
-                        raise ValueError('To be catched')
+                    message.checkdate(value)
                 except ValueError:
                     self.add2errorlist('[F07]%(linpos)s: Record "%(record)s" date field "%(field)s" not a valid date: "%(content)s".\n'%
                                         {'linpos':node_instance.linpos(),'record':self.mpathformat(structure_record[MPATH]),'field':field_definition[ID],'content':value})
             else:   #if field_definition[BFORMAT] == 'T':
                 try:
-                    if lenght == 4:
-                        time.strptime(value,'%H%M')
-                    elif lenght == 6:
-                        time.strptime(value,'%H%M%S')
-                    elif lenght == 7 or lenght == 8:
-                        time.strptime(value[0:6],'%H%M%S')
+                    if lenght == 7 or lenght == 8:
+                        message.checktime(value[0:6])
                         if not value[6:].isdigit():
                             raise ValueError('To be catched')
                     else:
-                        raise ValueError('To be catched')
+                        message.checktime(value)
                 except ValueError:
                     self.add2errorlist('[F08]%(linpos)s: Record "%(record)s" time field "%(field)s" not a valid time: "%(content)s".\n'%
                                         {'linpos':node_instance.linpos(),'record':self.mpathformat(structure_record[MPATH]),'field':field_definition[ID],'content':value})
@@ -599,10 +607,30 @@ class idoc(fixed):
     pass
 
 
+def _one_of_chars(chars):
+    ''' returns regular expression (string) that matches one of the characters in chars.
+        used by var._lex_fast.
+    '''
+    return '[' + ''.join(re.escape(char) for char in sorted(set(chars))) + ']'
+
+
 class var(Inmessage):
     ''' abstract class for edi-objects with records of variabele length.'''
+    lex_chunksize = 1000000     #_lex_fast splits the edi file in chunks of this number of characters
     def _lex(self):
-        ''' lexes file with variable records to list of lex_records, fields and subfields (build self.lex_records).'''
+        ''' lexes file with variable records to lex_records, fields and subfields (generator).
+            syntax parameter 'lexer' selects the lexer:
+            - 'fast': (default) ordinary characters are handled in runs, using a precompiled regular expression.
+            - 'char': lexes char by char.
+            Both lexers give the same lex_records and the same errors.
+        '''
+        if self.ta_info.get('lexer','fast') == 'char':
+            return self._lex_char()
+        else:
+            return self._lex_fast()
+
+    def _lex_char(self):
+        ''' lexes file with variable records char by char to lex_records, fields and subfields (generator).'''
         record_sep  = self.ta_info['record_sep']
         mode_inrecord = 0  # 1 indicates: lexing in record, 0 is lexing 'between records'.
         field_sep   = self.ta_info['field_sep'] + self.ta_info['record_tag_sep']    #for tradacoms; field_sep and record_tag_sep have same function.
@@ -686,21 +714,21 @@ class var(Inmessage):
                 continue
             if char in field_sep:
                 #end of (sub)field. Note: first field of composite is marked as 'field'
-                lex_record.append({VALUE:value,SFIELD:sfield,LIN:valueline,POS:valuepos})    #write current value to lex_record
+                lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
                 value = ''
                 sfield = 0      #new token is field
                 continue
             if char == sfield_sep:
                 #end of (sub)field. Note: first field of composite is marked as 'field'
-                lex_record.append({VALUE:value,SFIELD:sfield,LIN:valueline,POS:valuepos})    #write current value to lex_record
+                lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
                 value = ''
                 sfield = 1        #new token is sub-field
                 continue
             if char in record_sep:      #end of record
                 if strict_syntax_check and not lex_record:      #check for 'double' record seperator.
                     raise botslib.InMessageError('[A69]: Found double record seperator. Line %(countline)s, position %(pos)s, position %(countpos)s.',{'countline':countline,'countpos':countpos})
-                lex_record.append({VALUE:value,SFIELD:sfield,LIN:valueline,POS:valuepos})    #write current value to lex_record
-                self.lex_records.append(lex_record)                 #write lex_record to self.lex_records
+                lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
+                yield lex_record
                 lex_record = []
                 value = ''
                 sfield = 0      #new token is field
@@ -710,7 +738,7 @@ class var(Inmessage):
                 mode_escape = 1
                 continue
             if char == rep_sep:
-                lex_record.append({VALUE:value,SFIELD:sfield,LIN:valueline,POS:valuepos})    #write current value to lex_record
+                lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
                 value = ''
                 sfield = 2        #new token is repeating
                 continue
@@ -718,8 +746,207 @@ class var(Inmessage):
         #in a perfect world, value should always be empty now, but:
         #it appears a csv record is not always closed properly, so force the closing of the last record of csv file:
         if mode_inrecord and self.ta_info.get('allow_lastrecordnotclosedproperly',False):
-            lex_record.append({VALUE:value,SFIELD:sfield,LIN:valueline,POS:valuepos})    #append element in record
-            self.lex_records.append(lex_record)    #write record to recordlist
+            lex_record.append([value,sfield,valueline,valuepos])    #append element in record
+            yield lex_record
+        else:
+            leftover = value.strip('\x00\x1a')
+            if leftover:
+                raise botslib.InMessageError('[A51]: Found non-valid data at end of edi file; probably a problem with separators or message structure: "%(leftover)s".',
+                                                {'leftover':leftover})
+
+    def _lex_fast(self):
+        ''' lexes file with variable records to lex_records, fields and subfields (generator).
+            Same results and errors as _lex_char.
+            The edi file is split (per chunk) by a precompiled regular expression into runs of ordinary characters and 'special' characters
+            (separators, escape, quote, skip_char, newline).
+            A run of ordinary characters is handled in one step; special characters are handled with the same logic as in _lex_char.
+        '''
+        record_sep  = self.ta_info['record_sep']
+        mode_inrecord = 0  # 1 indicates: lexing in record, 0 is lexing 'between records'.
+        field_sep   = self.ta_info['field_sep'] + self.ta_info['record_tag_sep']    #for tradacoms; field_sep and record_tag_sep have same function.
+        sfield_sep  = self.ta_info['sfield_sep']
+        rep_sep     = self.ta_info['reserve']
+        strict_syntax_check = self.ta_info.get('strict_syntax_check',False)
+        sfield      = 0 # 1: subfield, 0: not a subfield, 2:repeat
+        quote_char  = self.ta_info['quote_char']  #typical fo csv. example with quote_char ":  ,"1523",TEXT,"123",
+        mode_quote  = 0    #0=not in quote, 1=in quote
+        mode_2quote = 0    #status within mode_quote. 0=just another char within quote, 1=met 2nd quote char; might be end of quote OR escaping of another quote-char.
+        escape      = self.ta_info['escape']      #char after escape-char is not interpreted as separator
+        mode_escape = 0    #0=not escaping, 1=escaping
+        skip_char   = self.ta_info['skip_char']   #chars to ignore/skip/discard. eg edifact: if wrapped to 80pos lines and <CR/LF> at end of segment
+        lex_record  = []   #gather the content of a record
+        value       = ''   #gather the content of (sub)field; the current token
+        valueline   = 1    #record line of token
+        valuepos    = 1    #record position of token in line
+        countline   = 1    #count number of lines; start with 1
+        countpos    = 0    #count position/number of chars within line
+        sep = field_sep + sfield_sep + record_sep + escape + rep_sep
+        is_csv = isinstance(self,csv)
+        #split gives: [run, special char, run, special char, ...., run]. runs can be empty.
+        split_specials = re.compile('(' + _one_of_chars(sep + skip_char + quote_char + '\n') + ')').split
+        #separators that are handled directly (within a record, not quoted, not escaped); same precedence as in char by char logic.
+        #other special chars (escape, quote, skip_char, newline) are always handled char by char.
+        separator_kind = {}
+        for chars,kind in ((rep_sep,2),(escape,None),(record_sep,3),(sfield_sep,1),(field_sep,0)):
+            for char in chars:
+                separator_kind[char] = kind
+        for char in quote_char + skip_char + escape + '\n':
+            separator_kind.pop(char,None)
+        rawinput = self.rawinput
+        for chunkstart in range(0,len(rawinput),self.lex_chunksize):
+            pieces = iter(split_specials(rawinput[chunkstart:chunkstart+self.lex_chunksize]))
+            for run in pieces:
+                if run:
+                    #handle run of ordinary chars
+                    if mode_quote:
+                        if mode_2quote:
+                            mode_2quote = 0
+                            mode_quote = 0      #quote is ended; handle run as outside quote
+                        else:                   #in quote (escaped or not): just append to token
+                            mode_escape = 0
+                            value += run
+                            countpos += len(run)
+                    if not mode_quote:
+                        if not mode_inrecord:
+                            #between records: whitespace is skipped or gives error
+                            lenwhitespace = len(run) - len(run.lstrip())
+                            if lenwhitespace:
+                                if strict_syntax_check:  #for strict checks: no spaces between records
+                                    countpos += 1
+                                    raise botslib.InMessageError('[A67]: Found whitespace characters between segments. Line %(countline)s, position %(pos)s, position %(countpos)s.',{'countline':countline,'countpos':countpos})
+                                countpos += lenwhitespace
+                                run = run[lenwhitespace:]
+                            if run:
+                                mode_inrecord = 1   #not whitespace - a new record has started
+                        if run:
+                            if mode_escape:
+                                #in escaped_mode: char after escape sign is appended to token
+                                mode_escape = 0
+                            elif not value:
+                                #new token, get line and pos for (new) token
+                                valueline = countline
+                                valuepos = countpos + 1
+                            value += run
+                            countpos += len(run)
+                char = next(pieces,None)
+                if char is None:
+                    break
+                if mode_inrecord and not mode_quote and not mode_escape and char in separator_kind:
+                    #handle separator directly
+                    countpos += 1
+                    if not value:
+                        valueline = countline
+                        valuepos = countpos
+                    kind = separator_kind[char]
+                    if kind == 3:       #end of record
+                        if strict_syntax_check and not lex_record:      #check for 'double' record seperator.
+                            raise botslib.InMessageError('[A69]: Found double record seperator. Line %(countline)s, position %(pos)s, position %(countpos)s.',{'countline':countline,'countpos':countpos})
+                        lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
+                        yield lex_record
+                        lex_record = []
+                        sfield = 0      #new token is field
+                        mode_inrecord = 0    #we are not in a record
+                    else:
+                        lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
+                        sfield = kind   #new token is field (0), sub-field (1) or repeating (2)
+                    value = ''
+                    continue
+                #handle special char; same logic as _lex_char
+                if char == '\n':
+                    #count number lines/position; no action.
+                    countline += 1      #count line
+                    countpos = 0        #position back to 0
+                else:
+                    countpos += 1       #position within line
+                if mode_quote:
+                    #lexing within a quote; note that quote-char works as escape-char within a quote
+                    if mode_2quote:
+                        mode_2quote = 0
+                        if char == quote_char: #after quote-char another quote-char: used to escape quote_char:
+                            value += char    #append quote_char
+                            continue
+                        else: #quote is ended:
+                            mode_quote = 0
+                            #continue parsing of this char
+                    elif mode_escape:        #tricky: escaping a quote char
+                        mode_escape = 0
+                        value += char
+                        continue
+                    elif char == quote_char:    #either end-quote or escaping quote_char,we do not know yet
+                        mode_2quote = 1
+                        continue
+                    elif char == escape:
+                        mode_escape = 1
+                        continue
+                    else:                       #we are in quote, just append char to token
+                        value += char
+                        continue
+                if char in skip_char:
+                    #char is skipped. In csv these chars could be in a quote; in eg edifact chars will be skipped, even if after escape sign.
+                    continue
+                if not mode_inrecord:
+                    #get here after record-separator is found. we are 'between' records.
+                    #some special handling for whitespace characters; for other chars: go on lexing
+                    if char.isspace():  #whitespace = ' \t\n\r\v\f'....note that CRLF might be in skip_char
+                        if char in field_sep and is_csv: #exception for tab-delimited csv/excel files: if first field is not filled: first TAB is significant!
+                            pass        #just go on lexing
+                        elif strict_syntax_check:  #for strict checks: no spaces between records
+                            raise botslib.InMessageError('[A67]: Found whitespace characters between segments. Line %(countline)s, position %(pos)s, position %(countpos)s.',{'countline':countline,'countpos':countpos})
+                        else:
+                            continue    #ignore whitespace character; continue for-loop with next character
+                    mode_inrecord = 1   #not whitespace - a new record has started
+                if mode_escape:
+                    #in escaped_mode: char after escape sign is appended to token
+                    mode_escape = 0
+                    value += char
+                    continue
+                if not value:
+                    #if no char in token: this is a new token, get line and pos for (new) token
+                    valueline = countline
+                    valuepos = countpos
+                if char == quote_char and (not value or value.isspace()):
+                    #for csv: handle new quote value. New quote value only makes sense for new field (value is empty) or field contains only whitespace
+                    mode_quote = 1
+                    continue
+                if char not in sep:
+                    value += char    #just a char: append char to value
+                    continue
+                if char in field_sep:
+                    #end of (sub)field. Note: first field of composite is marked as 'field'
+                    lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
+                    value = ''
+                    sfield = 0      #new token is field
+                    continue
+                if char == sfield_sep:
+                    #end of (sub)field. Note: first field of composite is marked as 'field'
+                    lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
+                    value = ''
+                    sfield = 1        #new token is sub-field
+                    continue
+                if char in record_sep:      #end of record
+                    if strict_syntax_check and not lex_record:      #check for 'double' record seperator.
+                        raise botslib.InMessageError('[A69]: Found double record seperator. Line %(countline)s, position %(pos)s, position %(countpos)s.',{'countline':countline,'countpos':countpos})
+                    lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
+                    yield lex_record
+                    lex_record = []
+                    value = ''
+                    sfield = 0      #new token is field
+                    mode_inrecord = 0    #we are not in a record
+                    continue
+                if char == escape:
+                    mode_escape = 1
+                    continue
+                if char == rep_sep:
+                    lex_record.append([value,sfield,valueline,valuepos])    #write current value to lex_record
+                    value = ''
+                    sfield = 2        #new token is repeating
+                    continue
+        #end of for-loop. all characters have been processed.
+        #in a perfect world, value should always be empty now, but:
+        #it appears a csv record is not always closed properly, so force the closing of the last record of csv file:
+        if mode_inrecord and self.ta_info.get('allow_lastrecordnotclosedproperly',False):
+            lex_record.append([value,sfield,valueline,valuepos])    #append element in record
+            yield lex_record
         else:
             leftover = value.strip('\x00\x1a')
             if leftover:
@@ -727,8 +954,80 @@ class var(Inmessage):
                                                 {'leftover':leftover})
 
     def _parsefields(self,lex_record,record_definition):
+        ''' Identify the fields in inmessage-record using the parse plan of the record_definition (made in grammar.py)
+            Build a record (dictionary; field-IDs are unique within record) and return this.
+            Same result as _parsefields_from_definition, but faster as no grammar field-definitions are examined.
+        '''
+        if PARSEPLAN not in record_definition:
+            return self._parsefields_from_definition(lex_record,record_definition)
+        strip,list_of_fields_in_plan = record_definition[PARSEPLAN]
+        record2build = {}         #record that is build from lex_record using ID's from record_definition
+        tindex = -1     #elementcounter; composites count as one
+        #********loop over all fields present in this record of edi file
+        #********identify the lexed fields in grammar, and build a dict with (fieldID:value)
+        for lex_field in lex_record:
+            value = lex_field[VALUE].strip() if strip else lex_field[VALUE]
+            #*********use info of lexer: what is preceding separator (field, sub-field, repeat)
+            sfield = lex_field[SFIELD]
+            if not sfield:       #preceded by field-separator
+                try:
+                    tindex += 1                 #use next field
+                    field_id,is_repeating,subfields_of_field = list_of_fields_in_plan[tindex]
+                except IndexError:
+                    self.add2errorlist('[F19] line %(line)s pos %(pos)s: Record "%(record)s" too many fields in record; unknown field "%(content)s".\n'%
+                                        {'content':lex_field[VALUE],'line':lex_field[LIN],'pos':lex_field[POS],'record':self.mpathformat(record_definition[MPATH])})
+                    continue
+                if subfields_of_field is None:      #plan says: field      +E+ or +E*R+
+                    if is_repeating:
+                        record2build[field_id] = [value]
+                    elif value:
+                        record2build[field_id] = value
+                else:                               #plan says: subfield    +E:S+ or +E:S*R:S+
+                    tsubindex = 0
+                    list_of_subfields = subfields_of_field
+                    if is_repeating:
+                        record2build[field_id] = [{list_of_subfields[0]:value},]
+                    elif value:
+                        record2build[list_of_subfields[0]] = value
+            elif sfield == 1:    #preceded by sub-field separator
+                try:
+                    tsubindex += 1
+                    subfield_id = list_of_subfields[tsubindex]
+                except (TypeError,UnboundLocalError):       #field has no SUBFIELDS, or unexpected subfield
+                    self.add2errorlist('[F17] line %(line)s pos %(pos)s: Record "%(record)s" expect field but "%(content)s" is a subfield.\n'%
+                                        {'content':lex_field[VALUE],'line':lex_field[LIN],'pos':lex_field[POS],'record':self.mpathformat(record_definition[MPATH])})
+                    continue
+                except IndexError:      #tsubindex is not in the subfields
+                    self.add2errorlist('[F18] line %(line)s pos %(pos)s: Record "%(record)s" too many subfields in composite; unknown subfield "%(content)s".\n'%
+                                          {'content':lex_field[VALUE],'line':lex_field[LIN],'pos':lex_field[POS],'record':self.mpathformat(record_definition[MPATH])})
+                    continue
+                if not is_repeating:            #plan says: not repeating   +E:S+
+                    if value:
+                        record2build[subfield_id] = value
+                else:                           #plan says: repeating       +E:S*R:S+
+                    record2build[field_id][-1][subfield_id] = value
+            else:                         #  preceded by repeat separator
+                #check if repeating!
+                if not is_repeating:
+                    if 'ISA' == self.mpathformat(record_definition[MPATH]) and field_id == 'ISA11':     #exception for ISA
+                        pass
+                    else:
+                        self.add2errorlist('[F40] line %(line)s pos %(pos)s: Record "%(record)s" expect not-repeating elemen, but "%(content)s" is repeating.\n'%
+                                              {'content':lex_field[VALUE],'line':lex_field[LIN],'pos':lex_field[POS],'record':self.mpathformat(record_definition[MPATH])})
+                    continue
+                if subfields_of_field is None:      #plan says: field      +E*R+
+                    record2build[field_id].append(value)
+                else:                               #plan says: first subfield   +E:S*R:S+
+                    tsubindex = 0
+                    list_of_subfields = subfields_of_field
+                    record2build[field_id].append({list_of_subfields[0]:value})
+        record2build['BOTSIDnr'] = record_definition[BOTSIDNR]
+        return record2build
+
+    def _parsefields_from_definition(self,lex_record,record_definition):
         ''' Identify the fields in inmessage-record using the record_definition from the grammar
             Build a record (dictionary; field-IDs are unique within record) and return this.
+            Used for record definitions without parse plan.
         '''
         list_of_fields_in_record_definition = record_definition[FIELDS]
         if record_definition[ID] == 'ISA' and isinstance(self,x12):    #isa is an exception: no strip()
@@ -820,28 +1119,28 @@ class var(Inmessage):
 class csv(var):
     ''' class for ediobjects with Comma Separated Values'''
     def _lex(self):
-        super(csv,self)._lex()
-        
-        if self.ta_info['skip_firstline']:
-            # if it is an integer, skip that many lines
-            # if True, skip just the first line
-            if isinstance(self.ta_info['skip_firstline'],bool):
-                del self.lex_records[0]
-            else:
-                del self.lex_records[0:self.ta_info['skip_firstline']]
-
+        skip_firstline = self.ta_info['skip_firstline']
+        # if it is an integer, skip that many lines
+        # if True, skip just the first line
+        if isinstance(skip_firstline,bool):
+            skip_firstline = int(skip_firstline)
         noBOTSID = self.ta_info['noBOTSID']
-        if noBOTSID: 
-            # if integer, swap fields in record
-            # if True, add BOTSID to record
-            if isinstance(noBOTSID,bool):
-                botsid = self.defmessage.structure[0][ID]   #add the recordname as BOTSID
-                for lex_record in self.lex_records:
-                    lex_record[0:0] = [{VALUE: botsid, POS: 0, LIN:lex_record[0][LIN], SFIELD: False}]
-            else:
-                for lex_record in self.lex_records:
+        if noBOTSID is True:
+            botsid = self.defmessage.structure[0][ID]   #add the recordname as BOTSID
+
+        for lex_record in super(csv,self)._lex():
+            if skip_firstline:
+                skip_firstline -= 1
+                continue
+            if noBOTSID: 
+                # if integer, swap fields in record
+                # if True, add BOTSID to record
+                if isinstance(noBOTSID,bool):
+                    lex_record[0:0] = [[botsid,False,lex_record[0][LIN],0]]
+                else:
                     botsid_record = lex_record.pop(noBOTSID)
                     lex_record[0:0] = [botsid_record]
+            yield lex_record
 
 
     def set_syntax_used(self):
@@ -891,15 +1190,15 @@ class excel(csv):
         rawinputfile.close()
         self.rawinput = self.rawinput.decode('utf-8')
         #start lexing and parsing as csv
-        self._lex()
-        if hasattr(self,'rawinput'):
-            del self.rawinput
         self.root = node.Node()  #make root Node None.
-        self.iternext_lex_record = iter(self.lex_records)
+        self.iternext_lex_record = self._lex()
         leftover = self._parse(structure_level=self.defmessage.structure,inode=self.root)
         if leftover:
             raise botslib.InMessageError('[A52]: Found non-valid data at end of excel file: "%(leftover)s".',
                                             {'leftover':leftover})
+        del self.iternext_lex_record
+        if hasattr(self,'rawinput'):
+            del self.rawinput
         del self.lex_records
         self.checkmessage(self.root,self.defmessage)
 
@@ -1449,8 +1748,35 @@ class tradacoms(var):
             botsglobal.logmap.debug('Parsing tradacoms envelopes is OK')
 
 
+class _JsonNotAList(Exception):
+    ''' json that looked like {rootdict:[...]} has more keys.'''
+    pass
+
+class _XmlEvents(list):
+    ''' target for ElementTree.XMLParser: collects the parse events (start, data, end) of the elements.
+        like iterparse, but no etree is built; and (in contrary to iterparse in python 2) extra character entities can be used.
+    '''
+    def start(self,tag,attrib):
+        self.append(('start',tag,attrib))
+
+    def data(self,text):
+        self.append(('data',text))
+
+    def end(self,tag):
+        self.append(('end',tag))
+
+    def close(self):
+        pass
+
 class xml(Inmessage):
-    ''' class for ediobjects in XML. Uses ElementTree'''
+    ''' class for ediobjects in XML. Uses ElementTree.
+        The tree of bots-nodes is built while parsing the xml file (no etree is built).
+        If indicated in syntax ('streaming') and grammar has nextmessage: messages are passed to mapping as soon as they are read.
+    '''
+    xml_chunksize = 65536   #number of bytes of xml file fed to parser at once
+    mailbag_sniffsize = 1048576     #xml mailbag: number of bytes at start of file in which messagetype is determined while reading
+    streaming = False
+
     def initfromfile(self):
         botsglobal.logger.debug('Read edi file "%(filename)s".',self.ta_info)
         filename = botslib.abspathdata(self.ta_info['filename'])
@@ -1471,87 +1797,262 @@ class xml(Inmessage):
             except botslib.BotsImportError:
                 botsglobal.logger.error('Missing mailbag definitions for xml, should be there.')
                 raise
-            parser = ET.XMLParser()
             try:
                 extra_character_entity = getattr(module, 'extra_character_entity')
-                for key,value in extra_character_entity.items():
-                    parser.entity[key] = value
             except AttributeError:
-                pass    #there is no extra_character_entity in the mailbag definitions, is OK.
-            etree =  ET.ElementTree()   #ElementTree: lexes, parses, makes etree; etree is quite similar to bots-node trees but conversion is needed
-            etreeroot = etree.parse(filename, parser)
-            for item in mailbagsearch:
-                if 'xpath' not in item or 'messagetype' not in item:
-                    raise botslib.InMessageError('Invalid search parameters in xml mailbag.')
-                found = etree.find(item['xpath'])
-                if found is not None:
-                    if 'content' in item and found.text != item['content']:
-                        continue
-                    self.ta_info['messagetype'] = item['messagetype']
-                    break
-            else:
-                raise botslib.InMessageError('Could not find right xml messagetype for mailbag.')
-
+                extra_character_entity = {}     #there is no extra_character_entity in the mailbag definitions, is OK.
+            xmlevents = self._mailbagsearch(mailbagsearch,self._xmlchunks(filename,extra_character_entity))
             self.messagegrammarread(typeofgrammarfile='grammars')
         else:
             self.messagegrammarread(typeofgrammarfile='grammars')
-            parser = ET.XMLParser()
-            for key,value in self.ta_info['extra_character_entity'].items():
-                parser.entity[key] = value
-            etree =  ET.ElementTree()   #ElementTree: lexes, parses, makes etree; etree is quite similar to bots-node trees but conversion is needed
-            etreeroot = etree.parse(filename, parser)
-        self._handle_empty(etreeroot)
+            xmlevents = self._xmlevents(self._xmlchunks(filename,self.ta_info['extra_character_entity']))
         self.stackinit()
-        self.root = self._etree2botstree(etreeroot)  #convert etree to bots-nodes-tree
+        nextmessage = self.defmessage.nextmessage
+        self.streaming = bool(self.ta_info.get('streaming') and self.ta_info['has_structure'] and nextmessage is not None and len(nextmessage) > 1
+                                and self.defmessage.nextmessage2 is None and not callable(self.ta_info.get('preprocess_nodes')))
+        if self.streaming:
+            self.messagestream = self._buildtree(xmlevents,nextmessage)   #tree is built in nextmessage()
+            self.placeholders = set()
+            return
+        next(self._buildtree(xmlevents),None)    #builds whole tree; without nextmessage nothing is yielded
         self.checkmessage(self.root,self.defmessage)
         self.ta_info.update(self.root.queries)
 
-    def _handle_empty(self,xmlnode):
-        if xmlnode.text:
-            xmlnode.text = xmlnode.text.strip()
-        for key,value in xmlnode.items():
-            xmlnode.attrib[key] = value.strip()
-        for xmlchildnode in xmlnode:   #for every node in mpathtree
-            self._handle_empty(xmlchildnode)
-
-    def _etree2botstree(self,xmlnode):
-        ''' recursive. '''
-        newnode = node.Node(record=self._etreenode2botstreenode(xmlnode))   #make new node, use fields
-        for xmlchildnode in xmlnode:   #for every node in mpathtree
-            entitytype = self._entitytype(xmlchildnode)
-            if not entitytype:  #is a field, or unknown that looks like a field
-                if xmlchildnode.text:       #if xml element has content, add as field
-                    newnode.record[xmlchildnode.tag] = xmlchildnode.text      #add as a field
-                #convert the xml-attributes of this 'xml-filed' to fields in dict with attributemarker.
-                newnode.record.update((xmlchildnode.tag + self.ta_info['attributemarker'] + key, value) for key,value in xmlchildnode.items() if value)
-            elif entitytype == 1:  #childnode is a record according to grammar
-                newnode.append(self._etree2botstree(xmlchildnode))           #go recursive and add child (with children) as a node/record
-                self.stack.pop()    #handled the xmlnode, so remove it from the stack
-            else:   #is a record, but not in grammar
-                if self.ta_info['checkunknownentities']:
-                    self.add2errorlist('[S02]%(linpos)s: Unknown xml-tag "%(recordunkown)s" (within "%(record)s") in message.\n'%
-                                        {'linpos':newnode.linpos(),'recordunkown':xmlchildnode.tag,'record':newnode.record['BOTSID']})
-                continue
-        return newnode  #return the new node
+    def _xmlchunks(self,filename,extra_character_entity):
+        ''' generator; parses xml file in chunks, yields the parse events of each chunk.'''
+        events = _XmlEvents()
+        parser = ET.XMLParser(target=events)
+        for key,value in extra_character_entity.items():
+            parser.entity[key] = value
+        with open(filename,'rb') as xmlfile:
+            while True:
+                chunk = xmlfile.read(self.xml_chunksize)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+                yield events
+                del events[:]
+        parser.close()
+        yield events
 
-    def _etreenode2botstreenode(self,xmlnode):
-        ''' build a basic dict from xml-node. Add BOTSID, xml-attributes (of 'record'), xmlnode.text as BOTSCONTENT.'''
-        build = dict((xmlnode.tag + self.ta_info['attributemarker'] + key,value) for key,value in xmlnode.items() if value)   #convert xml attributes to fields.
-        build['BOTSID'] = xmlnode.tag
+    @staticmethod
+    def _xmlevents(xmlchunks):
+        ''' generator; yields the parse events one by one.'''
+        for events in xmlchunks:
+            for event in events:
+                yield event
+
+    def _mailbagsearch(self,mailbagsearch,xmlchunks):
+        ''' determine the messagetype using mailbagsearch while reading the xml file; sets messagetype in ta_info.
+            an etree is built for the xpath search. Within the first part of the file (mailbag_sniffsize) is checked if the messagetype
+            can already be determined; if not the whole etree is read.
+            returns the parse events for the whole xml file (from etree read so far plus rest of the file); so xml file is read only once.
+        '''
+        builder = ET.TreeBuilder()
+        open_elements = []      #stack of elements that are not read completely
+        pending = []            #data that is not in etree yet (is added at next start or end)
+        nr_chunks = 0
+        for events in xmlchunks:
+            for event in events:
+                if event[0] == 'start':
+                    open_elements.append(builder.start(event[1],event[2]))
+                    del pending[:]
+                elif event[0] == 'data':
+                    builder.data(event[1])
+                    pending.append(event[1])
+                else:
+                    builder.end(event[1])
+                    open_elements.pop()
+                    del pending[:]
+            nr_chunks += 1
+            if open_elements and nr_chunks * self.xml_chunksize <= self.mailbag_sniffsize:
+                messagetype = self._mailbagmessagetype(mailbagsearch,ET.ElementTree(open_elements[0]),open_elements)
+                if messagetype is not None:
+                    self.ta_info['messagetype'] = messagetype
+                    return itertools.chain(self._etreeevents(open_elements[0],open_elements),
+                                           [('data',text) for text in pending],
+                                           self._xmlevents(xmlchunks))
+        etreeroot = builder.close()
+        messagetype = self._mailbagmessagetype(mailbagsearch,ET.ElementTree(etreeroot))
+        if messagetype is None:
+            raise botslib.InMessageError('Could not find right xml messagetype for mailbag.')
+        self.ta_info['messagetype'] = messagetype
+        return self._etreeevents(etreeroot)
+
+    @staticmethod
+    def _mailbagmessagetype(mailbagsearch,etree,open_elements=None):
+        ''' returns messagetype for first item in mailbagsearch that is found in etree; None if not found.
+            if etree is read partly (open_elements: the elements not read completely) returns None if messagetype can not be determined yet:
+            for xpath without conditions ('[..]', '..') the first found element will stay the first found.
+        '''
+        for item in mailbagsearch:
+            if 'xpath' not in item or 'messagetype' not in item:
+                raise botslib.InMessageError('Invalid search parameters in xml mailbag.')
+            found = etree.find(item['xpath'])
+            if open_elements is not None:
+                if found is None or '[' in item['xpath'] or '..' in item['xpath']:
+                    return None     #might be found later in file; or later in file changes what is found
+                if 'content' in item and not len(found) and found in open_elements:
+                    return None     #text of found element might not be complete
+            if found is not None:
+                if 'content' in item and found.text != item['content']:
+                    continue
+                return item['messagetype']
+        return None
+
+    def _etreeevents(self,xmlnode,open_elements=()):
+        ''' generator; yields parse events for an etree (as read for xml mailbag); etree is cleared while yielding.
+            for elements that are not read completely (open_elements) no end event is yielded.
+        '''
+        yield ('start',xmlnode.tag,dict(xmlnode.items()))
         if xmlnode.text:
-            build['BOTSCONTENT'] = xmlnode.text
-        return build
+            yield ('data',xmlnode.text)
+        for xmlchildnode in xmlnode:
+            for event in self._etreeevents(xmlchildnode,open_elements):
+                yield event
+        if xmlnode not in open_elements:
+            yield ('end',xmlnode.tag)
+        xmlnode.clear()
+
+    def _buildtree(self,xmlevents,nextmessage=None):
+        ''' builds tree of bots-nodes from the parse events; self.root is root of the tree.
+            Text of elements and values of xml-attributes are stripped.
+            generator: if nextmessage is given, each message node is yielded (with its record definition and the nodes above it) as soon as read.
+            in tree the message node is replaced by a placeholder node (to check the number of messages).
+        '''
+        attributemarker = self.ta_info['attributemarker']
+        elements = []           #stack of open xml-elements: [entitytype,tag,attrib,text,has_children,node]
+        record_nodes = []       #stack of nodes of open records; parallel to self.stack
+        for event in xmlevents:
+            if event[0] == 'start':
+                if not elements:        #root
+                    self.root = node.Node(record=self._xmlrecord(event[1],event[2]))
+                    elements.append([1,event[1],event[2],[],False,self.root])
+                    record_nodes.append(self.root)
+                    continue
+                parent = elements[-1]
+                parent[4] = True
+                if parent[0] == 0:  #parent seemed a field, but has children
+                    parent[0] = self._entitytype(parent[1],has_children=True)
+                    if parent[0] == 1:  #parent is a record
+                        parent[5] = node.Node(record=self._xmlrecord(parent[1],parent[2]))
+                        record_nodes[-1].append(parent[5])
+                        record_nodes.append(parent[5])
+                    elif self.ta_info['checkunknownentities']:
+                        self.add2errorlist('[S02]%(linpos)s: Unknown xml-tag "%(recordunkown)s" (within "%(record)s") in message.\n'%
+                                            {'linpos':record_nodes[-1].linpos(),'recordunkown':parent[1],'record':record_nodes[-1].record['BOTSID']})
+                if parent[0] == 2:  #within a record not in grammar: skip
+                    elements.append([2,event[1],None,None,True,None])
+                    continue
+                entitytype = self._entitytype(event[1])
+                if entitytype == 1:
+                    newnode = node.Node(record=self._xmlrecord(event[1],event[2]))
+                    record_nodes[-1].append(newnode)
+                    record_nodes.append(newnode)
+                    elements.append([1,event[1],event[2],[],False,newnode])
+                else:
+                    elements.append([0,event[1],event[2],[],False,None])
+            elif event[0] == 'data':
+                if not elements[-1][4]:     #only text before first child element; after that it is the tail of the child element
+                    elements[-1][3].append(event[1])
+            else:   #end
+                entitytype,tag,attrib,text,has_children,thisnode = elements.pop()
+                if entitytype == 1:         #record
+                    text = ''.join(text).strip()
+                    if text:
+                        thisnode.record['BOTSCONTENT'] = text
+                    record_nodes.pop()
+                    if not elements:        #root: is not on stack
+                        continue
+                    if nextmessage is not None and len(elements) == len(nextmessage) - 1 and self._matchmessage(record_nodes + [thisnode],nextmessage):
+                        yield thisnode,self.stack[-1],list(zip(record_nodes,self.stack[:-1]))
+                        placeholder = node.Node(record={'BOTSID':thisnode.record['BOTSID'],'BOTSIDnr':thisnode.record['BOTSIDnr']})
+                        self.placeholders.add(placeholder)
+                        record_nodes[-1].children[-1] = placeholder
+                    self.stack.pop()    #handled the record, so remove it from the stack
+                elif entitytype == 0:       #field: add to record
+                    record = record_nodes[-1].record
+                    text = ''.join(text).strip()
+                    if text:
+                        record[tag] = text
+                    #convert the xml-attributes of this 'xml-field' to fields in dict with attributemarker.
+                    for key,value in attrib.items():
+                        value = value.strip()
+                        if value:
+                            record[tag + attributemarker + key] = value
 
-    def _entitytype(self,xmlchildnode):
-        ''' check if xmlchildnode is field (or record)'''
+    def _xmlrecord(self,tag,attrib):
+        ''' build a basic dict for record: BOTSID and xml-attributes as fields.'''
+        record = {}
+        for key,value in attrib.items():   #convert xml attributes to fields.
+            value = value.strip()
+            if value:
+                record[tag + self.ta_info['attributemarker'] + key] = value
+        record['BOTSID'] = tag
+        return record
+
+    @staticmethod
+    def _matchmessage(record_nodes,nextmessage):
+        ''' check if record nodes (from root to record) match the mpaths of nextmessage.'''
+        for record_node,mpath in zip(record_nodes,nextmessage):
+            for key,value in mpath.items():
+                if record_node.record.get(key) != value:
+                    return False
+        return True
+
+    def nextmessage(self):
+        ''' Passes each 'message' to the mapping script.
+            streaming: each message is checked and passed as soon as it is read; finally the rest of the tree (the envelope) is checked.
+            errors make the whole file fail (results of earlier messages are deleted); number of messages is not known in advance.
+        '''
+        if not self.streaming:
+            for message in super(xml,self).nextmessage():
+                yield message
+            return
+        self.ta_info['total_number_of_messages'] = None
+        count = 0
+        for messagenode,structure_record,envelope in self.messagestream:
+            self._checkifrecordsingrammar(messagenode,structure_record,self.defmessage.grammarname)
+            self._canonicaltree(messagenode,structure_record)
+            if botsglobal.ini.getboolean('settings','readrecorddebug',False):
+                self._logmessagecontent(messagenode)
+            self.checkforerrorlist()
+            queries = {}
+            for envelopenode,envelopestructure in envelope:     #queries from higher levels are copied to message (as processqueries does)
+                if QUERIES in envelopestructure:
+                    envelopenode.get_queries_from_edi(envelopestructure)
+                envelopenode.queries = queries
+                queries = envelopenode.queries
+            messagenode.queries = queries
+            count += 1
+            ta_info = self.ta_info.copy()
+            ta_info.update(messagenode.queries)
+            ta_info['message_number'] = count
+            ta_info['bots_accessenvelope'] = self.root   #give mappingscript access to envelope
+            yield self._initmessagefromnode(messagenode,ta_info,self.syntax,[envelopenode.record for envelopenode,envelopestructure in envelope])
+        del self.messagestream
+        self.checkmessage(self.root,self.defmessage)
+        self.checkforerrorlist()
+        self.ta_info.update(self.root.queries)
+        self.ta_info['total_number_of_messages'] = count
+
+    def _canonicaltree(self,node_instance,structure):
+        ''' streaming: placeholder for message that is already checked is not checked again (only counted).'''
+        if not self.streaming or node_instance not in self.placeholders:
+            super(xml,self)._canonicaltree(node_instance,structure)
+
+    def _entitytype(self,tag,has_children=False):
+        ''' check if xml-element is record according to grammar (1), record not in grammar (2) or field (0).
+            called at start of xml-element (children not known yet); called again if a field turns out to have children.
+        '''
         structure_level = self.stack[-1]
         if LEVEL in structure_level:
-            for structure_record in structure_level[LEVEL]:   #find xmlchildnode in structure
-                if xmlchildnode.tag == structure_record[ID]:
+            for structure_record in structure_level[LEVEL]:   #find xml-element in structure
+                if tag == structure_record[ID]:
                     self.stack.append(structure_record)
                     return 1
         #tag not in structure. Check for children; Return 2 if has children
-        if len(xmlchildnode):
+        if has_children:
             return 2
         return 0
 
@@ -1563,8 +2064,8 @@ class xmlnocheck(xml):
     def checkmessage(self,node_instance,defmessage,subtranslation=False):
         pass
 
-    def _entitytype(self,xmlchildnode):
-        if len(xmlchildnode):
+    def _entitytype(self,tag,has_children=False):
+        if has_children:
             self.stack.append(0)
             return 1
         return 0
@@ -1572,13 +2073,170 @@ class xmlnocheck(xml):
     def stackinit(self):
         self.stack = [0,]     #stack to track where we are in structure of grammar
 
+class _JsonReader(object):
+    ''' reads a json file incrementally: the top level of the json content is scanned, values are decoded one at a time
+        (via json raw_decode, so the C-decoder is used). For json with a list of messages only one message is in memory as json object.
+    '''
+    chunksize = 65536   #number of characters read from file at once
+    whitespace = re.compile(r'[ \t\n\r]*')
+    numbertail = re.compile(r'[0-9.eE+-]*')
+
+    def __init__(self,filehandler):
+        self.filehandler = filehandler
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = simplejson.JSONDecoder()
+
+    def close(self):
+        self.filehandler.close()
+
+    def _read(self,size):
+        ''' read more of file to buffer (what is already handled is dropped); returns False at end of file.'''
+        if not self.eof:
+            chunk = self.filehandler.read(size)
+            if chunk:
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+            self.eof = True
+        return False
+
+    def peek(self):
+        ''' skip whitespace; returns next character, '' at end of file.'''
+        while True:
+            self.pos = self.whitespace.match(self.buffer,self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read(self.chunksize):
+                return ''
+
+    def expect(self,chars):
+        ''' next character should be one of chars; returns this character.'''
+        char = self.peek()
+        if not char or char not in chars:
+            raise botslib.InMessageError('[J57]: content of json not OK: expected "%(chars)s" but found "%(found)s".',
+                                            {'chars':'" or "'.join(chars),'found':char or 'end of file'})
+        self.pos += 1
+        return char
+
+    def value(self):
+        ''' decode next json value (object, list, string, number etc).'''
+        self.peek()
+        size = self.chunksize
+        while True:
+            try:
+                value,end = self.decoder.raw_decode(self.buffer,self.pos)
+            except ValueError as msg:
+                if self._read(size):    #value might be incomplete: read more
+                    size *= 2
+                    continue
+                raise botslib.InMessageError('[J57]: content of json not OK: %(msg)s.',{'msg':msg})
+            if self.numbertail.match(self.buffer,end).end() == len(self.buffer) and self._read(size):   #number might continue in next part of file
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        ''' generator; yields the values of a list (after '[' is read) one by one.'''
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
 class json(Inmessage):
+    ''' class for json. Lists of messages are read incrementally: one message at a time is decoded and converted to nodes.
+        If indicated in syntax ('streaming') and json is a list of messages: messages are passed to mapping as soon as they are read.
+    '''
+    streaming = False
+
     def initfromfile(self):
         self.messagegrammarread(typeofgrammarfile='grammars')
         name_root_dict_according_to_grammar = self._getrootid()
+        botsglobal.logger.debug('Read edi file "%(filename)s".',self.ta_info)
+        reader = _JsonReader(botslib.opendata(filename=self.ta_info['filename'],mode='r',charset=self.ta_info['charset'],errors=self.ta_info['checkcharsetin']))
+        #list of messages (option 1, 2, 4 in _initfromjsonobject) is read incrementally; else whole json is read.
+        messages = None
+        try:
+            char = reader.peek()
+            if char == '[':
+                reader.pos += 1
+                messages = self._jsonmessages(reader,name_root_dict_according_to_grammar,is_root_list=True)
+            elif char == '{':
+                reader.pos += 1
+                if reader.peek() == '"' and reader.value() == name_root_dict_according_to_grammar and reader.expect(':') and reader.peek() == '[':
+                    reader.pos += 1
+                    messages = self._jsonmessages(reader,name_root_dict_according_to_grammar,is_root_list=False)
+        except botslib.InMessageError:
+            pass    #json is read again as a whole; gives the error
+        except:
+            reader.close()
+            raise
+        if messages is None:
+            reader.close()
+            self._initfromjsonobject(self._readjson(),name_root_dict_according_to_grammar)
+            return
+        self.root = node.Node()     #initialise new node.
+        self.streaming = bool(self.ta_info.get('streaming') and self.defmessage.nextmessage is None and not callable(self.ta_info.get('preprocess_nodes')))
+        if self.streaming:
+            self.messagestream = messages    #messages are read in nextmessage()
+            return
+        try:
+            self.root.children = list(messages)
+        except _JsonNotAList:   #is one message (option 5): read again
+            self._initfromjsonobject(self._readjson(),name_root_dict_according_to_grammar)
+            return
+        self.checkmessage(self.root,self.defmessage)
+        for child in self.root.children:
+            self.ta_info.update(child.queries)
+            break
+
+    def _readjson(self):
+        ''' read whole json file as json object.'''
         self._readcontent_edifile()
         jsonobject = simplejson.loads(self.rawinput)
         del self.rawinput
+        return jsonobject
+
+    def _jsonmessages(self,reader,name,is_root_list):
+        ''' generator; yields the messages (nodes) in json list as read (incremental); same messages as _initfromjsonobject.
+            is_root_list: json is [..] (option 1 or 2), else {rootdict:[...]} (option 4).
+        '''
+        try:
+            is_named = None
+            for i in reader.items():
+                if is_root_list:
+                    if not isinstance(i,dict):
+                        raise botslib.InMessageError('[J56]: content of json not OK. Content is expected to be a list of objects, but is list of something else.')
+                    if is_named is None:
+                        is_named = len(i)==1 and name in i
+                    if is_named:
+                        # 1.List of messages, named: [{rootdict:{,,,}},{rootdict:{,,,}},]
+                        yield self._dojsonobject(i[name],name)
+                        continue
+                    # 2. List of messages, name via grammar: [{,,,},{,,,},].
+                # 4. list of messages, named: {rootdict:[{,,,},{,,,},]}
+                if isinstance(i,dict):
+                    newnode = self._dojsonobject(i,name)
+                    if newnode:
+                        yield newnode
+                elif isinstance(i,(basestring,int,long,float)):
+                    yield i
+                elif self.ta_info['checkunknownentities']:
+                    raise botslib.InMessageError('[J54]: List content must be a object, string, int, long or float - but it is not.')
+            if not is_root_list and reader.expect('},') != '}':
+                raise _JsonNotAList()
+            if reader.peek():
+                raise botslib.InMessageError('[J57]: content of json not OK: extra data after json content.')
+        finally:
+            reader.close()
+
+    def _initfromjsonobject(self,jsonobject,name_root_dict_according_to_grammar):
+        ''' convert whole json object to node tree.'''
         #several options for format...
         #examine content, determine IsNamed, IsOneMessage, convert to Node tree
         #option 2 and 5 are preferred...
@@ -1630,6 +2288,38 @@ class json(Inmessage):
                 self.ta_info.update(child.queries)
                 break
 
+    def nextmessage(self):
+        ''' Passes each 'message' to the mapping script.
+            streaming: each message is checked and passed as soon as it is read; finally the number of messages is checked.
+            errors make the whole file fail (results of earlier messages are deleted); number of messages is not known in advance.
+        '''
+        if not self.streaming:
+            for message in super(json,self).nextmessage():
+                yield message
+            return
+        self.ta_info['total_number_of_messages'] = None
+        count = 0
+        try:
+            for messagenode in self.messagestream:
+                if self.ta_info['has_structure']:
+                    self._checkonemessage(messagenode,self.defmessage,False)
+                self.checkforerrorlist()
+                count += 1
+                if count == 1:
+                    self.ta_info.update(messagenode.queries)
+                ta_info = self.ta_info.copy()
+                ta_info.update(messagenode.queries)
+                ta_info['message_number'] = count
+                ta_info['bots_accessenvelope'] = self.root   #give mappingscript access to envelope
+                yield self._initmessagefromnode(messagenode,ta_info,self.syntax)
+        except _JsonNotAList:
+            raise botslib.InMessageError('[J57]: content of json not OK: {"%(root)s":[...]} has more keys; can not be streamed.',{'root':self._getrootid()})
+        del self.messagestream
+        if self.ta_info['has_structure']:
+            self._checkcountmessages(count,self.defmessage)
+        self.checkforerrorlist()
+        self.ta_info['total_number_of_messages'] = count
+
     def _getrootid(self):
         return self.defmessage.structure[0][ID]
 
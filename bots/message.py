@@ -1,5 +1,8 @@
 from __future__ import print_function
 import sys
+import re
+import time
+import datetime
 #bots-modules
 from . import botslib
 from . import node
@@ -7,6 +10,41 @@ from . import botsglobal
 from . import grammar
 from .botsconfig import *
 
+DIGITS = re.compile('[0-9]+\\Z')
+
+def checkdate(value):
+    ''' check date with format CCYYMMDD or YYMMDD; raise ValueError if not a valid date.
+        same result as time.strptime, but only digits are checked without strptime (strptime is slow).
+    '''
+    lenght = len(value)
+    if lenght == 8:
+        if not DIGITS.match(value):
+            time.strptime(value,'%Y%m%d')
+            return
+        year = int(value[:4])
+    elif lenght == 6:
+        if not DIGITS.match(value):
+            time.strptime(value,'%y%m%d')
+            return
+        year = int(value[:2])
+        year += 2000 if year < 69 else 1900     #as strptime does for %y
+    else:
+        raise ValueError('To be catched')
+    datetime.date(year,int(value[-4:-2]),int(value[-2:]))   #raises ValueError for invalid date
+
+def checktime(value):
+    ''' check time with format HHMM or HHMMSS; raise ValueError if not a valid time.
+        same result as time.strptime, but only digits are checked without strptime (strptime is slow).
+    '''
+    lenght = len(value)
+    if lenght != 4 and lenght != 6:
+        raise ValueError('To be catched')
+    if not DIGITS.match(value):
+        time.strptime(value,'%H%M' if lenght == 4 else '%H%M%S')
+        return
+    if int(value[:2]) > 23 or int(value[2:4]) > 59 or (lenght == 6 and int(value[4:]) > 61):   #strptime accepts leap seconds 60 and 61
+        raise ValueError('To be catched')
+
 
 class Message(object):
     ''' abstract class; represents a edi message.
@@ -94,6 +132,10 @@ class Message(object):
             for childnode in node_instance.children:
                 count += 1
                 self._checkonemessage(childnode,defmessage,subtranslation)
+        self._checkcountmessages(count,defmessage)
+
+    def _checkcountmessages(self,count,defmessage):
+        ''' check number of messages (occurences of root record) against grammar.'''
         if count < defmessage.structure[0][MIN]:
             self.add2errorlist('[S03] Root record "%(mpath)s" occurs %(count)d times, min is %(mincount)d.\n'%
                                 {'mpath':defmessage.structure[0][ID],'count':count,'mincount':defmessage.structure[0][MIN]})
@@ -174,19 +216,20 @@ class Message(object):
     def _canonicaltree(self,node_instance,structure):
         ''' For nodes: check min and max occurence; sort the records conform grammar
         '''
-        sortednodelist = []
+        sortednodelist = node._ChildList()
         self._canonicalfields(node_instance,structure)    #handle fields of this record
         if node_instance.structure is None:
             node_instance.structure = structure
         if LEVEL in structure:
+            childrenperrecord = {}      #children of node by (BOTSID,BOTSIDnr); one pass over the children instead of one pass per record_definition
+            for childnode in node_instance.children:
+                childrenperrecord.setdefault((childnode.record['BOTSID'],childnode.record['BOTSIDnr']),[]).append(childnode)
             for record_definition in structure[LEVEL]:  #for every record_definition (in grammar) of this level
-                count = 0                           #count number of occurences of record
-                for childnode in node_instance.children:            #for every node in mpathtree; SPEED: delete nodes from list when found
-                    if childnode.record['BOTSID'] != record_definition[ID] or childnode.record['BOTSIDnr'] != record_definition[BOTSIDNR]:   #if it is not the right NODE":
-                        continue
-                    count += 1
+                childnodes = childrenperrecord.get((record_definition[ID],record_definition[BOTSIDNR]),[])   #nodes not in grammar are dropped
+                count = len(childnodes)             #number of occurences of record
+                for childnode in childnodes:
                     self._canonicaltree(childnode,record_definition)         #use rest of index in deeper level
-                    sortednodelist.append(childnode)
+                sortednodelist.extend(childnodes)
                 if record_definition[MIN] > count:
                     self.add2errorlist('[S03]%(linpos)s: Record "%(mpath)s" occurs %(count)d times, min is %(mincount)d.\n'%
                                         {'linpos':node_instance.linpos(),'mpath':self.mpathformat(record_definition[MPATH]),'count':count,'mincount':record_definition[MIN]})
@@ -3,10 +3,12 @@ from urllib import quote as urllib_quote
 import os
 import re
 from django.db import models
+from django.db.models import signals
 from django.core.validators import validate_integer
 from django.core.exceptions import ValidationError
 from django.utils.encoding import python_2_unicode_compatible
 from . import botsglobal
+from . import botslib
 from . import validate_email
 ''' Declare database tabels.
     Django is not always perfect in generating db - but improving ;-)).
@@ -584,3 +586,10 @@ class uniek(models.Model):
         db_table = 'uniek'
         verbose_name = 'counter'
         ordering = ['domein']
+
+def ccode_changed(sender,**kwargs):
+    ''' user codes are changed (via GUI, plugin): mark this for bots-engine (that caches user codes).'''
+    botslib.mark_ccode_changed()
+for sender in (ccode,ccodetrigger):
+    signals.post_save.connect(ccode_changed,sender=sender)
+    signals.post_delete.connect(ccode_changed,sender=sender)
@@ -1,5 +1,8 @@
 from __future__ import print_function
 import sys
+import logging
+import bisect
+import heapq
 try:
     import cdecimal as decimal
 except ImportError:
@@ -9,21 +12,233 @@ from . import botslib
 from . import botsglobal
 from .botsconfig import *
 
+CHILDINDEX_MINCHILDREN = 8      #nodes with less children are searched without child-index
+MPATHPLANCACHESIZE = 10000      #max number of compiled mpaths in cache; if more, cache is cleared.
+_mpathplans = {}
+
+
+class _Mpath(object):
+    ''' compiled mpath for get/getloop: made once for an mpath, cached in _mpathplans. Not to be changed.
+        -   parts: the dicts of the mpath with BOTSIDnr (for grammar check, logging)
+        -   levels: per part (BOTSID,items to match); BOTSID is matched first.
+        -   lastmatch, lastexist, lastfield: for get: items of last part that have to match, keys that have to exist, key of value to return
+    '''
+    __slots__ = ('parts','levels','lastdepth','lastmatch','lastexist','lastfield')
+    def __init__(self,mpaths):
+        self.parts = tuple(dict(part,BOTSIDnr=part.get('BOTSIDnr','1')) for part in mpaths)
+        levels = []
+        for part in self.parts:
+            items = sorted(part.items(),key=lambda item: item[0] != 'BOTSID')
+            levels.append((part.get('BOTSID'),tuple(items)))
+        self.levels = tuple(levels)
+        self.lastdepth = len(levels) - 1
+        self.lastmatch = tuple((key,value) for key,value in levels[-1][1] if value is not None)
+        self.lastexist = tuple(key for key,value in mpaths[-1].items() if value is None)
+        self.lastfield = self.lastexist[-1] if self.lastexist else None
+
+def _getmpathplan(kind,mpaths,sanity_check):
+    ''' get compiled mpath from cache; compile if not in cache. sanity_check is done when compiling (depending on checklevel).'''
+    try:
+        key = (kind,Node.checklevel) + tuple(map(tuple,map(dict.items,mpaths)))
+        return _mpathplans[key]
+    except KeyError:
+        pass
+    except (TypeError,AttributeError):     #eg mpath with list as value (unhashable): no caching
+        if Node.checklevel:
+            sanity_check(mpaths)
+        return _Mpath(mpaths)
+    if Node.checklevel:
+        sanity_check(mpaths)
+    if len(_mpathplans) >= MPATHPLANCACHESIZE:
+        _mpathplans.clear()
+    plan = _mpathplans[key] = _Mpath(mpaths)
+    return plan
+
+
+class _ChildList(list):
+    ''' children of a node. Each change of the list is counted (version),
+        so the child-index knows when it does not match the children anymore (eg children sorted or replaced in a mapping script).
+        version is not set before the first change (no __init__: a node is made fast).
+    '''
+    __slots__ = ('version',)
+
+    def __reduce__(self):
+        return (_ChildList,(list(self),))
+
+def _countchange(name):
+    method = getattr(list,name)
+    def countchange(self,*args,**kwargs):
+        self.version = getattr(self,'version',0) + 1
+        return method(self,*args,**kwargs)
+    countchange.__name__ = name
+    return countchange
+
+for _name in ('__setitem__','__delitem__','__setslice__','__delslice__','__iadd__','__imul__',
+              'append','extend','insert','pop','remove','reverse','sort'):
+    if hasattr(list,_name):     #__setslice__, __delslice__: python 2 only
+        setattr(_ChildList,_name,_countchange(_name))
+
+
+class _ChildIndex(object):
+    ''' index on the children of a node with many children; used in get, getloop, put and putloop.
+        -   botsid: per BOTSID the children with this BOTSID (in order).
+        -   values: per BOTSID per field (made when needed): (children per value of field, children without field); children as (position,node).
+            None if values can not be indexed (eg list as value).
+        index is kept up-to-date when a child is appended via Node.append; after any other change of the children it is made again.
+        values of a record are changed via put (only new fields are added, see occurences) or change (child is indexed again: each child refers to the child-index of its parent).
+        a value assigned directly to a record (child.record[field] = value) is not seen; use change.
+    '''
+    __slots__ = ('children','version','length','botsid','values')
+    def __init__(self,children):
+        self.children = children
+        self.version = getattr(children,'version',0)
+        self.length = len(children)
+        self.botsid = {}
+        for childnode in children:
+            self.botsid.setdefault(childnode.record.get('BOTSID'),[]).append(childnode)
+            childnode._parentindex = self
+        self.values = {}
+
+    def isvalid(self,children):
+        ''' index matches children: same list, not changed since index was made.'''
+        return self.children is children and self.version == getattr(children,'version',0)
+
+    def append(self,childnode):
+        ''' childnode is appended to children (not counted as change): update index.'''
+        position = self.length
+        self.length += 1
+        botsid = childnode.record.get('BOTSID')
+        self.botsid.setdefault(botsid,[]).append(childnode)
+        childnode._parentindex = self
+        fields = self.values.get(botsid)
+        if fields:
+            for field,entry in fields.items():
+                if entry is not None:
+                    try:
+                        self._addvalue(entry,field,position,childnode)
+                    except TypeError:
+                        fields[field] = None
+
+    def removevalues(self,childnode):
+        ''' record of childnode is going to be changed (Node.change): remove childnode from index of values.
+            returns position of childnode; None if childnode is not in index of values.
+        '''
+        if not self.isvalid(self.children):
+            return None
+        fields = self.values.get(childnode.record.get('BOTSID'))
+        if not fields:
+            return None
+        position = None
+        for field,entry in fields.items():
+            if entry is None:
+                continue
+            found = None
+            try:
+                if field in childnode.record:
+                    found = self._removeitem(entry[0].get(childnode.record[field],[]),childnode)
+            except TypeError:   #eg list as value
+                pass
+            if found is None:   #field might be added via put: child is still with children without field
+                found = self._removeitem(entry[1],childnode)
+            if found is None:   #not found (eg value assigned directly to record): made again when needed
+                del fields[field]
+            else:
+                position = found
+        return position
+
+    def addvalues(self,position,childnode):
+        ''' record of childnode is changed (Node.change): add childnode again to index of values.'''
+        fields = self.values.get(childnode.record.get('BOTSID'))
+        if not fields:
+            return
+        item = (position,childnode)
+        for field,entry in fields.items():
+            if entry is not None:
+                try:
+                    if field in childnode.record:
+                        bisect.insort(entry[0].setdefault(childnode.record[field],[]),item)
+                    else:
+                        bisect.insort(entry[1],item)
+                except TypeError:
+                    fields[field] = None
+
+    @staticmethod
+    def _removeitem(items,childnode):
+        for i,item in enumerate(items):
+            if item[1] is childnode:
+                del items[i]
+                return item[0]
+        return None
+
+    @staticmethod
+    def _addvalue(entry,field,position,childnode):
+        if field in childnode.record:
+            entry[0].setdefault(childnode.record[field],[]).append((position,childnode))
+        else:
+            entry[1].append((position,childnode))
+
+    def _makevalues(self,botsid,field):
+        entry = ({},[])
+        try:
+            for position,childnode in enumerate(self.children):
+                if childnode.record.get('BOTSID') == botsid:
+                    self._addvalue(entry,field,position,childnode)
+        except TypeError:
+            return None
+        return entry
+
+    @staticmethod
+    def indexfield(mpath):
+        ''' field of mpath that is used to find children.'''
+        for field in mpath:
+            if field != 'BOTSID' and field != 'BOTSIDnr':
+                return field
+        return 'BOTSIDnr'
+
+    def occurences(self,botsid,mpath,field):
+        ''' children (in order) that can be the same occurence as mpath: children with another value for field are skipped.
+        '''
+        fields = self.values.setdefault(botsid,{})
+        if field not in fields:
+            fields[field] = self._makevalues(botsid,field)
+        entry = fields[field]
+        if entry is None:
+            return self.botsid.get(botsid,())
+        valuemap,missing = entry
+        try:
+            if missing:     #field might be added to children via put: move these
+                stillmissing = []
+                for item in missing:
+                    if field in item[1].record:
+                        bisect.insort(valuemap.setdefault(item[1].record[field],[]),item)
+                    else:
+                        stillmissing.append(item)
+                missing[:] = stillmissing
+            samevalue = valuemap.get(mpath[field],())
+        except TypeError:
+            fields[field] = None
+            return self.botsid.get(botsid,())
+        if not missing:
+            return (item[1] for item in samevalue)
+        return (item[1] for item in heapq.merge(samevalue,missing))
+
 
 class Node(object):
     ''' Node class for building trees in inmessage and outmessage
     '''
     #slots: python optimalisation to preserve memory. Disadv.: no dynamic attr in this class
     #in tests: for normal translations less memory and faster; no effect fo one-on-one translations.
-    __slots__ = ('record','children','_queries','linpos_info','structure')
+    __slots__ = ('record','children','_queries','linpos_info','structure','_childindex','_parentindex')
     def __init__(self,record=None,linpos_info=None):
         if record:
             record.setdefault('BOTSIDnr', '1')
         self.record = record    #record is a dict with fields
-        self.children = []
+        self.children = _ChildList()
         self.linpos_info = linpos_info
         self._queries = None
         self.structure = None
+        self._childindex = None
+        self._parentindex = None    #child-index of parent (if any); is updated when record is changed
 
     def linpos(self):
         if self.linpos_info:
@@ -33,7 +248,56 @@ class Node(object):
 
     def append(self,childnode):
         '''append child to node'''
-        self.children.append(childnode)
+        index = self._childindex
+        if index is None:
+            list.append(self.children,childnode)    #no child-index yet: change need not be counted
+        elif index.isvalid(self.children):
+            list.append(self.children,childnode)    #not counted as change: index is updated
+            index.append(childnode)
+        else:
+            self.children.append(childnode)
+            self._childindex = None
+
+    def _getchildindex(self):
+        ''' child-index of node; made again if children are changed other than via append (eg children sorted, replaced, removed).
+            changes are counted by _ChildList; returns None if children are not a _ChildList (eg a plain list assigned in a mapping script):
+            changes of a plain list can not be tracked, and self.children is not replaced as a reference to it might be kept.
+        '''
+        children = self.children
+        index = self._childindex
+        if index is None or not index.isvalid(children):
+            if len(children) < CHILDINDEX_MINCHILDREN or not isinstance(children,_ChildList):
+                self._childindex = None
+                return None
+            index = self._childindex = _ChildIndex(children)
+        return index
+
+    def _childrenwithbotsid(self,botsid):
+        ''' children with BOTSID botsid (in order); via child-index, made when needed.'''
+        if botsid is None:
+            return self.children
+        index = self._getchildindex()
+        if index is None:
+            return self.children
+        return index.botsid.get(botsid,())
+
+    def _findoccurence(self,mpath):
+        ''' first child that is the same occurence as mpath (see _sameoccurence); record of child is updated with mpath.
+            returns None if no such child.
+            for nodes with many children the child-index is used: only children with same BOTSID and same (or no) value for one field of mpath are checked.
+        '''
+        botsid = mpath['BOTSID']
+        index = self._getchildindex()
+        if index is None:
+            for childnode in self.children:
+                if childnode.record['BOTSID'] == botsid and childnode._sameoccurence(mpath):    #checking of BOTSID is also done in sameoccurance!->performance!
+                    return childnode
+            return None
+        field = index.indexfield(mpath)
+        for childnode in index.occurences(botsid,mpath,field):
+            if childnode.record['BOTSID'] == botsid and childnode._sameoccurence(mpath):
+                return childnode
+        return None
 
     #********************************************************
     #*** queries ********************************************
@@ -182,11 +446,16 @@ class Node(object):
                 return False    #no match:
         else:   #all key,value are matched.
             if len(where) == 1:    #mpath is exhausted; so we are there!!! #replace values with values in 'change'; delete if None
+                position = None
+                if self._parentindex is not None:
+                    position = self._parentindex.removevalues(self)
                 for key,value in change.items():
                     if value is None:
                         self.record.pop(key,'nep')
                     else:
                         self.record[key] = value
+                if position is not None:
+                    self._parentindex.addvalues(position,self)    #index this record again under its new values
                 return True
             else:           #go recursive
                 for childnode in self.children:
@@ -218,6 +487,7 @@ class Node(object):
                     terug =  childnode._deletecore(mpaths[1:]) #search recursive for rest of mpaths
                     if terug == 2:  #indicates node should be removed
                         del self.children[i]    #remove node
+                        self._childindex = None
                         return 1    #this indicates: deleted successfull, do not remove anymore (no removal of parents)
                     if terug:
                         return terug
@@ -230,56 +500,60 @@ class Node(object):
             function returns 1 value; return None if nothing found.
             if more than one value can be found: first one is returned
             starts searching in current node, then deeper
+            the mpath is compiled (and checked) once; see _Mpath.
         '''
-        if Node.checklevel:
-            self._mpath_sanity_check(mpaths[:-1])
-            #sanity check of last part of mpaths: None only allowed in last section of Mpath; check last part
-            if not isinstance(mpaths[-1],dict):
-                raise botslib.MappingFormatError('Must be dicts in tuple: get(%(mpath)s)',{'mpath':mpaths})
-            if 'BOTSID' not in mpaths[-1]:
-                raise botslib.MappingFormatError('Last section without "BOTSID": get(%(mpath)s)',{'mpath':mpaths})
-            count = 0
-            for key,value in mpaths[-1].items():
-                if not isinstance(key,basestring):
-                    raise botslib.MappingFormatError('Keys must be strings in last section: get(%(mpath)s)',{'mpath':mpaths})
-                if value is None:
-                    count += 1
-                elif not isinstance(value,basestring):
-                    raise botslib.MappingFormatError('Values must be strings (or none) in last section: get(%(mpath)s)',{'mpath':mpaths})
-            if count > 1:
-                raise botslib.MappingFormatError('Max one "None" in last section: get(%(mpath)s)',{'mpath':mpaths})
-        for part in mpaths:
-            part.setdefault('BOTSIDnr', '1')
+        plan = _getmpathplan('get',mpaths,self._get_sanity_check)
         if Node.checklevel == 2:
-            self._mpath_grammar_check(mpaths)
-        terug =  self._getcore(mpaths)
-        botsglobal.logmap.debug('"%(terug)s" for get%(mpaths)s',{'terug':terug,'mpaths':unicode(mpaths)})
+            self._mpath_grammar_check(plan.parts)
+        terug = self._getplan(plan,0)
+        if botsglobal.logmap.isEnabledFor(logging.DEBUG):
+            botsglobal.logmap.debug('"%(terug)s" for get%(mpaths)s',{'terug':terug,'mpaths':unicode(plan.parts)})
         return terug
 
-    def _getcore(self,mpaths):
-        if len(mpaths) != 1:    #node is not end-node
-            for key,value in mpaths[0].items():          #check all items in mpath;
-                if key not in self.record or value != self.record[key]:  #does not match/is not right node
-                    return None
-            else:   #all items in mpath are matched and OK; recursuve search
-                for childnode in self.children:
-                    terug =  childnode._getcore(mpaths[1:]) #recursive search for rest of mpaths
-                    if terug is not None:
-                        return terug
-                else:   #nothing found in children
+    @staticmethod
+    def _get_sanity_check(mpaths):
+        ''' sanity check of mpaths for get.'''
+        Node._mpath_sanity_check(mpaths[:-1])
+        #sanity check of last part of mpaths: None only allowed in last section of Mpath; check last part
+        if not isinstance(mpaths[-1],dict):
+            raise botslib.MappingFormatError('Must be dicts in tuple: get(%(mpath)s)',{'mpath':mpaths})
+        if 'BOTSID' not in mpaths[-1]:
+            raise botslib.MappingFormatError('Last section without "BOTSID": get(%(mpath)s)',{'mpath':mpaths})
+        count = 0
+        for key,value in mpaths[-1].items():
+            if not isinstance(key,basestring):
+                raise botslib.MappingFormatError('Keys must be strings in last section: get(%(mpath)s)',{'mpath':mpaths})
+            if value is None:
+                count += 1
+            elif not isinstance(value,basestring):
+                raise botslib.MappingFormatError('Values must be strings (or none) in last section: get(%(mpath)s)',{'mpath':mpaths})
+        if count > 1:
+            raise botslib.MappingFormatError('Max one "None" in last section: get(%(mpath)s)',{'mpath':mpaths})
+
+    def _getplan(self,plan,depth):
+        ''' recursive part of get(), with compiled mpath.'''
+        record = self.record
+        if depth == plan.lastdepth:     #node is end-node
+            for key,value in plan.lastmatch:
+                if key not in record or value != record[key]:  #does not match/is not right node
                     return None
-        else:   #node is end-node
-            terug = 1 #default return value: if there is no 'None' in the mpath, but everything is matched, 1 is returned (like True)
-            for key,value in mpaths[0].items():          #check all items in mpath;
-                if key not in self.record:  #does not match/is not right node
+            for key in plan.lastexist:
+                if key not in record:
                     return None
-                elif value is None:   #item has None-value; remember this value because this might be the right node
-                    terug = self.record[key][:]    #copy to avoid memory problems
-                elif value != self.record[key]:   #compare values
-                    return None     #does not match/is not right node
-            else:   #all keys/values in this mpathr are matched and OK.
-                return terug        #either the remembered value is returned or 1 (as a boolean, indicated 'found)
-
+            if plan.lastfield is None:
+                return 1    #if there is no 'None' in the mpath, but everything is matched, 1 is returned (like True)
+            return record[plan.lastfield][:]    #copy to avoid memory problems
+        for key,value in plan.levels[depth][1]:
+            if key not in record or value != record[key]:  #does not match/is not right node
+                return None
+        children = self.children
+        if len(children) >= CHILDINDEX_MINCHILDREN:
+            children = self._childrenwithbotsid(plan.levels[depth+1][0])
+        for childnode in children:
+            terug = childnode._getplan(plan,depth+1)  #recursive search for rest of mpaths
+            if terug is not None:
+                return terug
+        return None
 
     def getcount(self):
         '''count the number of nodes/records under the node/in whole tree'''
@@ -308,29 +582,33 @@ class Node(object):
     def getloop(self,*mpaths):
         ''' generator. Returns one by one the nodes as indicated in mpath
         '''
-        if Node.checklevel:
-            self._mpath_sanity_check(mpaths)
-        for part in mpaths:
-            part.setdefault('BOTSIDnr', '1')
+        plan = _getmpathplan('getloop',mpaths,self._mpath_sanity_check)
         if Node.checklevel == 2:
-            self._mpath_grammar_check(mpaths)
-        for terug in self._getloopcore(mpaths):
-            botsglobal.logmap.debug('getloop %(mpaths)s returns "%(record)s".',{'mpaths':mpaths,'record':terug.record})
-            yield terug
+            self._mpath_grammar_check(plan.parts)
+        if botsglobal.logmap.isEnabledFor(logging.DEBUG):
+            for terug in self._getloopplan(plan,0):
+                botsglobal.logmap.debug('getloop %(mpaths)s returns "%(record)s".',{'mpaths':plan.parts,'record':terug.record})
+                yield terug
+        else:
+            for terug in self._getloopplan(plan,0):
+                yield terug
 
-    def _getloopcore(self,mpaths):
-        ''' recursive part of getloop()
+    def _getloopplan(self,plan,depth):
+        ''' recursive part of getloop(), with compiled mpath.
         '''
-        for key,value in mpaths[0].items():
-            if key not in self.record or value != self.record[key]:
+        record = self.record
+        for key,value in plan.levels[depth][1]:
+            if key not in record or value != record[key]:
                 return
-        else:   #all items are checked and OK.
-            if len(mpaths) == 1:
-                yield self      #found!
-            else:
-                for childnode in self.children:
-                    for terug in childnode._getloopcore(mpaths[1:]): #search recursive for rest of mpaths
-                        yield terug
+        if depth == plan.lastdepth:
+            yield self      #found!
+        else:
+            children = self.children
+            if len(children) >= CHILDINDEX_MINCHILDREN:
+                children = self._childrenwithbotsid(plan.levels[depth+1][0])
+            for childnode in children:
+                for terug in childnode._getloopplan(plan,depth+1): #search recursive for rest of mpaths
+                    yield terug
 
     def getloop_including_mpath(self,*mpaths):
         ''' generator. Returns one by one the nodes as indicated in mpath
@@ -424,13 +702,11 @@ class Node(object):
     def _putcore(self,mpaths):
         if not mpaths:  #newmpath is exhausted, stop searching.
             return
-        for childnode in self.children:
-            if childnode.record['BOTSID'] == mpaths[0]['BOTSID'] and childnode._sameoccurence(mpaths[0]):    #checking of BOTSID is also done in sameoccurance!->performance!
-                childnode._putcore(mpaths[1:])
-                return
-        else:   #is not present in children, so append mpath as a new node
-            self.append(Node(mpaths[0]))
-            self.children[-1]._putcore(mpaths[1:])
+        childnode = self._findoccurence(mpaths[0])
+        if childnode is None:   #is not present in children, so append mpath as a new node
+            childnode = Node(mpaths[0])
+            self.append(childnode)
+        childnode._putcore(mpaths[1:])
 
     def putloop(self,*mpaths):
         #sanity check of mpaths
@@ -459,12 +735,11 @@ class Node(object):
         if len(mpaths) ==1: #end of mpath reached; always make new child-node
             self.append(Node(mpaths[0]))
             return self.children[-1]
-        for childnode in self.children:  #if first part of mpaths exists already in children go recursive
-            if childnode.record['BOTSID'] == mpaths[0]['BOTSID'] and childnode._sameoccurence(mpaths[0]):    #checking of BOTSID is also done in sameoccurance!->performance!
-                return childnode._putloopcore(mpaths[1:])
-        else:   #is not present in children, so append a child, and go recursive
-            self.append(Node(mpaths[0]))
-            return self.children[-1]._putloopcore(mpaths[1:])
+        childnode = self._findoccurence(mpaths[0])     #if first part of mpaths exists already in children go recursive
+        if childnode is None:   #is not present in children, so append a child, and go recursive
+            childnode = Node(mpaths[0])
+            self.append(childnode)
+        return childnode._putloopcore(mpaths[1:])
 
     def _sameoccurence(self, mpath):
         ''' checks if all items that appear in both node and mpath have the same value. If so, all new items in mpath are added to node
@@ -529,6 +804,7 @@ class Node(object):
                     n.children.sort(key=lambda s: s.getdecimal(*comparekey) or sort_if_none,reverse=reverse)
                 else:
                     n.children.sort(key=lambda s: s.get(*comparekey) or sort_if_none,reverse=reverse)
+                n._childindex = None    #order of children is changed
         finally:
             Node.checklevel = remember_checklevel
 
@@ -610,6 +886,7 @@ class Node(object):
         if self.record is not None:
             for key, value in self.record.items():
                 self.record[key] = value.strip()
+        self._childindex = None     #values of children are changed
         for child in self.children:
             child.stripnode()
 
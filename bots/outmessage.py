@@ -1,5 +1,6 @@
 import sys
-import time
+import re
+import functools
 try:
     import cdecimal as decimal
 except ImportError:
@@ -26,6 +27,14 @@ from . import grammar
 from . import node
 from .botsconfig import *
 
+QUANTIZE_DECIMALS = dict((decimals,decimal.Decimal('10e-%d'%decimals)) for decimals in range(10))   #for rounding to nr of decimals; speed: avoid making Decimal for each field
+
+def quantize_decimals(decimals):
+    try:
+        return QUANTIZE_DECIMALS[decimals]
+    except KeyError:
+        return decimal.Decimal('10e-%d'%decimals)
+
 def outmessage_init(**ta_info):
     ''' dispatch function class Outmessage or subclass
         ta_info: needed is editype, messagetype, filename, charset, merge
@@ -48,9 +57,11 @@ class Outmessage(message.Message):
                 If part not as a node:
                     append new node to tree;
                     recursively append next parts to tree
-        After the mappingscript is finished, the resulting tree is converted to self.lex_records.
-        These lex_records are written to file.
+        After the mappingscript is finished, the resulting tree is converted to lex_records.
+        These lex_records are written to file as they are produced.
     '''
+    write_buffersize = 65536    #number of characters collected before writing to file
+
     def __init__(self,ta_info):
         super(Outmessage,self).__init__(ta_info)
         self.root = node.Node(record={})         #message tree; build via put()-interface in mappingscript. Initialise with empty dict
@@ -123,50 +134,59 @@ class Outmessage(message.Message):
 
     def _write(self,node_instance):
         ''' the write method for most classes.
-            tree is serialised to lex_records; lex_records are written to file.
+            tree is serialised to lex_records, these to strings; written to file as they are produced (not whole message in memory).
             Classses that write using other libraries (xml, json, template, db) use specific write methods.
         '''
-        self.tree2records(node_instance)
-        value = self.record2string(self.lex_records)
         wrap_length = int(self.ta_info.get('wrap_length', 0))
-        if wrap_length:
-            try:
-                for i in range(0,len(value),wrap_length):  #split in fixed lengths
-                    self._outstream.write(value[i:i+wrap_length] + '\r\n')
-            except UnicodeError as msg:
-                content = botslib.get_relevant_text_for_UnicodeError(msg)
-                raise botslib.OutMessageError('[F50]: Characters not in character-set "%(char)s": %(content)s',
-                                                {'char':self.ta_info['charset'],'content':content})
-        else:
-            try:
+        buffer = []         #strings to write; written in blocks
+        buffersize = 0
+        try:
+            for value in self._record2strings(self._tree2recordscore(node_instance,self.defmessage.structure[0])):
+                buffer.append(value)
+                buffersize += len(value)
+                if buffersize >= self.write_buffersize:
+                    value = ''.join(buffer)
+                    if wrap_length:     #write only complete lines of wrap_length; rest stays in buffer
+                        end = len(value) - len(value) % wrap_length
+                        self._outstream.write(''.join(value[i:i+wrap_length] + '\r\n' for i in range(0,end,wrap_length)))
+                        value = value[end:]
+                    else:
+                        self._outstream.write(value)
+                        value = ''
+                    buffer = [value]
+                    buffersize = len(value)
+            value = ''.join(buffer)
+            if wrap_length:
+                self._outstream.write(''.join(value[i:i+wrap_length] + '\r\n' for i in range(0,len(value),wrap_length)))   #split in fixed lengths
+            else:
                 self._outstream.write(value)
-            except UnicodeError as msg:
-                content = botslib.get_relevant_text_for_UnicodeError(msg)
-                raise botslib.OutMessageError('[F50]: Characters not in character-set "%(char)s": %(content)s',
-                                                {'char':self.ta_info['charset'],'content':content})
+        except UnicodeError as msg:
+            content = botslib.get_relevant_text_for_UnicodeError(msg)
+            raise botslib.OutMessageError('[F50]: Characters not in character-set "%(char)s": %(content)s',
+                                            {'char':self.ta_info['charset'],'content':content})
 
     def tree2records(self,node_instance):
-        self.lex_records = []                   #tree of nodes is flattened to these lex_records
-        self._tree2recordscore(node_instance,self.defmessage.structure[0])
+        self.lex_records = list(self._tree2recordscore(node_instance,self.defmessage.structure[0]))   #tree of nodes is flattened to these lex_records
 
     def _tree2recordscore(self,node_instance,structure):
-        ''' Write tree of nodes to flat lex_records.
+        ''' Write tree of nodes to flat lex_records (generator).
             The nodes are already sorted
         '''
-        self._tree2recordfields(node_instance.record,structure)    #write node->lex_record
+        yield self._tree2recordfields(node_instance.record,structure)    #write node->lex_record
         for childnode in node_instance.children:
             botsid_childnode = childnode.record['BOTSID'].strip()   #speed up: use local var
             botsidnr_childnode = childnode.record['BOTSIDnr']       #speed up: use local var
             for structure_record in structure[LEVEL]:  #for structure_record of this level in grammar
                 if botsid_childnode == structure_record[ID] and botsidnr_childnode == structure_record[BOTSIDNR]:   #check if is is the right node
-                    self._tree2recordscore(childnode,structure_record)         #use rest of index in deeper level
+                    for lex_record in self._tree2recordscore(childnode,structure_record):         #use rest of index in deeper level
+                        yield lex_record
                     break       #childnode was found and used; break to go to next child node
 
     def _tree2recordfields(self,noderecord,structure_record):
         ''' from noderecord->lex_record; use structure_record as guide.
             complex because is is used for: editypes that have compression rules (edifact), var editypes without compression, fixed protocols
         '''
-        lex_record = []    #the record build; list (=record) of dicts (=fields).
+        lex_record = []    #the record build; list (=record) of lists (=fields: [VALUE,SFIELD,FORMATFROMGRAMMAR]).
         recordbuffer = []
         for field_definition in structure_record[FIELDS]:       #loop all fields in grammar-definition
             if field_definition[ISFIELD]:    #if field (no composite)
@@ -175,15 +195,15 @@ class Outmessage(message.Message):
                     if field_definition[ID] in noderecord  and noderecord[field_definition[ID]]:
                         #field exists in outgoing message and has data
                         field_has_data = True
-                        recordbuffer.append({VALUE:noderecord[field_definition[ID]],SFIELD:0,FORMATFROMGRAMMAR:field_definition[FORMAT]})
+                        recordbuffer.append([noderecord[field_definition[ID]],0,field_definition[FORMAT]])
                     elif self.ta_info['stripfield_sep']:
                         #no data and field not needed: write new empty field to recordbuffer;
-                        recordbuffer.append({VALUE:'',SFIELD:0,FORMATFROMGRAMMAR:field_definition[FORMAT]})
+                        recordbuffer.append(['',0,field_definition[FORMAT]])
                     else:
                         #no data but field is needed: initialise empty field. For eg fixed and csv: all fields have to be present
                         field_has_data = True
                         value = self._initfield(field_definition)
-                        recordbuffer.append({VALUE:value,SFIELD:0,FORMATFROMGRAMMAR:field_definition[FORMAT]})
+                        recordbuffer.append([value,0,field_definition[FORMAT]])
                     if field_has_data:
                         lex_record += recordbuffer          #write recordbuffer to lex_record
                         recordbuffer = []                   #clear recordbuffer
@@ -195,17 +215,17 @@ class Outmessage(message.Message):
                         for field in noderecord[field_definition[ID]]:
                             if field:
                                 field_has_data = True
-                                fieldbuffer.append({VALUE:field,SFIELD:type_of_field,FORMATFROMGRAMMAR:field_definition[FORMAT]})
+                                fieldbuffer.append([field,type_of_field,field_definition[FORMAT]])
                                 recordbuffer += fieldbuffer
                                 fieldbuffer = []
                             else:
-                                fieldbuffer.append({VALUE:'',SFIELD:type_of_field,FORMATFROMGRAMMAR:field_definition[FORMAT]})
+                                fieldbuffer.append(['',type_of_field,field_definition[FORMAT]])
                             type_of_field = 2       #mark rest of repeats as repeat.
                     if field_has_data:
                         lex_record += recordbuffer          #write recordbuffer to lex_record
                         recordbuffer = []                   #clear recordbuffer
                     else:
-                        recordbuffer.append({VALUE:'',SFIELD:0,FORMATFROMGRAMMAR:field_definition[FORMAT]})
+                        recordbuffer.append(['',0,field_definition[FORMAT]])
             else:  #if composite
                 if field_definition[MAXREPEAT] == 1:    #if non-repeating
                     field_has_data = False
@@ -214,18 +234,18 @@ class Outmessage(message.Message):
                     for grammarsubfield in field_definition[SUBFIELDS]:   #loop subfields
                         if grammarsubfield[ID] in noderecord and noderecord[grammarsubfield[ID]]:       #field exists in outgoing message and has data
                             field_has_data = True
-                            fieldbuffer.append({VALUE:noderecord[grammarsubfield[ID]],SFIELD:type_of_field})   #append field
+                            fieldbuffer.append([noderecord[grammarsubfield[ID]],type_of_field,None])   #append field
                             recordbuffer += fieldbuffer
                             fieldbuffer = []
                         else:
-                            fieldbuffer.append({VALUE:'',SFIELD:type_of_field})                      #append new empty to buffer;
+                            fieldbuffer.append(['',type_of_field,None])                      #append new empty to buffer;
                         type_of_field = 1
                     if field_has_data:
                         lex_record += recordbuffer          #write recordbuffer to lex_record
                         recordbuffer = []                   #clear recordbuffer
                     else:
                         #composite has no data: write empty field
-                        recordbuffer.append({VALUE:'',SFIELD:0})
+                        recordbuffer.append(['',0,None])
                 else:   #repeating composite
                     #receive list, including empty members
                     field_has_data = False
@@ -239,27 +259,26 @@ class Outmessage(message.Message):
                                 for grammarsubfield in field_definition[SUBFIELDS]:   #loop subfields
                                     if grammarsubfield[ID] in comp_dict and comp_dict[grammarsubfield[ID]]:       #field exists in outgoing message and has data
                                         composite_has_data = True
-                                        compositebuffer.append({VALUE:comp_dict[grammarsubfield[ID]],SFIELD:type_of_field,FORMATFROMGRAMMAR:grammarsubfield[FORMAT]})
+                                        compositebuffer.append([comp_dict[grammarsubfield[ID]],type_of_field,grammarsubfield[FORMAT]])
                                         fieldbuffer += compositebuffer
                                         compositebuffer = []
                                     else:
-                                        compositebuffer.append({VALUE:'',SFIELD:type_of_field,FORMATFROMGRAMMAR:grammarsubfield[FORMAT]})
+                                        compositebuffer.append(['',type_of_field,grammarsubfield[FORMAT]])
                                     type_of_field = 1
                             if composite_has_data:
                                 field_has_data = True
                                 recordbuffer += fieldbuffer
                                 fieldbuffer = []
                             else:
-                                fieldbuffer.append({VALUE:'',SFIELD:type_of_field})
+                                fieldbuffer.append(['',type_of_field,None])
                             type_of_field = 2
                     if field_has_data:
                         lex_record += recordbuffer          #write recordbuffer to lex_record
                         recordbuffer = []                   #clear recordbuffer
                     else:
                         #no data: write placeholder to recordbuffer;
-                        recordbuffer.append({VALUE:'',SFIELD:0})
-
-        self.lex_records.append(lex_record)
+                        recordbuffer.append(['',0,None])
+        return lex_record
 
 
     def _formatfield(self,value, field_definition,structure_record,node_instance):
@@ -284,12 +303,7 @@ class Outmessage(message.Message):
             lenght = len(value)
             if field_definition[BFORMAT] == 'D':
                 try:
-                    if lenght == 6:
-                        time.strptime(value,'%y%m%d')
-                    elif lenght == 8:
-                        time.strptime(value,'%Y%m%d')
-                    else:
-                        raise ValueError('To be catched')
+                    message.checkdate(value)
                 except ValueError:
                     self.add2errorlist('[F22]: Record "%(record)s" date field "%(field)s" not a valid date: "%(content)s".\n'%
                                         {'record':self.mpathformat(structure_record[MPATH]),'field':field_definition[ID],'content':value})
@@ -301,12 +315,7 @@ class Outmessage(message.Message):
                                         {'record':self.mpathformat(structure_record[MPATH]),'field':field_definition[ID],'content':value,'min':field_definition[MINLENGTH]})
             else:   #if field_definition[BFORMAT] == 'T':
                 try:
-                    if lenght == 4:
-                        time.strptime(value,'%H%M')
-                    elif lenght == 6:
-                        time.strptime(value,'%H%M%S')
-                    else:
-                        raise ValueError('To be catched')
+                    message.checktime(value)
                 except ValueError:
                     self.add2errorlist('[F23]: Record "%(record)s" time field "%(field)s" not a valid time: "%(content)s".\n'%
                                         {'record':self.mpathformat(structure_record[MPATH]),'field':field_definition[ID],'content':value})
@@ -357,7 +366,7 @@ class Outmessage(message.Message):
                         lengthcorrection += 1
                 try:
                     dec_value = decimal.Decimal(value)
-                    value = unicode(dec_value.quantize(decimal.Decimal('10e-%d'%field_definition[DECIMALS])))
+                    value = unicode(dec_value.quantize(quantize_decimals(field_definition[DECIMALS])))
                 except:
                     self.add2errorlist('[F26]: Record "%(record)s" field "%(field)s" numerical format not valid: "%(content)s".\n'%
                                         {'field':field_definition[ID],'content':value,'record':self.mpathformat(structure_record[MPATH])})
@@ -397,7 +406,7 @@ class Outmessage(message.Message):
             if field_definition[BFORMAT] == 'R':    #floating point: use all decimals received
                 value = value.zfill(field_definition[MINLENGTH] )
             elif field_definition[BFORMAT] == 'N':  #fixed decimals; round
-                value = unicode(decimal.Decimal(value).quantize(decimal.Decimal('10e-%d'%field_definition[DECIMALS])))
+                value = unicode(decimal.Decimal(value).quantize(quantize_decimals(field_definition[DECIMALS])))
                 value = value.zfill(field_definition[MINLENGTH])
                 value = value.replace('.',self.ta_info['decimaal'],1)    #replace '.' by required decimal sep.
             elif field_definition[BFORMAT] == 'I':  #implicit decimals
@@ -405,7 +414,11 @@ class Outmessage(message.Message):
         return value
 
     def record2string(self,lex_records):
-        ''' write lex_records to a file.
+        ''' lex_records to one string.'''
+        return ''.join(self._record2strings(lex_records))
+
+    def _record2strings(self,lex_records):
+        ''' lex_records to strings (generator; one string per record).
             using the right editype (edifact, x12, etc) and charset.
             write (all fields of) each record using the right separators, escape etc
         '''
@@ -414,68 +427,83 @@ class Outmessage(message.Message):
         record_sep = self.ta_info['record_sep'] + ('' if self.ta_info['record_sep'] in '\r\n' else self.ta_info['add_crlfafterrecord_sep'])
         field_sep = self.ta_info['field_sep']
         quote_char = self.ta_info['quote_char']
-        escape = self.ta_info['escape']
         forcequote = self.ta_info['forcequote']
-        escapechars = self._getescapechars()
+        escape_value,escape_quoted_value = self._getescapefunctions()
         noBOTSID = self.ta_info.get('noBOTSID',False)
         rep_sep     = self.ta_info['reserve']
 
-        lijst = []
         for lex_record in lex_records:
             if noBOTSID:  #for csv/fixed: do not write BOTSID so remove it
                 del lex_record[0]
             fieldcount = 0
-            mode_quote = False
-            value = ''     #to collect the formatted record-string.
+            recordstring = []     #to collect the formatted record-string.
             for field in lex_record:        #loop all fields in lex_record
                 if not field[SFIELD]:   #is a field:
                     if fieldcount == 0:  #do nothing because first field in lex_record is not preceded by a separator
                         fieldcount = 1
                     elif fieldcount == 1:
-                        value += record_tag_sep
+                        recordstring.append(record_tag_sep)
                         fieldcount = 2
                     else:
-                        value += field_sep
+                        recordstring.append(field_sep)
                 elif field[SFIELD] == 1:   #is a subfield:
-                    value += sfield_sep
+                    recordstring.append(sfield_sep)
                 else:                   #repeat
-                    value += rep_sep
+                    recordstring.append(rep_sep)
+                value = field[VALUE]
                 if quote_char:      #quote char only used for csv
-                    start_to__quote = False
                     if forcequote == 2:
-                        if field[FORMATFROMGRAMMAR] in ['AN','A','AR']:
-                            start_to__quote = True
+                        start_to__quote = field[FORMATFROMGRAMMAR] in ['AN','A','AR']
                     elif forcequote:    #always quote; this catches values 1, '1', '0'
                         start_to__quote = True
                     else:
-                        if field_sep in field[VALUE] or quote_char in field[VALUE] or record_sep in field[VALUE]:
-                            start_to__quote = True
+                        start_to__quote = field_sep in value or quote_char in value or record_sep in value
                     if start_to__quote:
-                        value += quote_char
-                        mode_quote = True
-                for char in field[VALUE]:   #use escape (edifact, tradacom). For x12 is warned if content contains separator
-                    if char in escapechars:
-                        if isinstance(self,x12):
-                            if self.ta_info['replacechar'] is not None:
-                                char = self.ta_info['replacechar']
-                            else:
-                                raise botslib.OutMessageError('[F51]: Character "%(char)s" is used as separator in this x12 file, so it can not be used in content. Field: "%(content)s".',
-                                                                {'char':char,'content':field[VALUE]})
-                        else:
-                            value += escape
-                    elif mode_quote and char == quote_char:
-                        value += quote_char
-                    value += char
-                if mode_quote:
-                    value += quote_char
-                    mode_quote = False
-            value += record_sep
-            lijst.append(value)
-        return ''.join(lijst)
+                        recordstring.append(quote_char)
+                        recordstring.append(escape_quoted_value(value) if escape_quoted_value else value)
+                        recordstring.append(quote_char)
+                        continue
+                recordstring.append(escape_value(value) if escape_value else value)  #use escape (edifact, tradacom). For x12 separators in content are replaced or give error
+            recordstring.append(record_sep)
+            yield ''.join(recordstring)
+
+    def _getescapefunctions(self):
+        ''' returns functions to escape the content of a field: (not quoted field, quoted field). None if nothing to escape.
+            the escape sequence for each character is determined once, not for each character written.
+        '''
+        table = dict((char,self._getescapesequence(char)) for char in self._getescapechars())
+        quote_char = self.ta_info['quote_char']
+        quotedtable = table.copy()
+        if quote_char and quote_char not in quotedtable:
+            quotedtable[quote_char] = quote_char + quote_char     #quote char in quoted content is doubled
+        return _escapefunction(table),_escapefunction(quotedtable)
+
+    def _getescapesequence(self,char):
+        ''' returns string to write for char in _getescapechars().'''
+        return self.ta_info['escape'] + char
 
     def _getescapechars(self):
         return ''
 
+def _escapefunction(table):
+    ''' returns function that replaces each character in table by its escape sequence (in one pass); None if table is empty.
+        escape sequence None: character can not be used in content (x12).
+    '''
+    if not table:
+        return None
+    def replace(match):
+        sequence = table[match.group()]
+        if sequence is None:
+            raise botslib.OutMessageError('[F51]: Character "%(char)s" is used as separator in this x12 file, so it can not be used in content. Field: "%(content)s".',
+                                            {'char':match.group(),'content':match.string})
+        return sequence
+    pattern = re.compile('[%s]'%''.join(re.escape(char) for char in table))
+    search = pattern.search     #speed up: most values have nothing to escape; search is faster than sub
+    sub = functools.partial(pattern.sub,replace)
+    def escape(value):
+        return sub(value) if search(value) else value
+    return escape
+
 class fixed(Outmessage):
     def _initfield(self,field_definition):
         if field_definition[BFORMAT] == 'A':
@@ -574,6 +602,10 @@ class x12(var):
             terug += self.ta_info['reserve']
         return terug
 
+    def _getescapesequence(self,char):
+        ''' x12 has no escape: separator in content is replaced by replacechar; if replacechar is None: error.'''
+        return self.ta_info['replacechar']
+
 class xml(Outmessage):
     ''' Some problems with right xml prolog, standalone, DOCTYPE, processing instructons: Different ET versions give different results.
         Things work OK for python 2.7
@@ -716,20 +748,105 @@ class json(Outmessage):
             self._outstream.write('[')
 
     def _write(self,node_instance):
-        ''' convert node tree to appropriate python object.
-            python objects are written to json by simplejson.
+        ''' write node tree as json; nodes are written straight to file (no python object for the whole message is built).
+            output is the same as json.dump of the python object (as made by _node2json).
         '''
         if self.nrmessagewritten:
             self._outstream.write(',')
-        if self.ta_info['named_root_object']:
-            jsonobject = {node_instance.record['BOTSID']:self._node2json(node_instance)}
-        else:
-            jsonobject = self._node2json(node_instance)
         if self.ta_info['indented']:
             indent = 2
         else:
             indent = None
-        simplejson.dump(jsonobject, self._outstream, skipkeys=False, ensure_ascii=False, check_circular=False, indent=indent)
+        self._jsonencoder = simplejson.JSONEncoder(skipkeys=False, ensure_ascii=False, check_circular=False, indent=indent)
+        self._jsonpieces = []
+        if self.ta_info['named_root_object']:
+            self._writejsonobject([(node_instance.record['BOTSID'],node_instance)],0)
+        else:
+            self._writejsonvalue(node_instance,0)
+        self._outstream.write(''.join(self._jsonpieces))
+        del self._jsonpieces
+
+    def _writejsonvalue(self,value,level):
+        ''' write json for value: node, dict, list or simple value (string, number).'''
+        if isinstance(value,node.Node):
+            pairs = self._node2jsonpairs(value)
+            if pairs is None:   #can not be written directly
+                self._writejsonvalue(self._node2json(value),level)
+            else:
+                self._writejsonobject(pairs,level)
+        elif isinstance(value,dict):
+            self._writejsonobject(value.items(),level)
+        elif isinstance(value,(list,tuple)):
+            self._writejsonlist(value,level)
+        else:
+            self._jsonpieces.append(self._jsonencoder.encode(value))
+
+    def _writejsonobject(self,pairs,level):
+        ''' write json object for (key,value) pairs; indents/separators as json.dump.'''
+        pieces = self._jsonpieces
+        separator,newline_indent,level = self._jsonseparator(level)
+        first = True
+        for key,value in pairs:
+            if first:
+                first = False
+                pieces.append('{' + newline_indent)
+            else:
+                pieces.append(separator)
+            pieces.append(self._jsonencoder.encode(key) + self._jsonencoder.key_separator)
+            self._writejsonvalue(value,level)
+        if first:
+            pieces.append('{}')
+            return
+        if newline_indent:
+            pieces.append('\n' + ' ' * (self._jsonencoder.indent * (level - 1)))
+        pieces.append('}')
+        if len(pieces) > 1000:  #write what is done so far
+            self._outstream.write(''.join(pieces))
+            del pieces[:]
+
+    def _writejsonlist(self,values,level):
+        pieces = self._jsonpieces
+        if not values:
+            pieces.append('[]')
+            return
+        separator,newline_indent,level = self._jsonseparator(level)
+        pieces.append('[' + newline_indent)
+        for i,value in enumerate(values):
+            if i:
+                pieces.append(separator)
+            self._writejsonvalue(value,level)
+        if newline_indent:
+            pieces.append('\n' + ' ' * (self._jsonencoder.indent * (level - 1)))
+        pieces.append(']')
+
+    def _jsonseparator(self,level):
+        ''' returns separator between items, newline+indent before first item, level of items.'''
+        if self._jsonencoder.indent is None:
+            return self._jsonencoder.item_separator,'',level
+        level += 1
+        newline_indent = '\n' + ' ' * (self._jsonencoder.indent * level)
+        return self._jsonencoder.item_separator + newline_indent,newline_indent,level
+
+    def _node2jsonpairs(self,node_instance):
+        ''' (key,value) pairs of json object for node, in order of _node2json; values are strings or nodes or lists of nodes.
+            returns None if this can not be done (eg record is not ordered); than _node2json is used.
+        '''
+        if not isinstance(node_instance.record,OrderedDict):
+            return None
+        pairs = OrderedDict((key,value) for key,value in node_instance.record.items() if key != 'BOTSID' and key != 'BOTSIDnr')
+        for childnode in node_instance.children:
+            key = childnode.record['BOTSID']
+            if key in node_instance.record:     #child has same name as field
+                return None
+            if childnode.linpos_info == 'OK':           #linpos_info indicates here this node occurs only once -> dict in json, not a list of dicts
+                pairs[key] = childnode
+            elif key not in pairs:
+                pairs[key] = [childnode]
+            elif isinstance(pairs[key],list):
+                pairs[key].append(childnode)
+            else:
+                return None
+        return pairs.items()
 
     def _closewrite(self):
         if self.write_json_list :
@@ -828,6 +945,16 @@ class jsonnocheck(json):
         newjsonobject.pop('BOTSIDnr',None)
         return newjsonobject
 
+    def _node2jsonpairs(self,node_instance):
+        ''' (key,value) pairs of json object for node, in order of _node2json (fields sorted).'''
+        pairs = OrderedDict((key,value) for key,value in sorted(node_instance.record.items()) if key != 'BOTSID' and key != 'BOTSIDnr')
+        for childnode in node_instance.children:
+            key = childnode.record['BOTSID']
+            if key in node_instance.record:     #child has same name as field
+                return None
+            pairs.setdefault(key,[]).append(childnode)
+        return pairs.items()
+
 class templatehtml(Outmessage):
     ''' uses Genshi library for templating. Genshi is very similar to Kid, and is the fork/follow-up of Kid.
         Kid is not being developed further; in time Kid will not be in repositories etc.
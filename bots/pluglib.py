@@ -12,6 +12,7 @@ from django.core import serializers
 from . import models
 from . import botslib
 from . import botsglobal
+from . import grammar
 ''' functions for reading and making plugins.
     Reading an making functions are separate functions.
 '''
@@ -120,6 +121,7 @@ def read_plugin(pathzipfile):
         raise botslib.PluginError('Error writing files to system. Nothing is written to database. Error:\n%(txt)s',{'txt':txt})
     else:
         myzip.close()
+        grammar.usersys_changed()
         botsglobal.logger.info('Writing files to filesystem is OK.')
         return warnrenamed
 
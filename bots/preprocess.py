@@ -1,8 +1,8 @@
 import sys
 import os
 import re
+import mmap
 import zipfile
-import string
 #bots-modules
 from . import botslib
 from . import botsglobal
@@ -87,7 +87,7 @@ def postprocess(routedict,function,status=FILEOUT,rootidta=None,**argv):
     return nr_files
 
 #regular expression for mailbag.
-HEADER = re.compile('''
+HEADER = re.compile(b'''
     \s*
     (
         (?P<edifact>
@@ -126,24 +126,45 @@ def mailbag(ta_from,endstatus,frommessagetype,**argv):
         - handle multiple ISA's with different separators in one file
         in bots > 3.0.0 all mailbag, edifact, x12 and tradacoms go via mailbag.
     '''
-    edifile = botslib.readdata(filename=ta_from.filename,charset='iso-8859-1')
+    if frommessagetype == 'mailbag':    #if indicated 'mailbag': guess if this is an xml file. Only start of file is read (xml file can be big).
+        filehandler = botslib.opendata_bin(filename=ta_from.filename,mode='rb')
+        sniffxml = filehandler.read(25)
+        filehandler.close()
+        sniffxml = sniffxml.lstrip(b' \t\n\r\f\v\xFF\xFE\xEF\xBB\xBF\x00')       #to find first ' real' data; some char are because of BOM, UTF-16 etc
+        if sniffxml[:1] == b'<':
+            #is a xml file; inmessage.py can determine the right xml messagetype via xpath.
+            filesize = os.path.getsize(botslib.abspathdata(ta_from.filename))
+            ta_to = ta_from.copyta(status=endstatus,statust=OK,filename=ta_from.filename,editype='xml',messagetype='mailbag',filesize=filesize)
+            return
+    #file is memory-mapped (not read in memory); headers and trailers are searched from a position in the file, so no copies of the rest of the file are made.
+    #positions in bytes are the same as positions in iso-8859-1 characters.
+    filehandler = botslib.opendata_bin(filename=ta_from.filename,mode='rb')
+    try:
+        if not os.fstat(filehandler.fileno()).st_size:  #empty file can not be memory-mapped
+            raise botslib.InMessageError('[M52]: Edi file contains only whitespace.')
+        edifile = mmap.mmap(filehandler.fileno(),0,access=mmap.ACCESS_READ)
+        try:
+            _splitmailbag(edifile,ta_from,endstatus,frommessagetype)
+        finally:
+            edifile.close()
+    finally:
+        filehandler.close()
+
+def _searchtrailer(pattern,edifile,headpos):
+    ''' search pattern (text with iso-8859-1 characters) in edifile from headpos.'''
+    return re.compile(pattern.encode('iso-8859-1'),re.DOTALL|re.VERBOSE).search(edifile,headpos)
+
+def _splitmailbag(edifile,ta_from,endstatus,frommessagetype):
+    ''' split edifile (bytes, eg memory-mapped file) in interchanges; each interchange is written to a new file/ta.'''
     startpos = 0
     nr_interchanges = 0
     while True:
-        found = HEADER.match(edifile[startpos:])
+        found = HEADER.match(edifile,startpos)
         if found is None:
-            if edifile[startpos:].strip(string.whitespace+'\x1A\x00'):  #there is content...but not valid
+            if edifile[startpos:].strip(b' \t\n\r\x0b\x0c\x1A\x00'):  #there is content...but not valid
                 if nr_interchanges:    #found interchanges, but remainder is not valid
                     raise botslib.InMessageError('[M50]: Found data not in a valid interchange at position %(pos)s.',{'pos':startpos})
-                else:   #no interchanges found, content is not a valid edifact/x12/tradacoms interchange
-                    if frommessagetype == 'mailbag':    #if indicated 'mailbag': guess if this is an xml file.....
-                        sniffxml = edifile[:25]
-                        sniffxml = sniffxml.lstrip(' \t\n\r\f\v\xFF\xFE\xEF\xBB\xBF\x00')       #to find first ' real' data; some char are because of BOM, UTF-16 etc
-                        if sniffxml and sniffxml[0] == '<':
-                            #is a xml file; inmessage.py can determine the right xml messagetype via xpath.
-                            filesize = len(edifile)
-                            ta_to = ta_from.copyta(status=endstatus,statust=OK,filename=ta_from.filename,editype='xml',messagetype='mailbag',filesize=filesize)
-                            return
+                else:   #no interchanges found, content is not a valid edifact/x12/tradacoms interchange (xml is already handled)
                     raise botslib.InMessageError('[M51]: Edi file does not start with a valid interchange.')
             else:   #no parseble content
                 if nr_interchanges:    #OK: there are interchanges, but no new interchange is found.
@@ -152,10 +173,10 @@ def mailbag(ta_from,endstatus,frommessagetype,**argv):
                     raise botslib.InMessageError('[M52]: Edi file contains only whitespace.')
         elif found.group('x12'):
             editype = 'x12'
-            headpos = startpos + found.start('x12')
+            headpos = found.start('x12')
             #determine field_sep and record_sep
             count = 0
-            for char in edifile[headpos:headpos+120]:  #search first 120 characters to determine separators
+            for char in edifile[headpos:headpos+120].decode('iso-8859-1'):  #search first 120 characters to determine separators
                 if char in '\r\n' and count != 105:
                     continue
                 count += 1
@@ -168,30 +189,31 @@ def mailbag(ta_from,endstatus,frommessagetype,**argv):
                 elif count == 106:
                     record_sep = char
                     break
-            foundtrailer = re.search('''%(record_sep)s
+            foundtrailer = _searchtrailer('''%(record_sep)s
                                         \s*
                                         I[\n\r]*E[\n\r]*A
                                         .+?
                                         %(record_sep)s
                                         '''%{'record_sep':re.escape(record_sep)},
-                                        edifile[headpos:],re.DOTALL|re.VERBOSE)
+                                        edifile,headpos)
             if not foundtrailer:
-                foundtrailer2 = re.search('''%(record_sep)s
+                foundtrailer2 = _searchtrailer('''%(record_sep)s
                                             \s*
                                             I[\n\r]*E[\n\r]*A
                                             '''%{'record_sep':re.escape(record_sep)},
-                                            edifile[headpos:],re.DOTALL|re.VERBOSE)
+                                            edifile,headpos)
                 if foundtrailer2:
-                    raise botslib.InMessageError('[M60]: Found no segment terminator for IEA trailer at position %(pos)s.',{'pos':foundtrailer2.start()})
+                    raise botslib.InMessageError('[M60]: Found no segment terminator for IEA trailer at position %(pos)s.',{'pos':foundtrailer2.start()-headpos})
                 else:
                     raise botslib.InMessageError('[M54]: Found no valid IEA trailer for the ISA header at position %(pos)s.',{'pos':headpos})
         elif found.group('edifact'):
             editype = 'edifact'
-            headpos = startpos + found.start('edifact')
+            headpos = found.start('edifact')
             #parse UNA. valid UNA: UNA:+.? '
             if found.group('UNA'):
+                unastring = found.group('UNAstring').decode('iso-8859-1')
                 count = 0
-                for char in found.group('UNAstring'):
+                for char in unastring:
                     if char in '\r\n':
                         continue
                     count += 1
@@ -201,21 +223,21 @@ def mailbag(ta_from,endstatus,frommessagetype,**argv):
                         escape = char
                     elif count == 6:
                         record_sep = char
-                if count != 6 and len(found.group('UNAstring').rstrip()) != 6:
+                if count != 6 and len(unastring.rstrip()) != 6:
                     raise botslib.InMessageError('[M55]: Non-valid UNA-segment at position %(pos)s. UNA-segment should be 6 positions.',{'pos':headpos})
-                if found.group('field_sep') != field_sep:
+                if found.group('field_sep').decode('iso-8859-1') != field_sep:
                     raise botslib.InMessageError('[M56]: Data element separator used in edifact file differs from value indicated in UNA-segment.')
             else:   #no UNA, interpret UNB
-                if found.group('field_sep') == '+':
+                if found.group('field_sep') == b'+':
                     record_sep = "'"
                     escape = '?'
-                elif found.group('field_sep') == '\x1D':        #according to std this was preffered way...probably quite theoretic...but does no harm
+                elif found.group('field_sep') == b'\x1D':        #according to std this was preffered way...probably quite theoretic...but does no harm
                     record_sep = '\x1C'
                     escape = ''
                 else:
                     raise botslib.InMessageError('[M57]: Edifact file with non-standard separators. UNA segment should be used.')
             #search trailer
-            foundtrailer = re.search('''[^%(escape)s\n\r]       #char that is not escape or cr/lf
+            foundtrailer = _searchtrailer('''[^%(escape)s\n\r]       #char that is not escape or cr/lf
                                         [\n\r]*?                #maybe some cr/lf's
                                         %(record_sep)s          #segment separator
                                         \s*                     #whitespace between segments
@@ -225,7 +247,7 @@ def mailbag(ta_from,endstatus,frommessagetype,**argv):
                                         [\n\r]*?                #maybe some cr/lf's
                                         %(record_sep)s          #segment separator
                                         '''%{'escape':escape,'record_sep':re.escape(record_sep)},
-                                        edifile[headpos:],re.DOTALL|re.VERBOSE)
+                                        edifile,headpos)
             if not foundtrailer:
                 raise botslib.InMessageError('[M58]: Found no valid UNZ trailer for the UNB header at position %(pos)s.',{'pos':headpos})
         elif found.group('tradacoms'):
@@ -233,8 +255,8 @@ def mailbag(ta_from,endstatus,frommessagetype,**argv):
             #~ field_sep = '='     #the tradacoms 'after-segment-tag-separator'
             record_sep = "'"
             escape = '?'
-            headpos = startpos + found.start('STX')
-            foundtrailer = re.search('''[^%(escape)s\n\r]       #char that is not escape or cr/lf
+            headpos = found.start('STX')
+            foundtrailer = _searchtrailer('''[^%(escape)s\n\r]       #char that is not escape or cr/lf
                                         [\n\r]*?                #maybe some cr/lf's
                                         %(record_sep)s          #segment separator
                                         \s*                     #whitespace between segments
@@ -244,16 +266,16 @@ def mailbag(ta_from,endstatus,frommessagetype,**argv):
                                         [\n\r]*?                #maybe some cr/lf's
                                         %(record_sep)s          #segment separator
                                         '''%{'escape':escape,'record_sep':re.escape(record_sep)},
-                                        edifile[headpos:],re.DOTALL|re.VERBOSE)
+                                        edifile,headpos)
             if not foundtrailer:
                 raise botslib.InMessageError('[M59]: Found no valid END trailer for the STX header at position %(pos)s.',{'pos':headpos})
         #so: found an interchange (from headerpos until endpos)
-        endpos = headpos + foundtrailer.end()
+        endpos = foundtrailer.end()
         ta_to = ta_from.copyta(status=endstatus)  #make transaction for translated message; gets ta_info of ta_frommes
         tofilename = unicode(ta_to.idta)
-        filesize = len(edifile[headpos:endpos])
-        tofile = botslib.opendata(tofilename,'wb',charset='iso-8859-1')
-        tofile.write(edifile[headpos:endpos])
+        filesize = endpos - headpos
+        tofile = botslib.opendata_bin(tofilename,'wb')
+        tofile.write(edifile[headpos:endpos])   #only the interchange is copied
         tofile.close()
         #editype is now either edifact, x12 or tradacoms
         #frommessagetype is the original frommessagetype (from route).
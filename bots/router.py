@@ -1,8 +1,10 @@
 import sys
+import multiprocessing
 #bots-modules
 from . import automaticmaintenance
 from . import botslib
 from . import botsglobal
+from . import botsinit
 from . import communication
 from . import envelope
 from . import preprocess
@@ -27,13 +29,18 @@ class new(object):
         self.command = command
         self.minta4query = botslib._Transaction.processlist[-1]     #the idta of rundispatcher is rootidta of run.
         self.keep_track_if_outchannel_deferred = {}
+        self.outcommunication_pool = None       #pool of worker processes for out-communication; made when first needed
+        self.outcommunication_pending = {}      #outchannel: result of out-communication running in pool
 
     def run(self):
         print 'start new.run'
-        for route in self.routestorun:
-            botslib.setrouteid(route)
-            self.router(route)
-            botslib.setrouteid('')
+        try:
+            for route in self.routestorun:
+                botslib.setrouteid(route)
+                self.router(route)
+                botslib.setrouteid('')
+        finally:
+            self.join_outcommunication()
         return True
 
     @botslib.log_session
@@ -184,6 +191,8 @@ class new(object):
                                     OR topartner in (SELECT from_partner_id
                                     FROM partnergroup
                                     WHERE to_partner_id=%(topartner_tochannel_id)s )) '''
+            #out-communication for this channel might still run in the pool; wait for it, so files for the channel are handled in order.
+            self.wait_outcommunication(routedict['tochannel'])
             toset = {'status':FILEOUT,'statust':OK,'tochannel':routedict['tochannel']}
             towhere['rootidta'] = rootidta
             nr_of_outgoing_files_for_channel = botslib.addinfocore(change=toset,where=towhere,wherestring=wherestring)
@@ -200,19 +209,53 @@ class new(object):
             #for all files in run that are for this channel (including the deferred ones from other routes)
             if not routedict['defer']:
                 if botslib.countoutfiles(idchannel=routedict['tochannel'],rootidta=rootidta):
-                    botslib.tryrunscript(self.userscript,self.scriptname,'preoutcommunication',routedict=routedict)
-                    communication.run(idchannel=routedict['tochannel'],command=routedict['command'],idroute=routedict['idroute'],rootidta=rootidta)
-                    #in communication several things can go wrong.
-                    #all outgoing files should have same status; that way all recomnnunication can be handled the same:
-                    #- status EXTERNOUT statust DONE (if communication goes OK)
-                    #- status EXTERNOUT status ERROR (if file is not communicatied)
-                    #to have the same status for all outgoing files some manipulation is needed, eg in case no connection could be made.
-                    botslib.addinfo(change={'status':EXTERNOUT,'statust':ERROR},where={'status':FILEOUT,'statust':OK,'tochannel':routedict['tochannel'],'rootidta':rootidta})
-                    botslib.tryrunscript(self.userscript,self.scriptname,'postoutcommunication',routedict=routedict)
+                    if self.use_outcommunication_pool(routedict):
+                        if self.outcommunication_pool is None:
+                            self.outcommunication_pool = multiprocessing.Pool(processes=botsglobal.ini.getint('settings','outcommunication_workers',0),
+                                                                              initializer=botsinit.initworker,
+                                                                              initargs=(botsglobal.ini.get('directories','config_org'),list(botslib._Transaction.processlist),
+                                                                                        botslib.getrouteid(),self.get_minta4query()))
+                        self.outcommunication_pending[routedict['tochannel']] = self.outcommunication_pool.apply_async(_outcommunication_worker,
+                                                                    [(list(botslib._Transaction.processlist),botslib.getrouteid(),routedict,rootidta)])
+                    else:
+                        botslib.tryrunscript(self.userscript,self.scriptname,'preoutcommunication',routedict=routedict)
+                        outcommunication(routedict,rootidta)
+                        botslib.tryrunscript(self.userscript,self.scriptname,'postoutcommunication',routedict=routedict)
 
         botslib.tryrunscript(self.userscript,self.scriptname,'end',routedict=routedict)
 
 
+    def use_outcommunication_pool(self,routedict):
+        ''' out-communication is done in a pool of worker processes if set in bots.ini (outcommunication_workers).
+            not for routes with a routescript (functions in routescript expect out-communication to be done),
+            not for routes in outcommunication_inorder_routes.
+        '''
+        if botsglobal.ini.getint('settings','outcommunication_workers',0) <= 1 or self.userscript:
+            return False
+        inorder_routes = [idroute.strip() for idroute in (botsglobal.ini.get('settings','outcommunication_inorder_routes',None) or '').split(',')]
+        return routedict['idroute'] not in inorder_routes
+
+    def wait_outcommunication(self,idchannel):
+        ''' wait until out-communication of channel in pool is done (if any).'''
+        result = self.outcommunication_pending.pop(idchannel,None)
+        if result is not None:
+            try:
+                result.get()
+            except:
+                botsglobal.logger.exception('Error in out-communication of channel "%(idchannel)s".',{'idchannel':idchannel})
+
+    def join_outcommunication(self):
+        ''' wait until all out-communication in pool is done; stop the pool.'''
+        if self.outcommunication_pool is None:
+            return
+        try:
+            for idchannel in list(self.outcommunication_pending):
+                self.wait_outcommunication(idchannel)
+        finally:
+            self.outcommunication_pool.close()
+            self.outcommunication_pool.join()
+            self.outcommunication_pool = None
+
     def evaluate(self):
         try:
             return automaticmaintenance.evaluate(self.command,self.get_minta4query())
@@ -226,6 +269,29 @@ class new(object):
         return self.minta4query
 
 
+def outcommunication(routedict,rootidta):
+    ''' run outgoing channel of route part.'''
+    communication.run(idchannel=routedict['tochannel'],command=routedict['command'],idroute=routedict['idroute'],rootidta=rootidta)
+    #in communication several things can go wrong.
+    #all outgoing files should have same status; that way all recomnnunication can be handled the same:
+    #- status EXTERNOUT statust DONE (if communication goes OK)
+    #- status EXTERNOUT status ERROR (if file is not communicatied)
+    #to have the same status for all outgoing files some manipulation is needed, eg in case no connection could be made.
+    botslib.addinfo(change={'status':EXTERNOUT,'statust':ERROR},where={'status':FILEOUT,'statust':OK,'tochannel':routedict['tochannel'],'rootidta':rootidta})
+
+def _outcommunication_worker(args):
+    ''' run outgoing channel of route part in a worker process.'''
+    processlist,routeid,routedict,rootidta = args
+    botslib._Transaction.processlist = processlist     #db-ta's made by worker are made by the route part
+    botslib.setrouteid(routeid)
+    outcommunication_in_worker(routedict,rootidta)
+
+@botslib.log_session
+def outcommunication_in_worker(routedict,rootidta):
+    ''' as process (db-ta) of its own: an error is marked in this process, as for out-communication in route part.'''
+    outcommunication(routedict,rootidta)
+
+
 class crashrecovery(new):
     ''' a crashed run is rerun.
         cleanup things first (all TA not OK or DONE.)
@@ -2,7 +2,13 @@ import sys
 import os
 import copy
 import collections
+import base64
 import unicodedata
+import multiprocessing
+try:
+    from collections import OrderedDict
+except:
+    from .bots_ordereddict import OrderedDict   #python2.6
 try:
     import cPickle as pickle
 except ImportError:
@@ -11,6 +17,7 @@ import json as simplejson
 #bots-modules
 from . import botslib
 from . import botsglobal
+from . import botsinit
 from . import inmessage
 from . import outmessage
 from . import grammar
@@ -29,22 +36,63 @@ from .communication import run
 def translate(startstatus,endstatus,routedict,rootidta):
     ''' query edifiles to be translated.
         status: FILEIN--PARSED-<SPLITUP--TRANSLATED
+        if set in bots.ini (translate_workers), the files are translated in parallel by a pool of worker processes.
     '''
-    try:    #see if there is a userscript that can determine the translation
-        userscript,scriptname = botslib.botsimport('mappings','translation')
-    except botslib.BotsImportError:       #userscript is not there; other errors like syntax errors are not catched
-        userscript = scriptname = None
     #select edifiles to translate
-    for rawrow in botslib.query('''SELECT idta,frompartner,topartner,filename,messagetype,testindicator,editype,charset,alt,fromchannel,filesize,frommail,tomail
+    rows = [dict(rawrow) for rawrow in botslib.query('''SELECT idta,frompartner,topartner,filename,messagetype,testindicator,editype,charset,alt,fromchannel,filesize,frommail,tomail
                                 FROM ta
                                 WHERE idta>%(rootidta)s
                                 AND status=%(status)s
                                 AND statust=%(statust)s
                                 AND idroute=%(idroute)s
                                 ORDER BY idta ''',
-                                {'status':startstatus,'statust':OK,'idroute':routedict['idroute'],'rootidta':rootidta}):
-            row = dict(rawrow)   #convert to real dictionary
-            _translate_one_file(row,routedict,endstatus,userscript,scriptname)
+                                {'status':startstatus,'statust':OK,'idroute':routedict['idroute'],'rootidta':rootidta})]
+    if _translate_in_parallel(routedict,len(rows)):
+        pool = multiprocessing.Pool(processes=min(botsglobal.ini.getint('settings','translate_workers',0),len(rows)),
+                                    initializer=botsinit.initworker,
+                                    initargs=(botsglobal.ini.get('directories','config_org'),list(botslib._Transaction.processlist),botslib.getrouteid(),
+                                              botsglobal.currentrun.get_minta4query()))
+        try:
+            for result in pool.imap_unordered(_translate_worker,[(row,routedict,endstatus) for row in rows]):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        userscript,scriptname = _translation_userscript()
+        for row in rows:
+            _translate_file(row,routedict,endstatus,userscript,scriptname)
+
+def _translate_in_parallel(routedict,nr_files):
+    ''' files are translated by a pool of worker processes if set in bots.ini (translate_workers), except for routes in translate_inorder_routes.'''
+    if botsglobal.ini.getint('settings','translate_workers',0) <= 1 or nr_files <= 1:
+        return False
+    inorder_routes = [idroute.strip() for idroute in (botsglobal.ini.get('settings','translate_inorder_routes',None) or '').split(',')]
+    return routedict['idroute'] not in inorder_routes
+
+def _translation_userscript():
+    try:    #see if there is a userscript that can determine the translation
+        return botslib.botsimport('mappings','translation')
+    except botslib.BotsImportError:       #userscript is not there; other errors like syntax errors are not catched
+        return None,None
+
+def _translate_file(row,routedict,endstatus,userscript,scriptname):
+    ccodecache.checkchanged()
+    botslib.unitofwork_start()      #changes in db-ta for one incoming file are written/committed together (if set in bots.ini)
+    persistcache.start()            #changes in persist are buffered (if set in bots.ini)
+    try:
+        _translate_one_file(row,routedict,endstatus,userscript,scriptname)
+    finally:
+        try:
+            persistcache.end()
+        finally:
+            botslib.unitofwork_end()
+
+def _translate_worker(args):
+    ''' translate one incoming file in a worker process.'''
+    row,routedict,endstatus = args
+    userscript,scriptname = _translation_userscript()
+    _translate_file(row,routedict,endstatus,userscript,scriptname)
 
 def _translate_one_file(row,routedict,endstatus,userscript,scriptname):
     ''' -   read, lex, parse, make tree of nodes.
@@ -79,6 +127,9 @@ def _translate_one_file(row,routedict,endstatus,userscript,scriptname):
 
         if int(routedict['translateind']) == 3: #parse & passthrough; file is parsed, partners are known, no mapping, does confirm.
                                                 #partners should be queried from ISA level!
+            if getattr(edifile,'streaming',False):  #xml/json streaming: messages are read and checked in nextmessage
+                for inn_splitup in edifile.nextmessage():
+                    pass
             raise botslib.ParsePassthroughException('')
         #edifile.ta_info contains: init values; values from grammar, values from QUERIES
         for inn_splitup in edifile.nextmessage():   #for each message in parsed edifile (one message might get translation multiple times via 'alt'
@@ -194,6 +245,7 @@ def _translate_one_file(row,routedict,endstatus,userscript,scriptname):
                 ta_splitup.deletechildren()
             else:
                 ta_splitup.update(statust=DONE, **inn_splitup.ta_info)   #update db. inn_splitup.ta_info could be changed by mappingscript. Is this useful?
+        persistcache.flush()        #write buffered persist changes before file is OK; error in writing is an error for the file
 
     #exceptions file_in-level
     except botslib.ParsePassthroughException:   #edi-file is OK, file is passed-through after parsing.
@@ -244,14 +296,18 @@ def handle_out_message(out_translated,ta_translated):
 #*********************************************************************
 #<python thing> ->pickle-> byte stream.
 #db connection: expect unicode (as storage field is text)
-#so pickle output is turned into unicode first, using 'neutral' iso-8859-1
-#when unpickling, have to encode again of course.
-#this is upward compatible; if stored as in bots <= 3.1 is OK.
+#so pickle output is turned into unicode first: binary pickle (protocol 2, faster and smaller) as base64.
+#content as stored in older versions (pickle protocol 0, turned into unicode using 'neutral' iso-8859-1) is still read.
 #another option would be to use JSON. Only disadvantage is that it is 'data' only (not eg date-time objects)
-def persist_add(domein,botskey,value):
-    ''' store persistent values in db.
-    '''
-    content = pickle.dumps(value,0).decode('iso-8859-1')
+def _persist_dumps(value):
+    return base64.b64encode(pickle.dumps(value,2)).decode('ascii')
+
+def _persist_loads(content):
+    if content.startswith('gA'):    #base64 of binary pickle: starts with PROTO opcode (b'\x80'); a protocol 0 pickle never starts with 'g'
+        return pickle.loads(base64.b64decode(content))
+    return pickle.loads(content.encode('iso-8859-1'))
+
+def _persist_insert(domein,botskey,content,value):
     try:
         botslib.changeq(''' INSERT INTO persist (domein,botskey,content)
                             VALUES   (%(domein)s,%(botskey)s,%(content)s)''',
@@ -260,15 +316,202 @@ def persist_add(domein,botskey,value):
         raise botslib.PersistError('Failed to add for domein "%(domein)s", botskey "%(botskey)s", value "%(value)s".',
                                     {'domein':domein,'botskey':botskey,'value':value})
 
-def persist_update(domein,botskey,value):
-    ''' store persistent values in db.
-    '''
-    content = pickle.dumps(value,0).decode('iso-8859-1')
+def _persist_update(domein,botskey,content,ts):
     botslib.changeq(''' UPDATE persist
                         SET content=%(content)s,ts=%(ts)s
                         WHERE domein=%(domein)s
                         AND botskey=%(botskey)s''',
-                        {'domein':domein,'botskey':botskey,'content':content,'ts':strftime('%Y-%m-%d %H:%M:%S')})
+                        {'domein':domein,'botskey':botskey,'content':content,'ts':ts})
+
+def _persist_delete(domein,botskey):
+    botslib.changeq(''' DELETE FROM persist
+                        WHERE domein=%(domein)s
+                        AND botskey=%(botskey)s''',
+                        {'domein':domein,'botskey':botskey})
+
+def _persist_read(domein,botskeys):
+    ''' read content of botskeys from database, one query per 500 botskeys; returns dict botskey->content (only for botskeys present).'''
+    terug = {}
+    botskeys = list(OrderedDict.fromkeys(botskeys))
+    for start in range(0,len(botskeys),500):
+        chunk = botskeys[start:start+500]
+        if len(chunk) == 1:
+            rows = [(chunk[0],row['content']) for row in botslib.query('''SELECT content
+                                                                        FROM persist
+                                                                        WHERE domein=%(domein)s
+                                                                        AND botskey=%(botskey)s''',
+                                                                        {'domein':domein,'botskey':chunk[0]})]
+        else:
+            parameters = dict(('botskey%s'%(i),botskey) for i,botskey in enumerate(chunk))
+            parameters['domein'] = domein
+            rows = [(row['botskey'],row['content']) for row in botslib.query('''SELECT botskey,content
+                                                                              FROM persist
+                                                                              WHERE domein=%(domein)s
+                                                                              AND botskey IN (''' + ','.join('%%(botskey%s)s'%(i) for i in range(len(chunk))) + ')',
+                                                                              parameters)]
+        found = dict(rows)
+        nr_found = 0
+        for botskey in chunk:
+            if botskey in found:
+                terug[botskey] = found[botskey]
+                nr_found += 1
+        if nr_found < len(rows):    #database compares botskeys other than python (eg case insensitive): read the botskeys not found one by one
+            for botskey in chunk:
+                if botskey not in terug:
+                    terug.update(_persist_read(domein,[botskey]))
+    return terug
+
+class PersistCache(object):
+    ''' cache for persist (persist_lookup, persist_add, persist_update, persist_delete): read-through and write-behind. Reason: performance.
+        -   size is limited (bots.ini, settings, persistcachesize: max number of botskeys in cache); 0: no cache (default).
+        -   cached is the content as in database for (domein,botskey); a botskey not in database is cached too (as None).
+        -   while translating an incoming file (between start and end) updates and deletes are buffered, and written in batches
+            when the file is translated (flush). otherwise (eg in a routescript) changes are written directly.
+        -   adds are always written directly: a mapping script can catch the PersistError for a botskey that is already present
+            (also when added by another process, eg translate_workers, after it was cached as not present).
+    '''
+    def __init__(self):
+        self.buffering = False
+        self.clear()
+
+    def clear(self):
+        self.contents = {}              #(domein,botskey) -> content as in database; None if not in database
+        self.pending = OrderedDict()    #(domein,botskey) -> (change,value,content,ts) not written yet; change is 'update' or 'delete'
+        self.pid = os.getpid()          #worker processes are forked with cache of parent
+
+    def maxsize(self):
+        return botsglobal.ini.getint('settings','persistcachesize',0)
+
+    def start(self):
+        ''' start buffering of changes (eg for translating one incoming file).'''
+        if self.pid != os.getpid():
+            self.clear()
+        self.buffering = self.maxsize() > 0
+
+    def end(self):
+        ''' end buffering of changes: write buffered changes to database.'''
+        try:
+            self.flush()
+        finally:
+            self.buffering = False
+
+    def get(self,domein,botskeys):
+        ''' returns dict botskey->content as in database (None if not present); botskeys not in cache are read from database.'''
+        terug = {}
+        toread = []
+        for botskey in botskeys:
+            try:
+                terug[botskey] = self.contents[(domein,botskey)]
+            except KeyError:
+                toread.append(botskey)
+        if toread:
+            found = _persist_read(domein,toread)
+            maxsize = self.maxsize()
+            for botskey in toread:
+                terug[botskey] = found.get(botskey)
+                if maxsize:
+                    self._set(domein,botskey,terug[botskey],maxsize)
+        return terug
+
+    def _set(self,domein,botskey,content,maxsize):
+        if len(self.contents) >= maxsize and (domein,botskey) not in self.contents:
+            self.flush()
+            self.contents = {}
+        self.contents[(domein,botskey)] = content
+
+    def add(self,domein,botskey,value):
+        maxsize = self.maxsize()
+        content = _persist_dumps(value)
+        if not maxsize:
+            _persist_insert(domein,botskey,content,value)
+            return
+        if self.get(domein,[botskey])[botskey] is not None:
+            raise botslib.PersistError('Failed to add for domein "%(domein)s", botskey "%(botskey)s", value "%(value)s".',
+                                        {'domein':domein,'botskey':botskey,'value':value})
+        key = (domein,botskey)
+        if self.pending.pop(key,None) is not None:      #only pending change possible is 'delete'; write it first
+            _persist_delete(domein,botskey)
+        try:
+            _persist_insert(domein,botskey,content,value)
+        except botslib.PersistError:
+            self.contents.pop(key,None)
+            raise
+        self._set(domein,botskey,content,maxsize)
+
+    def update(self,domein,botskey,value):
+        maxsize = self.maxsize()
+        content = _persist_dumps(value)
+        ts = botslib.strftime('%Y-%m-%d %H:%M:%S')
+        if not maxsize:
+            _persist_update(domein,botskey,content,ts)
+            return
+        if self.get(domein,[botskey])[botskey] is None:     #not in database: nothing to update
+            return
+        key = (domein,botskey)
+        if self.buffering:
+            self.pending[key] = ('update',value,content,ts)
+        else:
+            _persist_update(domein,botskey,content,ts)
+        self._set(domein,botskey,content,maxsize)
+
+    def delete(self,domein,botskey):
+        maxsize = self.maxsize()
+        key = (domein,botskey)
+        if not maxsize or not self.buffering:
+            _persist_delete(domein,botskey)
+        else:
+            self.pending[key] = ('delete',None,None,None)
+        if maxsize:
+            self._set(domein,botskey,None,maxsize)
+
+    def flush(self):
+        ''' write buffered changes to database: per type of change in one batch (executemany).
+            if a batch fails, its changes are written one by one; the first failure is raised after all is written.
+        '''
+        if not self.pending:
+            return
+        pending = self.pending.items()
+        self.pending = OrderedDict()
+        error = None
+        for changes,querystring,writeone in [
+                    ([item for item in pending if item[1][0] == 'delete'],
+                                ''' DELETE FROM persist
+                                WHERE domein=%(domein)s
+                                AND botskey=%(botskey)s''',
+                                lambda key,change: _persist_delete(key[0],key[1])),
+                    ([item for item in pending if item[1][0] == 'update'],
+                                ''' UPDATE persist
+                                SET content=%(content)s,ts=%(ts)s
+                                WHERE domein=%(domein)s
+                                AND botskey=%(botskey)s''',
+                                lambda key,change: _persist_update(key[0],key[1],change[2],change[3])),
+                    ]:
+            if not changes:
+                continue
+            try:
+                botslib.changemanyq(querystring,[{'domein':key[0],'botskey':key[1],'content':change[2],'ts':change[3]} for key,change in changes])
+            except:
+                for key,change in changes:
+                    try:
+                        writeone(key,change)
+                    except Exception as msg:
+                        self.contents.pop(key,None)     #not known what is in database
+                        if error is None:
+                            error = msg
+        if error is not None:
+            raise error
+
+persistcache = PersistCache()
+
+def persist_add(domein,botskey,value):
+    ''' store persistent values in db.
+    '''
+    persistcache.add(domein,botskey,value)
+
+def persist_update(domein,botskey,value):
+    ''' store persistent values in db.
+    '''
+    persistcache.update(domein,botskey,value)
 
 def persist_add_update(domein,botskey,value):
     # add the record, or update it if already there.
@@ -280,34 +523,117 @@ def persist_add_update(domein,botskey,value):
 def persist_delete(domein,botskey):
     ''' store persistent values in db.
     '''
-    botslib.changeq(''' DELETE FROM persist
-                        WHERE domein=%(domein)s
-                        AND botskey=%(botskey)s''',
-                        {'domein':domein,'botskey':botskey})
+    persistcache.delete(domein,botskey)
 
 def persist_lookup(domein,botskey):
     ''' lookup persistent values in db.
     '''
-    for row in botslib.query('''SELECT content
-                                FROM persist
-                                WHERE domein=%(domein)s
-                                AND botskey=%(botskey)s''',
-                                {'domein':domein,'botskey':botskey}):
-        return pickle.loads(row['content'].encode('iso-8859-1'))
-    return None
+    content = persistcache.get(domein,[botskey])[botskey]
+    if content is None:
+        return None
+    return _persist_loads(content)
+
+def persist_lookup_many(domein,botskeys):
+    ''' lookup persistent values in db for a list of botskeys (with one query per 500 botskeys).
+        returns dict botskey->value; value is None if botskey is not present (as persist_lookup).
+    '''
+    return dict((botskey,None if content is None else _persist_loads(content)) for botskey,content in persistcache.get(domein,botskeys).items())
+
+def persist_add_many(domein,values):
+    ''' store persistent values in db for many botskeys at once; values is a dict or list of (botskey,value).
+        as persist_add for each botskey: PersistError if a botskey is already present (botskeys before it are added).
+    '''
+    if isinstance(values,dict):
+        values = values.items()
+    if persistcache.maxsize():
+        for botskey,value in values:
+            persistcache.add(domein,botskey,value)
+        return
+    values = list(values)
+    try:
+        botslib.changemanyq(''' INSERT INTO persist (domein,botskey,content)
+                                VALUES   (%(domein)s,%(botskey)s,%(content)s)''',
+                                [{'domein':domein,'botskey':botskey,'content':_persist_dumps(value)} for botskey,value in values])
+    except:
+        for botskey,value in values:    #one by one: add the botskeys that are not present, raise for the first one that is
+            _persist_insert(domein,botskey,_persist_dumps(value),value)
 
 #*********************************************************************
 #*** utily functions for codeconversion via database table ccode
 #*********************************************************************
+class CcodeCache(object):
+    ''' cache for code conversions (ccode, reverse_ccode, getcodeset): user codes for a ccodeid are read into memory at first use. Reason: performance.
+        -   size is limited (bots.ini, settings, ccodecachesize: max number of codes in cache); least recently used ccodeids are removed.
+            codes of a ccodeid with more codes than this are not cached (queries are used). 0: no cache (default).
+        -   codes are compared exactly (as python strings). The database might not: eg MySQL (case-insensitive collation) ignores case and trailing spaces.
+        -   cache is cleared if user codes are changed (via GUI or plugin); checked for each incoming file.
+    '''
+    fields = set(('leftcode','rightcode','attr1','attr2','attr3','attr4','attr5','attr6','attr7','attr8'))
+
+    def __init__(self):
+        self.changemarker = None
+        self.clear()
+
+    def clear(self):
+        self.ccodeids = OrderedDict()   #ccodeid -> (dict leftcode->codes, dict rightcode->first code, number of codes); or None if not cached
+        self.size = 0
+
+    def checkchanged(self):
+        ''' clear cache if user codes have been changed.'''
+        changemarker = botslib.read_ccode_changed()
+        if changemarker != self.changemarker:
+            self.changemarker = changemarker
+            self.clear()
+
+    def get(self,ccodeid,code,field):
+        ''' returns cached codes for ccodeid; None if not cached (use query).
+            only for code strings: the database might convert other types.
+        '''
+        if field not in self.fields or not isinstance(code,basestring) or not botsglobal.ini.getint('settings','ccodecachesize',0):
+            return None
+        try:
+            codes = self.ccodeids.pop(ccodeid)
+        except KeyError:
+            codes = self._read(ccodeid)
+        self.ccodeids[ccodeid] = codes      #(re)insert: is now most recently used
+        return codes
+
+    def _read(self,ccodeid):
+        maxsize = botsglobal.ini.getint('settings','ccodecachesize',0)
+        rows = [dict(row) for row in botslib.query('''SELECT leftcode,rightcode,attr1,attr2,attr3,attr4,attr5,attr6,attr7,attr8
+                                                       FROM ccode
+                                                       WHERE ccodeid_id = %(ccodeid)s
+                                                       ORDER BY id''',
+                                                       {'ccodeid':ccodeid})]
+        if len(rows) > maxsize:
+            return None
+        while self.ccodeids and self.size + len(rows) > maxsize:
+            codes = self.ccodeids.popitem(last=False)[1]
+            if codes is not None:
+                self.size -= codes[2]
+        by_leftcode = {}
+        by_rightcode = {}
+        for row in rows:
+            by_leftcode.setdefault(row['leftcode'],[]).append(row)
+            by_rightcode.setdefault(row['rightcode'],row)
+        self.size += len(rows)
+        return by_leftcode,by_rightcode,len(rows)
+
+ccodecache = CcodeCache()
+
 def ccode(ccodeid,leftcode,field='rightcode',safe=False):
     ''' converts code using a db-table ccode.
     '''
-    for row in botslib.query('''SELECT ''' +field+ '''
-                                FROM ccode
-                                WHERE ccodeid_id = %(ccodeid)s
-                                AND leftcode = %(leftcode)s''',
-                                {'ccodeid':ccodeid,'leftcode':leftcode}):
-        return row[field]
+    codes = ccodecache.get(ccodeid,leftcode,field)
+    if codes is None:
+        for row in botslib.query('''SELECT ''' +field+ '''
+                                    FROM ccode
+                                    WHERE ccodeid_id = %(ccodeid)s
+                                    AND leftcode = %(leftcode)s''',
+                                    {'ccodeid':ccodeid,'leftcode':leftcode}):
+            return row[field]
+    elif leftcode in codes[0]:
+        return codes[0][leftcode][0][field]
     if safe is None:
         return None
     elif safe:
@@ -321,12 +647,16 @@ def safe_ccode(ccodeid,leftcode,field='rightcode'):   #depreciated, use ccode wi
 
 def reverse_ccode(ccodeid,rightcode,field='leftcode',safe=False):
     ''' as ccode but reversed lookup.'''
-    for row in botslib.query('''SELECT ''' +field+ '''
-                                FROM ccode
-                                WHERE ccodeid_id = %(ccodeid)s
-                                AND rightcode = %(rightcode)s''',
-                                {'ccodeid':ccodeid,'rightcode':rightcode}):
-        return row[field]
+    codes = ccodecache.get(ccodeid,rightcode,field)
+    if codes is None:
+        for row in botslib.query('''SELECT ''' +field+ '''
+                                    FROM ccode
+                                    WHERE ccodeid_id = %(ccodeid)s
+                                    AND rightcode = %(rightcode)s''',
+                                    {'ccodeid':ccodeid,'rightcode':rightcode}):
+            return row[field]
+    elif rightcode in codes[1]:
+        return codes[1][rightcode][field]
     if safe is None:
         return None
     elif safe:
@@ -348,6 +678,9 @@ safercodetconversion = safe_reverse_ccode
 def getcodeset(ccodeid,leftcode,field='rightcode'):
     ''' Returns a list of all 'field' values in ccode with right ccodeid and leftcode.
     '''
+    codes = ccodecache.get(ccodeid,leftcode,field)
+    if codes is not None:
+        return [row[field] for row in codes[0].get(leftcode,())]
     terug = []
     for row in botslib.query('''SELECT ''' +field+ '''
                                 FROM ccode
@@ -643,6 +643,7 @@ def delete(request,*kw,**kwargs):
                     cursor.execute('''DELETE FROM ccodetrigger''')
                     if django.VERSION[0] <= 1 and django.VERSION[1] <= 5 :
                         transaction.commit_unless_managed()
+                    botslib.mark_ccode_changed()
                     notification = 'User code lists are deleted.'
                     messages.add_message(request, messages.INFO, notification)
                     botsglobal.logger.info(notification)
@@ -1020,6 +1020,34 @@ class TestFormatFieldInmessage(unittest.TestCase):
         self.assertRaises(bots.botslib.MessageError,self.edi._formatfield,'',tfield1,testdummy,nodedummy) 
 
 
+class TestRecord2string(unittest.TestCase):
+    ''' escaping and quoting of content when writing lex_records.'''
+    def record2string(self,classtocall,lex_record,**kwargs):
+        ta_info = {'record_sep':"'",'field_sep':'+','sfield_sep':':','record_tag_sep':'','reserve':'*','quote_char':'','escape':'?',
+                   'forcequote':0,'add_crlfafterrecord_sep':'','version':'3','replacechar':''}
+        ta_info.update(kwargs)
+        return classtocall(ta_info).record2string([lex_record])
+
+    def test_edifact(self):
+        lex_record = [['FTX',0,'AN'],['AAA',0,'AN'],["te+xt?:'",0,'AN'],['*x',1,'AN'],['y',2,'AN']]
+        self.assertEqual(self.record2string(outmessage.edifact,lex_record),"FTX+AAA+te?+xt???:?':*x*y'",'escape')
+        self.assertEqual(self.record2string(outmessage.edifact,lex_record,version='4'),"FTX+AAA+te?+xt???:?':?*x*y'",'escape reserve in version 4')
+
+    def test_x12(self):
+        lex_record = [['N1',0,'AN'],['ST',0,'AN'],['a*b>c~d',0,'AN']]
+        kwargs = {'record_sep':'~','field_sep':'*','sfield_sep':'>','reserve':'^','escape':'','version':'00401'}
+        self.assertEqual(self.record2string(outmessage.x12,lex_record,**kwargs),'N1*ST*abcd~','separators removed')
+        self.assertEqual(self.record2string(outmessage.x12,lex_record,replacechar='_',**kwargs),'N1*ST*a_b_c_d~','separators replaced')
+        self.assertRaises(botslib.OutMessageError,self.record2string,outmessage.x12,lex_record,replacechar=None,**kwargs)
+
+    def test_csv(self):
+        lex_record = [['a,"b',0,'AN'],['c',0,'AN'],['d\\e',0,'N']]
+        kwargs = {'record_sep':'\r\n','field_sep':',','sfield_sep':'','reserve':'','quote_char':'"'}
+        self.assertEqual(self.record2string(outmessage.csv,lex_record,escape='',**kwargs),'"a,""b",c,d\\e\r\n','quote if needed')
+        self.assertEqual(self.record2string(outmessage.csv,lex_record,forcequote=2,escape='',**kwargs),'"a,""b","c",d\\e\r\n','quote alfanumeric')
+        self.assertEqual(self.record2string(outmessage.csv,lex_record,forcequote=1,escape='\\',**kwargs),'"a,""b","c","d\\\\e"\r\n','quote all, escape')
+
+
 if __name__ == '__main__':
     botsinit.generalinit('config')
     botsglobal.logger = botsinit.initenginelogging('engine')
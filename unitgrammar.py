@@ -31,6 +31,22 @@ class TestGrammar(unittest.TestCase):
         self.assertRaises(botslib.BotsImportError,grammar.grammarread,'edifact','test7')   #error in syntax
         self.assertRaises(botslib.BotsImportError,grammar.grammarread,'edifact','test7','partner')   #error in syntax
 
+    def testgrammarregistry(self):
+        grammar.usersys_changed()
+        counters = grammar.registry.counters()
+        tabel = grammar.grammarread('edifact','edifact','grammars')
+        self.assertEqual(grammar.registry.counters()['misses'],counters['misses'] + 1)
+        tabel2 = grammar.grammarread('edifact','edifact','grammars')
+        self.assertEqual(grammar.registry.counters()['hits'],counters['hits'] + 1)
+        self.assertTrue(tabel2.structure is tabel.structure)                #grammar parts are shared
+        tabel2.syntax['charset'] = 'flup'                                   #syntax is not shared
+        self.assertNotEqual(tabel.syntax['charset'],'flup')
+        self.assertNotEqual(grammar.grammarread('edifact','edifact','grammars').syntax['charset'],'flup')
+        grammar.usersys_changed()                                           #grammar is read again
+        self.assertEqual(grammar.registry.counters()['size'],0)
+        tabel3 = grammar.grammarread('edifact','edifact','grammars')
+        self.assertFalse(tabel3.structure is tabel.structure)
+
     def testgramfieldedifact_and_general(self):
         tabel = grammar.grammarread('edifact','edifact')
         gramfield = tabel._checkfield
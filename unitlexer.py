@@ -0,0 +1,102 @@
+from __future__ import print_function
+from __future__ import unicode_literals
+import sys
+import random
+import unittest
+import bots.botslib as botslib
+import bots.botsinit as botsinit
+import bots.botsglobal as botsglobal
+import bots.inmessage as inmessage
+if sys.version_info[0] > 2:
+    basestring = unicode = str
+
+''' no plugin needed.
+    not an acceptance test.
+    parity of the lexers for var-editypes: inmessage.var._lex_char and inmessage.var._lex_fast should give the same lex_records and errors.
+'''
+
+def syntax_edifact(**kwargs):
+    ta_info = {'record_sep':"'",'field_sep':'+','record_tag_sep':'','sfield_sep':':','reserve':'*','quote_char':'','escape':'?','skip_char':'\r\n'}
+    ta_info.update(kwargs)
+    return ta_info
+
+def syntax_x12(**kwargs):
+    ta_info = {'record_sep':'~','field_sep':'*','record_tag_sep':'','sfield_sep':'>','reserve':'^','quote_char':'','escape':'','skip_char':'\r\n'}
+    ta_info.update(kwargs)
+    return ta_info
+
+def syntax_tradacoms(**kwargs):
+    ta_info = {'record_sep':"'",'field_sep':'+','record_tag_sep':'=','sfield_sep':':','reserve':'','quote_char':'','escape':'?','skip_char':'\r\n'}
+    ta_info.update(kwargs)
+    return ta_info
+
+def syntax_csv(**kwargs):
+    ta_info = {'record_sep':'\r\n','field_sep':',','record_tag_sep':'','sfield_sep':'','reserve':'','quote_char':'"','escape':'','skip_char':''}
+    ta_info.update(kwargs)
+    return ta_info
+
+def lex(classtocall,ta_info,rawinput,lexer):
+    ''' lex rawinput with lexer; return lex_records or the error.'''
+    ediobject = classtocall(ta_info.copy())
+    ediobject.rawinput = rawinput
+    try:
+        return list(getattr(ediobject,lexer)())
+    except botslib.InMessageError as msg:
+        return unicode(msg)
+
+
+class TestLexer(unittest.TestCase):
+    def compare(self,classtocall,ta_info,rawinput):
+        self.assertEqual(lex(classtocall,ta_info,rawinput,'_lex_char'),lex(classtocall,ta_info,rawinput,'_lex_fast'),repr(rawinput))
+
+    def testedifact(self):
+        self.compare(inmessage.edifact,syntax_edifact(),"UNB+UNOA:2+SENDER+RECEIVER'\r\nUNH+1+ORDERS:D:96A:UN'\r\nFTX+AAA+++te?+xt?:more??'BGM+220+12*3*4'UNZ+1+1'")
+        self.compare(inmessage.edifact,syntax_edifact(),"UNB+UNOA:2+SENDER+RECEIVER'\nUNH+1'\n  BGM+220'")
+        self.compare(inmessage.edifact,syntax_edifact(),"UNB+UNOA:2'UNH+1")                                           #A51
+        self.compare(inmessage.edifact,syntax_edifact(allow_lastrecordnotclosedproperly=True),"UNB+UNOA:2'UNH+1")
+        self.compare(inmessage.edifact,syntax_edifact(strict_syntax_check=True),"UNB+UNOA:2' UNH+1'")                #A67
+        self.compare(inmessage.edifact,syntax_edifact(strict_syntax_check=True),"UNB+UNOA:2''UNH+1'")                #A69
+
+    def testx12(self):
+        self.compare(inmessage.x12,syntax_x12(),"ISA*00*          *00*          *01*SENDER~\nGS*PO*a>b^c>d~\nST*850*0001~SE*2*0001~")
+
+    def testtradacoms(self):
+        self.compare(inmessage.tradacoms,syntax_tradacoms(),"STX=ANA:1+FROM:NAME+TO'MHD=1+ORDHDR:9'TYP=0430+NEW ORDERS'")
+
+    def testcsv(self):
+        self.compare(inmessage.csv,syntax_csv(),'a,"b ""quoted"", c",d\r\n  "x"y,,\r\n\t,z\r\n')
+        self.compare(inmessage.csv,syntax_csv(record_sep='\n',field_sep='\t',quote_char="'",escape='\\',skip_char='\r'),"\tb\t'c\\'d'\r\n\t\t\n x\ty\n")
+        self.compare(inmessage.csv,syntax_csv(),'a,b\r\nc,"d')
+        self.compare(inmessage.csv,syntax_csv(allow_lastrecordnotclosedproperly=True),'a,b\r\nc,"d')
+
+    def testrandom(self):
+        ''' random input containing many separators, escapes, quotes and whitespace.'''
+        chars = 'AB +:*?\'\r\n"\t,~>^= x'
+        generator = random.Random(1)
+        for classtocall,ta_info in [(inmessage.edifact,syntax_edifact()),
+                                    (inmessage.edifact,syntax_edifact(strict_syntax_check=True)),
+                                    (inmessage.x12,syntax_x12()),
+                                    (inmessage.tradacoms,syntax_tradacoms()),
+                                    (inmessage.csv,syntax_csv(escape='?')),
+                                    (inmessage.csv,syntax_csv(record_sep='\n',field_sep='\t',sfield_sep=':',skip_char='\r',allow_lastrecordnotclosedproperly=True)),
+                                    ]:
+            for i in range(2000):
+                rawinput = ''.join(generator.choice(chars) for j in range(generator.randint(0,60)))
+                self.compare(classtocall,ta_info,rawinput)
+
+    def testchunks(self):
+        ''' tokens can be split over chunks in _lex_fast.'''
+        rawinput = "UNB+UNOA:2+SENDER+RECEIVER'\r\nFTX+AAA+++te?+xt?:more??'UNZ+1+1'"
+        org_chunksize = inmessage.var.lex_chunksize
+        try:
+            for chunksize in range(1,len(rawinput)+1):
+                inmessage.var.lex_chunksize = chunksize
+                self.compare(inmessage.edifact,syntax_edifact(),rawinput)
+        finally:
+            inmessage.var.lex_chunksize = org_chunksize
+
+
+if __name__ == '__main__':
+    botsinit.generalinit('config')
+    botsglobal.logger = botsinit.initenginelogging('engine')
+    unittest.main()
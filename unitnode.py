@@ -160,6 +160,101 @@ class Testnode(unittest.TestCase):
         #~ inn.root.displayqueries()
 
 
+class TestMpath(unittest.TestCase):
+    ''' get/getloop with compiled mpaths and child-index; no plugin needed.
+    '''
+    def setUp(self):
+        self.root = node.Node({'BOTSID':'UNH','0062':'1'})
+        for i in range(20):
+            lin = node.Node({'BOTSID':'LIN','1082':unicode(i)})
+            lin.append(node.Node({'BOTSID':'QTY','C186.6063':'21','C186.6060':unicode(i*10)}))
+            self.root.append(lin)
+            self.root.append(node.Node({'BOTSID':'FTX','4451':'AAI','C108.4440#1':unicode(i)}))
+
+    def testget(self):
+        self.assertEqual(self.root.get({'BOTSID':'UNH','0062':None}),'1')
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'7'},{'BOTSID':'QTY','C186.6063':'21','C186.6060':None}),'70')
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'7'},{'BOTSID':'QTY','C186.6063':'21'}),1)
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'7'},{'BOTSID':'QTY','C186.6063':'47','C186.6060':None}),None)
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','BOTSIDnr':'2'},{'BOTSID':'QTY','C186.6060':None}),None)
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'FTX','C108.4440#1':None}),'0')
+        self.assertRaises(botslib.MappingFormatError,self.root.get,{'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None,'C212.7140':None})
+        self.assertRaises(botslib.MappingFormatError,self.root.get,{'BOTSID':'UNH','0062':None},{'BOTSID':'LIN'})
+
+    def testmpathnotchanged(self):
+        mpath = ({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None})
+        self.assertEqual(self.root.get(*mpath),'0')
+        self.assertEqual(list(self.root.getloop(*mpath[:1])),[self.root])
+        self.assertEqual(mpath,({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None}))
+
+    def testgetloop(self):
+        self.assertEqual([lin.get({'BOTSID':'LIN','1082':None}) for lin in self.root.getloop({'BOTSID':'UNH'},{'BOTSID':'LIN'})],[unicode(i) for i in range(20)])
+        self.assertEqual(len(list(self.root.getloop({'BOTSID':'UNH'},{'BOTSID':'LIN'},{'BOTSID':'QTY'}))),20)
+        self.assertEqual(len(list(self.root.getloop({'BOTSID':'UNH'},{'BOTSID':'XXX'}))),0)
+        self.assertEqual(self.root.getcountoccurrences({'BOTSID':'UNH'},{'BOTSID':'FTX','4451':'AAI'}),20)
+
+    def testchangedchildren(self):
+        ''' child-index follows changes in children.'''
+        mpath = ({'BOTSID':'UNH'},{'BOTSID':'LIN'})
+        self.assertEqual(self.root.getcountoccurrences(*mpath),20)
+        self.root.append(node.Node({'BOTSID':'LIN','1082':'20'}))
+        self.assertEqual(self.root.getcountoccurrences(*mpath),21)
+        self.root.children.remove(self.root.children[0])
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None}),'1')
+        self.root.children[-1] = node.Node({'BOTSID':'CNT'})
+        self.assertEqual(self.root.getcountoccurrences(*mpath),19)
+        self.root.children = [node.Node({'BOTSID':'LIN','1082':'x'})]
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None}),'x')
+        self.setUp()
+        self.root.sort({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None},reverse=True)
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None}),'9')
+        self.root.append(node.Node({'BOTSID':'CNT'}))
+        self.root.children[:-1] = sorted(self.root.children[:-1],key=lambda child: child.record.get('1082'))  #same length, same last child
+        self.assertEqual([lin.get({'BOTSID':'LIN','1082':None}) for lin in self.root.getloop(*mpath)][:3],['0','1','10'])
+        self.root.children[0] = node.Node({'BOTSID':'LIN','1082':'y'})
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':None}),'y')
+        self.setUp()
+        lins = self.root.children     #reference to children is kept
+        self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'5'})
+        lins.append(node.Node({'BOTSID':'LIN','1082':'20'}))
+        self.assertEqual(self.root.getcountoccurrences(*mpath),21)
+        self.assertIs(self.root.children,lins)
+
+    def testput(self):
+        ''' put/putloop via child-index gives same occurences as before.'''
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'7'},{'BOTSID':'QTY','C186.6063':'12','C186.6060':'3'})
+        self.assertEqual(self.root.getcountoccurrences({'BOTSID':'UNH'},{'BOTSID':'LIN'}),20)
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'7'},{'BOTSID':'QTY','C186.6063':'12','C186.6060':None}),'3')
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','C212.7140':'123'})     #first LIN without this field
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','C212.7140':'123','1082':None}),'0')
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'20'})
+        self.assertEqual(self.root.getcountoccurrences({'BOTSID':'UNH'},{'BOTSID':'LIN'}),21)
+        lin = self.root.putloop({'BOTSID':'UNH'},{'BOTSID':'LIN'})
+        lin.put({'BOTSID':'LIN','1082':'21'})
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'21'},{'BOTSID':'QTY','C186.6060':'5'})
+        self.assertEqual(lin.get({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6060':None}),'5')
+        self.root.change(where=({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'3'}),change={'1082':'30'})
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'30'},{'BOTSID':'PRI','C509.5118':'1.50'})
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'30'},{'BOTSID':'QTY','C186.6060':None}),'30')
+        self.assertEqual(self.root.getcountoccurrences({'BOTSID':'UNH'},{'BOTSID':'LIN'}),22)
+        lin = list(self.root.getloop({'BOTSID':'UNH'},{'BOTSID':'LIN'}))[5]
+        lin.change(where=({'BOTSID':'LIN'},),change={'1082':'X'})     #changed directly, not via parent
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'X'},{'BOTSID':'PRI','C509.5118':'2.50'})
+        self.assertEqual(self.root.get({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'X'},{'BOTSID':'PRI','C509.5118':None}),'2.50')
+        self.assertEqual(self.root.getcountoccurrences({'BOTSID':'UNH'},{'BOTSID':'LIN'}),22)
+        self.setUp()
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'5'})     #index of values is made
+        lins = list(self.root.getloop({'BOTSID':'UNH'},{'BOTSID':'LIN'}))
+        lins[2].change(where=({'BOTSID':'LIN'},),change={'1082':'5'})   #first LIN with this value now
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'5'},{'BOTSID':'QTY','C186.6063':'12','C186.6060':'7'})
+        self.assertEqual(lins[2].get({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6063':'12','C186.6060':None}),'7')
+        self.assertEqual(lins[5].get({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6063':'12','C186.6060':None}),None)
+        lins[3].change(where=({'BOTSID':'LIN'},),change={'1082':None})  #first LIN without this field now
+        self.root.put({'BOTSID':'UNH'},{'BOTSID':'LIN','1082':'9'},{'BOTSID':'QTY','C186.6063':'12','C186.6060':'8'})
+        self.assertEqual(lins[3].get({'BOTSID':'LIN','1082':None}),'9')
+        self.assertEqual(lins[3].get({'BOTSID':'LIN'},{'BOTSID':'QTY','C186.6063':'12','C186.6060':None}),'8')
+
+
 if __name__ == '__main__':
     import datetime
     botsinit.generalinit('config')
@@ -140,6 +140,66 @@ class TestTranslate(unittest.TestCase):
         ts2 = persist_lookup_ts(domein,botskey)
         print(ts1,ts2)
 
+    def testpersist_many(self):
+        domein = 'test'
+        values = dict(('many%s'%i,{'nr':i,'text':'éëè'}) for i in range(1200))
+        for botskey in values:
+            transform.persist_delete(domein,botskey)
+        transform.persist_add_many(domein,values)
+        self.assertEqual(values,transform.persist_lookup_many(domein,list(values)),'basis')
+        self.assertEqual({'many1':{'nr':1,'text':'éëè'},'notthere':None},transform.persist_lookup_many(domein,['many1','notthere']),'basis')
+        transform.persist_delete(domein,'many0')
+        self.assertRaises(botslib.PersistError,transform.persist_add_many,domein,[('many0',0),('many1',1)])   #many1 is already present
+        self.assertEqual(0,transform.persist_lookup(domein,'many0'),'added before error')
+        for botskey in values:
+            transform.persist_delete(domein,botskey)
+
+    def testpersist_oldcontent(self):
+        ''' content as stored by older versions (pickle protocol 0 as iso-8859-1) is read.'''
+        domein = 'test'
+        botskey = 'oldcontent'
+        myobject = MyObject('a_éëè\ufb52','b')
+        botslib.changeq('''DELETE FROM persist WHERE domein=%(domein)s AND botskey=%(botskey)s''',{'domein':domein,'botskey':botskey})
+        botslib.changeq('''INSERT INTO persist (domein,botskey,content) VALUES (%(domein)s,%(botskey)s,%(content)s)''',
+                        {'domein':domein,'botskey':botskey,'content':pickle.dumps(myobject,0).decode('iso-8859-1')})
+        self.assertEqual(myobject,transform.persist_lookup(domein,botskey),'basis')
+        transform.persist_delete(domein,botskey)
+
+    def testpersistcache(self):
+        ''' persist with cache (buffered changes) gives same results as without.'''
+        domein = 'test'
+        botskeys = ['cache%s'%i for i in range(5)]
+        org_persistcache = transform.persistcache
+        org_persistcachesize = botsglobal.ini.get('settings','persistcachesize',None)
+        try:
+            results = []
+            for persistcachesize in ['0','3']:
+                botsglobal.ini.set('settings','persistcachesize',persistcachesize)
+                transform.persistcache = transform.PersistCache()
+                for botskey in botskeys:
+                    transform.persist_delete(domein,botskey)
+                transform.persistcache.start()
+                result = []
+                for i,botskey in enumerate(botskeys * 3):
+                    result.append(transform.persist_lookup(domein,botskey))
+                    transform.persist_add_update(domein,botskey,i)
+                    if i % 4 == 0:
+                        transform.persist_delete(domein,botskeys[i % 3])
+                transform.persistcache.end()
+                botsglobal.ini.set('settings','persistcachesize','0')
+                transform.persistcache = transform.PersistCache()
+                result.append(transform.persist_lookup_many(domein,botskeys))
+                results.append(result)
+            self.assertEqual(results[0],results[1],'cache')
+        finally:
+            transform.persistcache = org_persistcache
+            if org_persistcachesize is None:
+                botsglobal.ini.remove_option('settings','persistcachesize')
+            else:
+                botsglobal.ini.set('settings','persistcachesize',org_persistcachesize)
+            for botskey in botskeys:
+                transform.persist_delete(domein,botskey)
+
     def testgetcodeset(self):
         self.assertEqual([u'TESTOUT'],transform.getcodeset('artikel','TESTIN'),'test getcodeset')
         #print(transform.getcodeset('list','list'))
@@ -295,6 +355,52 @@ class TestTranslate(unittest.TestCase):
         self.assertEqual([],list(transform.chunk(list(transform.chunk('',5)),2)) )
         self.assertEqual([],list(transform.chunk(list(transform.chunk(None,5)),2)) )
 
+    def testlookup_translation(self):
+        ''' parity of in-memory lookup (botslib.lookup_translation) and lookup via query on database (botslib.lookup_translation_query).'''
+        botsglobal.translations = None
+        messagetypes = set([('edifact','flup')])
+        alts = set(['','flup'])
+        for row in botslib.query('''SELECT fromeditype,frommessagetype,alt FROM translate'''):
+            messagetypes.add((row['fromeditype'],row['frommessagetype']))
+            alts.add(row['alt'])
+        partners = [None,'','flup'] + [row['idpartner'] for row in botslib.query('''SELECT idpartner FROM partner''')]
+        for fromeditype,frommessagetype in messagetypes:
+            for alt in alts:
+                for frompartner in partners:
+                    for topartner in partners:
+                        self.assertEqual(botslib.lookup_translation_query(frommessagetype,fromeditype,alt,frompartner,topartner),
+                                         botslib.lookup_translation(frommessagetype,fromeditype,alt,frompartner,topartner),
+                                         (frommessagetype,fromeditype,alt,frompartner,topartner))
+
+    def testccodecache(self):
+        ''' parity of cached code conversion (transform.ccodecache) and conversion via query on database.'''
+        ccodeids = [row['ccodeid_id'] for row in botslib.query('''SELECT DISTINCT ccodeid_id FROM ccode''')] + ['flup']
+        codes = set(['','flup'])
+        for row in botslib.query('''SELECT leftcode,rightcode FROM ccode'''):
+            codes.update([row['leftcode'],row['rightcode']])
+        org_ccodecache = transform.ccodecache
+        org_ccodecachesize = botsglobal.ini.get('settings','ccodecachesize',None)
+        botsglobal.ini.set('settings','ccodecachesize','100000')
+        try:
+            for ccodeid in ccodeids:
+                for code in codes:
+                    for field in [str('rightcode'),str('leftcode'),str('attr1')]:
+                        results = []
+                        for use_query in [False,True]:
+                            transform.ccodecache = transform.CcodeCache()
+                            if use_query:
+                                transform.ccodecache.get = lambda ccodeid,code,field: None     #not cached: always use query
+                            results.append((transform.ccode(ccodeid,code,field,safe=None),
+                                            transform.reverse_ccode(ccodeid,code,field,safe=None),
+                                            transform.getcodeset(ccodeid,code,field)))
+                        self.assertEqual(results[0],results[1],(ccodeid,code,field))
+        finally:
+            transform.ccodecache = org_ccodecache
+            if org_ccodecachesize is None:
+                botsglobal.ini.remove_option('settings','ccodecachesize')
+            else:
+                botsglobal.ini.set('settings','ccodecachesize',org_ccodecachesize)
+
     def testdiacritics(self):
         title = 'äáãàâāăąåǻȁªấặắḁÄÁÃÀÂĀĂĄÅǞǠǺȀḀ,çćĉċčÇĆĈĊČ,éëêèêēĕėęěȅềe̊ËÉẼÈÊĒĔĖĘĚȄE̊,ïíìîĩįȉÏÍĨÌÎȈ,öóõòôơỏȍÖÓÕÒÔƠȌ,üúũùûưǖǘǚǜųȕÜÚŨÙÛƯǕǗǛȔ,ḃḋďḟĝġğĞĠĜḥḤķľḷḶṁńñǹňņÑṗ̥r̥̄řŕȑȐR̥R̥̄šŞȘťṫțẘWýÿÝžźż,ðæÆÐØßø,ƎƏƐƆƇƈđłȺⱥʉ,Ĳĳ¼½⁇ǳ™Ⅱ⑴⑩⒜㎝㏒'
         self.assertEqual('aaaaaaaaaaaaaaaaAAAAAAAAAAAAAA,cccccCCCCC,eeeeeeeeeeeeeEEEEEEEEEEEE,iiiiiiiIIIIII,ooooooooOOOOOOO,uuuuuuuuuuuuUUUUUUUUUU,bddfgggGGGhHkllLmnnnnnNprrrrRRRsSStttwWyyYzzz,,,Ii11?dTI(1(cl',transform.dropdiacritics(title))